@@ -1,6 +1,15 @@
 import polars as pl
 from datetime import datetime, time, timedelta, date
 import pytz
+import numpy as np
+import os
+
+from first_touch import ABOVE, BELOW, build_touch_index, extreme, first_touch
+from intrabar import TP_FIRST
+from dataset import scan_source
+from day_index import bar_frame, build_day_index, day_bounds, price_rows, to_us, ts_array, window_rows
+from profiling import record_days, stage
+from session_calendar import local_to_utc, session_calendar
 
 # --- KONFIGURACJA STREF CZASOWYCH ---
 NY_TZ = "America/New_York"
@@ -14,42 +23,100 @@ def _to_utc_internal(date_obj, time_obj):
     except: 
         return tz.localize(dt_naive, is_dst=False).astimezone(pytz.UTC)
 
-def _prepare_dataframe(df: pl.DataFrame, ib_start: time, is_overnight: bool) -> pl.DataFrame:
-    if df.width == 1:
-        col_name = df.columns[0]
-        df = df.with_columns(pl.col(col_name).str.split(";").alias("parts")).select([
+def _raw_date_predicate(col_name, dtype, start_date, end_date):
+    """
+    Zgrubny filtr zakresu dat na surowej kolumnie czasu (przed parsowaniem), który można zepchnąć do
+    scan_parquet. Margines obejmuje w całości dni brzegowe z _date_window (przesunięcie UTC->NY, sesje
+    overnight). None gdy się nie da.
+    """
+    lo = start_date - timedelta(days=2) if start_date else None
+    hi = end_date + timedelta(days=3) if end_date else None
+    col = pl.col(col_name)
+    if dtype == pl.String:
+        # "YYYYMMDD HHMMSS" (także "YYYYMMDD HHMMSS;open;..." w formacie jednokolumnowym) sortuje się leksykograficznie
+        lo, hi = (f"{lo:%Y%m%d}" if lo else None), (f"{hi:%Y%m%d}" if hi else None)
+    elif isinstance(dtype, pl.Datetime):
+        def _lit(d):
+            v = pl.lit(datetime.combine(d, time())).cast(pl.Datetime(dtype.time_unit))
+            return v.dt.replace_time_zone(dtype.time_zone) if dtype.time_zone else v
+        lo, hi = (_lit(lo) if lo else None), (_lit(hi) if hi else None)
+    else:
+        return None
+    if lo is not None and hi is not None: return (col >= lo) & (col < hi)
+    if lo is not None: return col >= lo
+    if hi is not None: return col < hi
+    return None
+
+def _prepare_lazyframe(lf: pl.LazyFrame, ib_start: time, is_overnight: bool, start_date=None, end_date=None) -> pl.LazyFrame:
+    """
+    Leniwa wersja _prepare_dataframe. Czyta tylko 5 pierwszych kolumn (czas + OHLC), a zakres dat
+    trafia jako predykat na surowy czas, więc scan_parquet pomija niepotrzebne row-groupy.
+    Wynik obejmuje dni [start_date - 1, end_date + 1] (kontekst wykresów na brzegach zakresu).
+    """
+    schema = lf.collect_schema()
+    cols = schema.names()
+    pred = _raw_date_predicate(cols[0], schema[cols[0]], start_date, end_date)
+    if pred is not None: lf = lf.filter(pred)
+
+    if len(cols) == 1:
+        col_name = cols[0]
+        lf = lf.with_columns(pl.col(col_name).str.split(";").alias("parts")).select([
             pl.col("parts").list.get(0).alias("timestamp"),
             pl.col("parts").list.get(1).cast(pl.Float64).alias("open"),
             pl.col("parts").list.get(2).cast(pl.Float64).alias("high"),
             pl.col("parts").list.get(3).cast(pl.Float64).alias("low"),
             pl.col("parts").list.get(4).cast(pl.Float64).alias("close"),
         ])
+        ts_type = pl.String
     else:
-        cols = df.columns
-        df = df.select([
+        lf = lf.select([
             pl.col(cols[0]).alias("timestamp"),
             pl.col(cols[1]).cast(pl.Float64).alias("open"),
             pl.col(cols[2]).cast(pl.Float64).alias("high"),
             pl.col(cols[3]).cast(pl.Float64).alias("low"),
             pl.col(cols[4]).cast(pl.Float64).alias("close"),
         ])
+        ts_type = schema[cols[0]]
 
-    if df.schema["timestamp"] == pl.String:
-        df = df.with_columns(pl.col("timestamp").str.strptime(pl.Datetime, "%Y%m%d %H%M%S", strict=False).dt.replace_time_zone(UTC_TZ).alias("ts_utc"))
-    elif df.schema["timestamp"] == pl.Int64: 
-         df = df.with_columns(pl.col("timestamp").cast(pl.String).str.strptime(pl.Datetime, "%Y%m%d %H%M%S", strict=False).dt.replace_time_zone(UTC_TZ).alias("ts_utc"))
+    if ts_type == pl.String:
+        lf = lf.with_columns(pl.col("timestamp").str.strptime(pl.Datetime, "%Y%m%d %H%M%S", strict=False).dt.replace_time_zone(UTC_TZ).alias("ts_utc"))
+    elif ts_type == pl.Int64: 
+         lf = lf.with_columns(pl.col("timestamp").cast(pl.String).str.strptime(pl.Datetime, "%Y%m%d %H%M%S", strict=False).dt.replace_time_zone(UTC_TZ).alias("ts_utc"))
     else:
-        df = df.with_columns(pl.col("timestamp").dt.replace_time_zone(UTC_TZ).alias("ts_utc"))
+        lf = lf.with_columns(pl.col("timestamp").dt.replace_time_zone(UTC_TZ).alias("ts_utc"))
 
-    df = df.with_columns(pl.col("ts_utc").dt.convert_time_zone(NY_TZ).alias("ts_ny"))
-    df = df.with_columns(pl.col("ts_ny").dt.date().alias("calendar_date"))
+    lf = lf.with_columns(pl.col("ts_utc").dt.convert_time_zone(NY_TZ).alias("ts_ny"))
+    lf = lf.with_columns(pl.col("ts_ny").dt.date().alias("calendar_date"))
     
     if is_overnight:
-        df = df.with_columns(pl.when(pl.col("ts_ny").dt.time() >= ib_start).then(pl.col("calendar_date") + timedelta(days=1)).otherwise(pl.col("calendar_date")).alias("date"))
+        lf = lf.with_columns(pl.when(pl.col("ts_ny").dt.time() >= ib_start).then(pl.col("calendar_date") + timedelta(days=1)).otherwise(pl.col("calendar_date")).alias("date"))
     else:
-        df = df.with_columns(pl.col("calendar_date").alias("date"))
-        
-    return df.sort("ts_utc")
+        lf = lf.with_columns(pl.col("calendar_date").alias("date"))
+
+    return _date_window(lf, start_date, end_date).sort("ts_utc")
+
+def _date_window(lf, start_date, end_date):
+    if start_date: lf = lf.filter(pl.col("date") >= start_date - timedelta(days=1))
+    if end_date: lf = lf.filter(pl.col("date") <= end_date + timedelta(days=1))
+    return lf
+
+def _prepare_dataframe(df: pl.DataFrame, ib_start: time, is_overnight: bool) -> pl.DataFrame:
+    return _prepare_lazyframe(df.lazy(), ib_start, is_overnight).collect()
+
+def scan_bars(source, ib_start: time, is_overnight: bool, start_date=None, end_date=None, use_cache=False) -> pl.LazyFrame:
+    """
+    Przygotowane bary z pliku parquet / katalogu partycjonowanego (ścieżka, dataset.py) lub gotowej ramki,
+    z pushdownem kolumn i zakresu dat; w zbiorze partycjonowanym miesiące spoza zakresu nie są w ogóle otwierane.
+    use_cache=True (tylko dla ścieżki): przygotowane bary z cache Arrow IPC (bar_cache; w zbiorze partycjonowanym
+    tylko partycje z zakresu dat).
+    """
+    if use_cache and isinstance(source, (str, os.PathLike)):
+        from bar_cache import load_prepared
+        return _date_window(load_prepared(source, ib_start, is_overnight, start_date, end_date).lazy(), start_date, end_date)
+    if isinstance(source, pl.DataFrame): lf = source.lazy()
+    elif isinstance(source, pl.LazyFrame): lf = source
+    else: lf = scan_source(source, start_date, end_date)
+    return _prepare_lazyframe(lf, ib_start, is_overnight, start_date, end_date)
 
 def _check_target_advanced(trade_window, direction, target_price, ib_h, ib_l, ib_range, end_ib_utc):
     if trade_window.is_empty(): return False, 0.0, 0.0, None
@@ -77,18 +144,10 @@ def calculate_streaks(res_df, col_name):
     Oblicza maksymalną serię True (Win) i False (Loss) w kolumnie boolean.
     """
     if res_df.is_empty(): return 0, 0
-    series = res_df[col_name].to_list()
-    max_w = curr_w = max_l = curr_l = 0
-    for v in series:
-        if v: 
-            curr_w += 1
-            curr_l = 0
-        else: 
-            curr_l += 1
-            curr_w = 0
-        max_w = max(max_w, curr_w)
-        max_l = max(max_l, curr_l)
-    return max_w, max_l
+    runs = res_df[col_name].cast(pl.Boolean).fill_null(False).rle().struct.unnest()
+    max_w = runs.filter(pl.col("value"))["len"].max()
+    max_l = runs.filter(~pl.col("value"))["len"].max()
+    return max_w or 0, max_l or 0
 
 def _analyze_single_day(day_df, date_val, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight):
     start_utc = _to_utc_internal(date_val - timedelta(days=1) if is_overnight else date_val, ib_start)
@@ -113,7 +172,7 @@ def _analyze_single_day(day_df, date_val, ib_start, ib_end, return_deadline, bre
     res_dict = {
         "date": date_val, "direction": f_dir, "ib_range": ib_range, 
         "ib_high": ib_h, "ib_low": ib_l, "ib_mid": ib_mid, 
-        "ib_start_utc": start_utc, "ib_end_utc": end_utc
+        "ib_start_utc": start_utc, "ib_end_utc": end_utc, "brk_ts": brk_ts
     }
     
     for key, price in targets.items():
@@ -121,8 +180,10 @@ def _analyze_single_day(day_df, date_val, ib_start, ib_end, return_deadline, bre
         res_dict.update({f"ret_{key}": hit, f"dist_{key}": d_pts, f"dist_pct_{key}": d_pct, f"time_{key}": t_min})
     return res_dict
 
-def analyze_ib_double_breakout(df, ib_start, ib_end, return_deadline, breakout_direction="BOTH", breakout_type="wick", is_overnight=False, start_date=None, end_date=None):
-    df = _prepare_dataframe(df, ib_start, is_overnight)
+def _analyze_per_day(df, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight, start_date, end_date):
+    """
+    Referencyjna ścieżka dzień-po-dniu (wolna). Silnik kolumnowy musi dawać identyczny wynik.
+    """
     results = []
     for key, day_df in df.group_by("date", maintain_order=True):
         date_val = key[0] if isinstance(key, (tuple, list)) else key
@@ -130,134 +191,264 @@ def analyze_ib_double_breakout(df, ib_start, ib_end, return_deadline, breakout_d
         if (start_date and date_val < start_date) or (end_date and date_val > end_date): continue
         res = _analyze_single_day(day_df, date_val, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight)
         if res: results.append(res)
-    return (pl.DataFrame(results) if results else pl.DataFrame()), df
+    return pl.DataFrame(results, infer_schema_length=None) if results else pl.DataFrame()
 
-def run_simulation(df_all, res_df, trigger_pct, entry_pct, tp_pct, sl_dist_pct, deadline, risk_model="FIXED", risk_value=100.0, strategy_mode="TREND"):
-    trades = []
-    
-    for row in res_df.to_dicts():
-        date_val = row["date"]
-        direction = row["direction"]
-        ib_h, ib_l = row["ib_high"], row["ib_low"]
-        rng = row["ib_range"]
-        
-        if direction == "UP":
-            invalidation_price = ib_l 
-            base = ib_h
-            trigger_price = base + (rng * (trigger_pct / 100))
-            entry_price   = base + (rng * (entry_pct / 100))
-            if strategy_mode == "TREND":
-                tp_price = base + (rng * (tp_pct / 100))
-                sl_price = entry_price - (rng * (sl_dist_pct / 100))
-                trade_dir = "LONG"
-            else: 
-                tp_price = base + (rng * (tp_pct / 100))
-                sl_price = entry_price + (rng * (sl_dist_pct / 100))
-                trade_dir = "SHORT"
-        else: 
-            invalidation_price = ib_h
-            base = ib_l
-            trigger_price = base - (rng * (trigger_pct / 100))
-            entry_price   = base - (rng * (entry_pct / 100))
-            if strategy_mode == "TREND":
-                tp_price = base - (rng * (tp_pct / 100))
-                sl_price = entry_price + (rng * (sl_dist_pct / 100))
-                trade_dir = "SHORT"
-            else: 
-                tp_price = base - (rng * (tp_pct / 100))
-                sl_price = entry_price - (rng * (sl_dist_pct / 100))
-                trade_dir = "LONG"
-
-        risk_dist = abs(entry_price - sl_price)
-        if risk_dist == 0: risk_dist = 1.0
-        risk_cash = risk_value if risk_model == "FIXED" else 100.0
-
-        day_df = df_all.filter(pl.col("date") == date_val)
-        deadline_utc = _to_utc_internal(date_val, deadline)
-        trading_data = day_df.filter((pl.col("ts_utc") >= row["ib_end_utc"]) & (pl.col("ts_utc") <= deadline_utc))
-        
-        if trading_data.is_empty(): continue
-
-        if direction == "UP":
-            trigger_hit = trading_data.filter(pl.col("high") >= trigger_price)
-        else:
-            trigger_hit = trading_data.filter(pl.col("low") <= trigger_price)
-
-        if trigger_hit.is_empty():
-            if direction == "UP":
-                dbl_break = trading_data.filter(pl.col("low") < invalidation_price)
-            else:
-                dbl_break = trading_data.filter(pl.col("high") > invalidation_price)
-            res_str = "INVALID (Double Break)" if not dbl_break.is_empty() else "NO TRIGGER"
-            trades.append({"date": date_val, "result": res_str, "pnl": 0.0, "r_result": 0.0, "comment": "Trigger missed"})
-            continue
-            
-        trigger_ts = trigger_hit["ts_utc"][0]
-        
-        pre_trigger_data = trading_data.filter(pl.col("ts_utc") < trigger_ts)
-        is_invalid = False
-        if not pre_trigger_data.is_empty():
-            if direction == "UP":
-                if not pre_trigger_data.filter(pl.col("low") < invalidation_price).is_empty(): is_invalid = True
-            else:
-                if not pre_trigger_data.filter(pl.col("high") > invalidation_price).is_empty(): is_invalid = True
-        
-        if is_invalid:
-            trades.append({"date": date_val, "result": "INVALID (Double Break)", "pnl": 0.0, "r_result": 0.0, "comment": "Setup cancelled"})
-            continue
-
-        after_trigger = trading_data.filter(pl.col("ts_utc") > trigger_ts)
-        if after_trigger.is_empty():
-            trades.append({"date": date_val, "result": "NO TIME", "pnl": 0.0, "r_result": 0.0, "comment": "End of day"})
-            continue
-
-        if direction == "UP":
-            entry_hit = after_trigger.filter(pl.col("low") <= entry_price)
+def _analyze_columnar(df, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight, start_date, end_date, day_index=None):
+    """
+    Te same reguły co _analyze_single_day, ale dla wszystkich dni naraz (wyrażenia okienkowe .over("date")).
+    """
+    with stage("analysis.window") as s:
+        days = (day_index if day_index is not None else build_day_index(df)).filter(pl.col("end") - pl.col("start") >= 10)
+        if start_date: days = days.filter(pl.col("date") >= start_date)
+        if end_date: days = days.filter(pl.col("date") <= end_date)
+        if days.is_empty(): return pl.DataFrame()
+        bounds = session_calendar(days["date"], ib_start, ib_end, return_deadline, is_overnight).select(["date", "ib_start_utc", "ib_end_utc", "deadline_utc"])
+        # Tylko bary z okna [min(start IB, koniec IB), deadline] każdego dnia, wycięte binary searchem z indeksu dni
+        rows, counts = window_rows(ts_array(df), days["start"].to_numpy(), days["end"].to_numpy(),
+                                   np.minimum(to_us(bounds["ib_start_utc"]), to_us(bounds["ib_end_utc"])), to_us(bounds["deadline_utc"]))
+        day_rows = np.repeat(np.arange(bounds.height), counts)
+        s.rows = rows.size
+    record_days(bounds["date"], counts)
+
+    ts, ib_h, ib_l = pl.col("ts_utc"), pl.col("ib_high"), pl.col("ib_low")
+    is_up = pl.col("direction") == "UP"
+    col_up, col_dw = ("high", "low") if breakout_type == "wick" else ("close", "close")
+    in_ib = (ts >= pl.col("ib_start_utc")) & (ts < pl.col("ib_end_utc"))
+    in_after = (ts >= pl.col("ib_end_utc")) & (ts <= pl.col("deadline_utc"))
+
+    # Maski zamiast filtrów wewnątrz grup: when(...).then(...).max()/.min() idzie szybką ścieżką agregacji.
+    # Dane są posortowane po ts_utc, więc "pierwszy bar spełniający warunek" to min(ts_utc) w masce.
+    with stage("analysis.breakout") as s:
+        bars = (pl.concat([bounds[day_rows], bar_frame(df, rows)], how="horizontal")
+              .filter(in_ib | in_after)
+              .with_columns(in_ib.alias("in_ib"), in_after.alias("in_after"))
+              .with_columns(
+                  pl.when("in_ib").then(pl.col("high")).max().over("date").alias("ib_high"),
+                  pl.when("in_ib").then(pl.col("low")).min().over("date").alias("ib_low"))
+              .with_columns(
+                  pl.when(pl.col("in_after") & (pl.col(col_up) > ib_h)).then(ts).min().over("date").alias("brk_up_ts"),
+                  pl.when(pl.col("in_after") & (pl.col(col_dw) < ib_l)).then(ts).min().over("date").alias("brk_dw_ts"))
+              .with_columns(
+                  pl.min_horizontal("brk_up_ts", "brk_dw_ts").alias("brk_ts"),
+                  pl.when(pl.col("brk_up_ts") <= pl.col("brk_dw_ts").fill_null(pl.col("brk_up_ts"))).then(pl.lit("UP"))
+                    .when(pl.col("brk_dw_ts").is_not_null()).then(pl.lit("DOWN")).alias("direction")))
+        s.rows = bars.height
+
+    if bars.is_empty(): return pl.DataFrame()  # żaden bar w oknie IB / po IB (np. IB w przerwie technicznej)
+
+    # Powroty do poziomów: dzień = ciągły blok wierszy bars, okno transakcji = bary po wybiciu (ts > brk_ts).
+    # Pierwszy bar z low <= cel (UP) / high >= cel (DOWN) i ekstremum do niego z indeksu first_touch.
+    with stage("analysis.targets", rows=bars.height):
+        seg = bars["date"].rle_id().to_numpy()
+        first = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+        offsets, days = np.append(first, bars.height), np.arange(first.size)
+        out = bars[first].select(["date", "direction", "ib_high", "ib_low", "ib_start_utc", "ib_end_utc", "brk_ts"]).with_columns(
+            pl.Series("has_ib", np.logical_or.reduceat(bars["in_ib"].to_numpy(), first), dtype=pl.Boolean),
+            pl.Series("has_after", np.logical_or.reduceat(bars["in_after"].to_numpy(), first), dtype=pl.Boolean))
+        bar_ts = to_us(bars["ts_utc"])
+        key = (seg.astype(np.int64) << _SEG_SHIFT) + (bar_ts - bar_ts[first][seg])
+        has_brk = out["brk_ts"].is_not_null().to_numpy()
+        brk_key = (days << _SEG_SHIFT) + (to_us(out["brk_ts"]) - bar_ts[first])
+        start = np.where(has_brk, np.searchsorted(key, brk_key, side="right"), offsets[1:])
+        up = (out["direction"] == "UP").fill_null(False).to_numpy()
+        hi, lo = out["ib_high"].to_numpy(), out["ib_low"].to_numpy()
+        side = np.where(up, BELOW, ABOVE)
+        index = build_touch_index(bars["high"].to_numpy(), bars["low"].to_numpy(), offsets)
+        ib_end_us = to_us(out["ib_end_utc"])
+        for name, level in {"dbl": np.where(up, lo, hi), "mid": lo + (hi - lo) / 2, "line": np.where(up, hi, lo)}.items():
+            hit, _ = first_touch(index, days, start, level, side, excursion=False)
+            has = hit < offsets[1:]
+            at = np.minimum(hit, bars.height - 1)
+            # zakres do ostatniego baru z ts == ts powrotu (jak filtr ts <= ret_ts)
+            last = np.where(has, np.searchsorted(key, key[at] if at.size else key[:0], side="right") - 1, offsets[1:] - 1)
+            exc = extreme(index, start, last, side)
+            dist = np.maximum(np.nan_to_num(np.where(up, exc - hi, lo - exc), nan=0.0), 0.0)
+            out = out.with_columns(
+                pl.Series(f"ret_{name}", has),
+                pl.Series(f"dist_{name}", dist),
+                pl.Series(f"time_{name}", np.where(has, (bar_ts[at] - ib_end_us) // 60_000_000 if at.size else 0, np.nan), nan_to_null=True).cast(pl.Int64))
+        out = out.filter(pl.col("has_ib") & pl.col("has_after") & pl.col("direction").is_not_null())
+    if breakout_direction != "BOTH": out = out.filter(pl.col("direction") == breakout_direction)
+
+    ib_range = pl.col("ib_high") - pl.col("ib_low")
+    cols = [
+        pl.col("date"), pl.col("direction"), ib_range.alias("ib_range"), pl.col("ib_high"), pl.col("ib_low"),
+        (pl.col("ib_low") + ib_range / 2).alias("ib_mid"), pl.col("ib_start_utc"), pl.col("ib_end_utc"), pl.col("brk_ts"),
+    ]
+    for key in ["dbl", "mid", "line"]:
+        dist = pl.col(f"dist_{key}")
+        cols += [
+            pl.col(f"ret_{key}"),
+            dist,
+            pl.when(ib_range > 0).then(dist / ib_range * 100).otherwise(0.0).alias(f"dist_pct_{key}"),
+            pl.col(f"time_{key}"),
+        ]
+    res = out.select(cols).sort("date")
+    return res if not res.is_empty() else pl.DataFrame()
+
+def analyze_ib_double_breakout(df, ib_start, ib_end, return_deadline, breakout_direction="BOTH", breakout_type="wick", is_overnight=False, start_date=None, end_date=None, use_cache=False, incremental=False):
+    source = df
+    with stage("prepare", cached=bool(use_cache)) as s:
+        df = scan_bars(source, ib_start, is_overnight, start_date, end_date, use_cache).collect()
+        s.rows = df.height
+    with stage("analysis", incremental=bool(incremental)) as s:
+        if incremental and isinstance(source, (str, os.PathLike)):
+            # Wyniki dzienne z magazynu (results_store); przeliczane są tylko nowe / zmienione dni
+            from results_store import analyze_incremental
+            res = analyze_incremental(source, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight, start_date, end_date,
+                                      bars=df)
         else:
-            entry_hit = after_trigger.filter(pl.col("high") >= entry_price)
-            
-        if entry_hit.is_empty():
-            trades.append({"date": date_val, "result": "MISSED", "pnl": 0.0, "r_result": 0.0, "comment": "Entry missed"})
-            continue 
-            
-        entry_ts = entry_hit["ts_utc"][0]
-        in_trade = after_trigger.filter(pl.col("ts_utc") > entry_ts)
-        
-        if in_trade.is_empty():
-            close_price = entry_hit["close"][0]
-            pnl = (close_price - entry_price) if trade_dir == "LONG" else (entry_price - close_price)
-            calc_r = pnl / risk_dist
-            pnl_cash = calc_r * risk_cash
-            trades.append({"date": date_val, "result": "CLOSE", "pnl": pnl_cash, "r_result": calc_r, "comment": "EOD"})
-            continue
-
-        outcome = "CLOSE"
-        exit_price = in_trade["close"][-1]
-        
-        for candle in in_trade.iter_rows(named=True):
-            if trade_dir == "LONG":
-                hit_sl = candle["low"] <= sl_price
-                hit_tp = candle["high"] >= tp_price
-            else:
-                hit_sl = candle["high"] >= sl_price
-                hit_tp = candle["low"] <= tp_price
-            
-            if hit_sl and hit_tp:
-                outcome = "LOSS"
-                exit_price = sl_price
-                break
-            elif hit_sl:
-                outcome = "LOSS"
-                exit_price = sl_price
-                break
-            elif hit_tp:
-                outcome = "WIN"
-                exit_price = tp_price
-                break
-        
-        pnl_pts = (exit_price - entry_price) if trade_dir == "LONG" else (entry_price - exit_price)
-        r_res = pnl_pts / risk_dist
-        pnl_cash = r_res * risk_cash
-        trades.append({"date": date_val, "result": outcome, "pnl": pnl_cash, "r_result": r_res, "comment": f"{outcome}"})
-        
-    return pl.DataFrame(trades)
+            res = _analyze_columnar(df, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight, start_date, end_date)
+        s.rows = res.height
+    return res, df
+
+# --- SYMULATOR (wszystkie dni naraz) ---
+# (result, comment) dla kodów zwracanych przez _simulate_arrays
+SIM_OUTCOMES = [
+    ("INVALID (Double Break)", "Trigger missed"),
+    ("NO TRIGGER", "Trigger missed"),
+    ("INVALID (Double Break)", "Setup cancelled"),
+    ("NO TIME", "End of day"),
+    ("MISSED", "Entry missed"),
+    ("CLOSE", "EOD"),
+    ("WIN", "WIN"),
+    ("LOSS", "LOSS"),
+    ("CLOSE", "CLOSE"),
+]
+SIM_INVALID_NO_TRIGGER, SIM_NO_TRIGGER, SIM_INVALID, SIM_NO_TIME, SIM_MISSED, SIM_CLOSE_ON_ENTRY, SIM_WIN, SIM_LOSS, SIM_CLOSE = range(len(SIM_OUTCOMES))
+
+_SEG_SHIFT = 42  # klucz baru = (nr dnia << 42) + µs od początku okna dnia; okno < 50 dni
+
+def _sim_day_arrays(df_all, res_df, deadline, day_index=None):
+    """
+    Bary okna handlowego [ib_end_utc, deadline] każdego dnia z res_df, sklejone w płaskie tablice
+    z offsetami dni (CSR). Dni bez barów w oknie są pomijane, tak jak w pętli run_simulation.
+    Ceny dni DOWN są mnożone przez -1 (high/low zamieniają się miejscami), więc symulator stosuje
+    jedną regułę "UP" do wszystkich dni.
+    """
+    if res_df.is_empty(): return None
+    if day_index is None: day_index = build_day_index(df_all)
+    deadline_utc = local_to_utc(res_df["date"], deadline)
+    day_start, day_end = day_bounds(day_index, res_df["date"])
+    ts_all = ts_array(df_all)
+    rows, counts = window_rows(ts_all, day_start, day_end, to_us(res_df["ib_end_utc"]), to_us(deadline_utc))
+    keep = counts > 0
+    if not keep.any(): return None
+    days = res_df.filter(pl.Series(keep))
+    counts = counts[keep]
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    seg = np.repeat(np.arange(counts.size), counts)
+
+    is_up = (days["direction"] == "UP").to_numpy()
+    ib_h, ib_l = days["ib_high"].to_numpy(), days["ib_low"].to_numpy()
+    up_b = is_up[seg]
+    high, low, close = price_rows(df_all, "high", rows), price_rows(df_all, "low", rows), price_rows(df_all, "close", rows)
+    bar_ts = ts_all[rows]
+    return {
+        "date": days["date"],
+        "is_up": is_up,
+        "ib_range": days["ib_range"].to_numpy(),
+        "base": np.where(is_up, ib_h, -ib_l),
+        "invalidation": np.where(is_up, ib_l, -ib_h),
+        "offsets": offsets,
+        "seg": seg,
+        "ts": bar_ts,
+        "key": (seg.astype(np.int64) << _SEG_SHIFT) + (bar_ts - bar_ts[offsets[:-1]][seg]),
+        "high": np.where(up_b, high, -low),
+        "low": np.where(up_b, low, -high),
+        "close": np.where(up_b, close, -close),
+    }
+
+def _touch_index(arr):
+    # Indeks pierwszego dotknięcia budowany raz na zestaw tablic dni (run_sweep / walk-forward pytają wielokrotnie)
+    if "touch" not in arr: arr["touch"] = build_touch_index(arr["high"], arr["low"], arr["offsets"])
+    return arr["touch"]
+
+def _sim_entries(arr, trigger_pct, entry_pct):
+    """
+    Trigger, unieważnienie i wejście - część reguł run_simulation niezależna od wyjścia (wspólna dla TREND / FADE
+    i dla wszystkich reguł wyjścia w exits.py). Zwraca (kod dnia bez otwartej pozycji albo -1 dla dni z barami
+    w transakcji, cena wejścia, bar wejścia, pierwszy bar w transakcji) per dzień.
+    """
+    offsets, key, rng, base = arr["offsets"], arr["key"], arr["ib_range"], arr["base"]
+    n, starts, ends = key.size, offsets[:-1], offsets[1:]
+    touch, days = _touch_index(arr), np.arange(starts.size)
+    trigger_price = base + (rng * (trigger_pct / 100))
+    entry_price = base + (rng * (entry_pct / 100))
+
+    trig_first, _ = first_touch(touch, days, starts, trigger_price, ABOVE, excursion=False)
+    inv_first, _ = first_touch(touch, days, starts, arr["invalidation"], BELOW, strict=True, excursion=False)
+    has_trig, has_inv = trig_first < ends, inv_first < ends
+    inv_before = has_inv & (key[np.minimum(inv_first, n - 1)] < key[np.minimum(trig_first, n - 1)])
+
+    # pierwsza świeca z ts > trigger_ts (searchsorted po kluczu dzień+czas, odporne na duplikaty ts)
+    after_first = np.where(has_trig, np.searchsorted(key, key[np.minimum(trig_first, n - 1)], side="right"), ends)
+    entry_first, _ = first_touch(touch, days, np.minimum(after_first, ends), entry_price, BELOW, excursion=False)
+    has_entry = entry_first < ends
+    in_trade_first = np.where(has_entry, np.searchsorted(key, key[np.minimum(entry_first, n - 1)], side="right"), ends)
+    pending = np.select(
+        [~has_trig & has_inv, ~has_trig, inv_before, after_first >= ends, ~has_entry, in_trade_first >= ends],
+        [SIM_INVALID_NO_TRIGGER, SIM_NO_TRIGGER, SIM_INVALID, SIM_NO_TIME, SIM_MISSED, SIM_CLOSE_ON_ENTRY], -1)
+    return pending, entry_price, entry_first, in_trade_first
+
+def _simulate_arrays(arr, trigger_pct, entry_pct, tp_pct, sl_dist_pct, strategy_mode="TREND", intrabar=None):
+    """
+    Reguły run_simulation na tablicach z _sim_day_arrays. Zwraca (kody SIM_OUTCOMES, wynik w R) per dzień.
+    Wszystkie poziomy liczone są w przestrzeni lustrzanej (dni DOWN * -1); każde "pierwsza świeca, która
+    dotknęła poziomu" to zapytanie do indeksu first_touch (O(log n) na dzień zamiast maski po wszystkich barach).
+    intrabar (intrabar.IntrabarSource): świece z SL i TP rozstrzygane danymi 1s / tick zamiast LOSS.
+    """
+    offsets, key, close = arr["offsets"], arr["key"], arr["close"]
+    rng, base = arr["ib_range"], arr["base"]
+    n, ends = key.size, offsets[1:]
+    touch, days = _touch_index(arr), np.arange(ends.size)
+    pending, entry_price, entry_first, in_trade_first = _sim_entries(arr, trigger_pct, entry_pct)
+
+    tp_price = base + (rng * (tp_pct / 100))
+    is_trend = strategy_mode == "TREND"
+    sl_price = entry_price - (rng * (sl_dist_pct / 100)) if is_trend else entry_price + (rng * (sl_dist_pct / 100))
+    risk_dist = np.abs(entry_price - sl_price)
+    risk_dist[risk_dist == 0] = 1.0
+
+    sl_first, _ = first_touch(touch, days, in_trade_first, sl_price, BELOW if is_trend else ABOVE, excursion=False)
+    tp_first, _ = first_touch(touch, days, in_trade_first, tp_price, ABOVE if is_trend else BELOW, excursion=False)
+    exit_first = np.minimum(sl_first, tp_first)
+    has_exit = exit_first < ends
+    exit_sl = sl_first <= tp_first  # ta sama świeca SL i TP -> LOSS (o ile nie rozstrzygną dane 1s / tick)
+
+    codes = np.where(pending >= 0, pending, np.select([~has_exit, exit_sl], [SIM_CLOSE, SIM_LOSS], SIM_WIN)).astype(np.int8)
+    if intrabar is not None:
+        amb = np.flatnonzero((codes == SIM_LOSS) & (sl_first == tp_first))
+        with stage("simulate.intrabar", rows=amb.size):
+            order = intrabar.resolve(amb, arr["ts"][sl_first[amb]], arr["is_up"][amb], sl_price[amb], tp_price[amb], is_trend)
+        codes[amb[order == TP_FIRST]] = SIM_WIN
+    exit_price = np.select(
+        [codes == SIM_CLOSE_ON_ENTRY, codes == SIM_CLOSE, codes == SIM_LOSS, codes == SIM_WIN],
+        [close[np.minimum(entry_first, n - 1)], close[ends - 1], sl_price, tp_price],
+        entry_price)
+    pnl_pts = exit_price - entry_price if is_trend else entry_price - exit_price
+    return codes, pnl_pts / risk_dist
+
+def run_simulation(df_all, res_df, trigger_pct, entry_pct, tp_pct, sl_dist_pct, deadline, risk_model="FIXED", risk_value=100.0, strategy_mode="TREND", day_index=None, intrabar=None):
+    """
+    Symulacja setupu dla wszystkich dni z res_df. intrabar (intrabar.IntrabarSource, opcjonalnie): świece, które
+    dotknęły SL i TP, rozstrzygane danymi 1s / tick - takie transakcje mają komentarz "... (intrabar)",
+    a liczby i czas odczytu są w intrabar.last.
+    """
+    with stage("simulate.arrays") as s:
+        arr = _sim_day_arrays(df_all, res_df, deadline, day_index)
+        s.rows = arr["key"].size if arr is not None else 0
+    if arr is None: return pl.DataFrame()
+    with stage("simulate", rows=len(arr["date"]), mode=strategy_mode):
+        codes, r_res = _simulate_arrays(arr, trigger_pct, entry_pct, tp_pct, sl_dist_pct, strategy_mode, intrabar)
+    risk_cash = risk_value if risk_model == "FIXED" else 100.0
+    comments = [SIM_OUTCOMES[c][1] for c in codes]
+    if intrabar is not None:
+        for i in intrabar.last["days"]: comments[i] += " (intrabar)"
+    return pl.DataFrame({
+        "date": arr["date"],
+        "result": [SIM_OUTCOMES[c][0] for c in codes],
+        "pnl": r_res * risk_cash,
+        "r_result": r_res,
+        "comment": comments,
+    })
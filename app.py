@@ -1,14 +1,26 @@
 import streamlit as st
 import polars as pl
 import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 from datetime import datetime, time, timedelta, date
-import pytz
 import os
 import math
+from collections import OrderedDict
 
 try:
-    from analysis_ib_double_breakout import analyze_ib_double_breakout, calculate_streaks, run_simulation
+    from analysis_ib_double_breakout import analyze_ib_double_breakout, run_simulation, scan_bars
+    from sweep import run_sweep, pct_range
+    from walkforward import run_walk_forward, WF_SCORES
+    from montecarlo import monte_carlo, mc_summary, MC_METHODS
+    from metrics import sim_metrics, equity_curve, breakdown, BREAKDOWNS
+    from day_index import build_day_index, ts_window
+    from session_calendar import session_calendar
+    from compact_bars import to_compact, nbytes
+    from charts import ChartCache, day_chart_png, trade_chart_png, trade_levels
+    from profiling import Profiler, activate as activate_profiler
+    from ib_windows import analyze_windows, compare_windows, TARGETS
+    from dataset import find_source, fingerprint, is_dataset, scan_source
+    from intrabar import IntrabarSource
+    from conditional import conditional_stats, DIMENSIONS, IB_BUCKETS
 except ImportError:
     st.error("Błąd: Nie znaleziono pliku 'analysis_ib_double_breakout.py'.")
     st.stop()
@@ -28,85 +40,180 @@ st.title("🎯 MNQ – IB Multi-Strategy (Advanced Analytics)")
 
 if 'res' not in st.session_state: st.session_state['res'] = None
 if 'df_all' not in st.session_state: st.session_state['df_all'] = None
+if 'day_index' not in st.session_state: st.session_state['day_index'] = None
 if 'date_idx' not in st.session_state: st.session_state['date_idx'] = 0
 if 'sim_idx' not in st.session_state: st.session_state['sim_idx'] = 0
 if 'sim_res' not in st.session_state: st.session_state['sim_res'] = None
+if 'opt_res' not in st.session_state: st.session_state['opt_res'] = None
+if 'wf_res' not in st.session_state: st.session_state['wf_res'] = None
+if 'mc_res' not in st.session_state: st.session_state['mc_res'] = None
+if 'sim_stats' not in st.session_state: st.session_state['sim_stats'] = None
+if 'chart_cache' not in st.session_state: st.session_state['chart_cache'] = ChartCache()
+if 'analysis_key' not in st.session_state: st.session_state['analysis_key'] = None
+if 'sim_on' not in st.session_state: st.session_state['sim_on'] = False
+if 'sim_key' not in st.session_state: st.session_state['sim_key'] = None
+if 'risk_val' not in st.session_state: st.session_state['risk_val'] = 100.0
+if 'start_cap' not in st.session_state: st.session_state['start_cap'] = 10000.0
+if 'hit_rates' not in st.session_state: st.session_state['hit_rates'] = {}
+if 'profiler' not in st.session_state: st.session_state['profiler'] = None
+if 'ibw_res' not in st.session_state: st.session_state['ibw_res'] = None
+if 'intrabar' not in st.session_state: st.session_state['intrabar'] = None
+if 'sim_intrabar' not in st.session_state: st.session_state['sim_intrabar'] = None
+if 'conditional' not in st.session_state: st.session_state['conditional'] = {}
+
+# --- MEMOIZACJA (per sesja, ograniczona LRU) ---
+# Wpisy analizy trzymają tylko wyniki dzienne; bary (df_all + indeks dni) są we własnym memo na jeden wpis,
+# a po jego wymianie wczytywane ponownie z cache barów (scan_bars), więc w sesji jest najwyżej jedna kopia.
+MEMO_SIZE = {"analysis": 4, "bars": 1, "sim": 32}
+
+def memoized(name, key, fn):
+    cache = st.session_state.setdefault(f"memo_{name}", OrderedDict())
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = fn()
+    cache[key] = value
+    while len(cache) > MEMO_SIZE[name]: cache.popitem(last=False)
+    return value
+
+def use_profiler():
+    # Profiler sesji (panel "Performance") albo None; wywoływane też na starcie fragmentów (osobny kontekst wątku)
+    activate_profiler(st.session_state['profiler'])
 
 # --- DANE ---
-DATA_FILENAME = "data.parquet"
-if not os.path.exists(DATA_FILENAME):
-    for root, dirs, files in os.walk("."):
-        if "data.parquet" in files:
-            DATA_FILENAME = os.path.join(root, "data.parquet")
-            break
-
-def _local_to_utc(date_obj, time_obj):
-    tz = pytz.timezone("America/New_York")
-    dt_naive = datetime.combine(date_obj, time_obj)
-    try: return tz.localize(dt_naive, is_dst=None).astimezone(pytz.UTC)
-    except: return tz.localize(dt_naive, is_dst=False).astimezone(pytz.UTC)
+# Katalog data/ partycjonowany year=/month= (dataset.py) albo pojedynczy data.parquet - tutaj lub do 2 poziomów niżej
+DATA_FILENAME = find_source() or "data.parquet"
 
 @st.cache_resource
-def load_data(filepath):
+def load_data(filepath, version):
+    # Leniwy scan: kolumny i zakres dat "Od"/"Do" są spychane do czytnika parquet w analyze_ib_double_breakout
+    # (version = fingerprint źródła, więc nowe partycje dają nowy scan)
     if not os.path.exists(filepath): return None
-    try: return pl.read_parquet(filepath)
+    try:
+        lf = scan_source(filepath)
+        lf.collect_schema()
+        return lf
     except Exception as e: return str(e)
 
-df_raw = load_data(DATA_FILENAME)
+@st.cache_data(max_entries=8)
+def date_bounds(data_key, _lf):
+    # Zakres dat pliku do domyślnych "Od"/"Do" - skan min/max tylko raz na plik (data_key zmienia się z mtime)
+    ts_col = _lf.collect_schema().names()[0]
+    min_ts, max_ts = _lf.select(pl.col(ts_col).min().alias("min"), pl.col(ts_col).max().alias("max")).collect().row(0)
+    if isinstance(min_ts, str):
+        return datetime.strptime(min_ts[:8], "%Y%m%d").date(), datetime.strptime(max_ts[:8], "%Y%m%d").date()
+    return min_ts.date(), max_ts.date()
+
+data_key = (os.path.abspath(DATA_FILENAME), fingerprint(DATA_FILENAME)) if os.path.exists(DATA_FILENAME) else None
+df_raw = load_data(DATA_FILENAME, data_key)
+data_src = DATA_FILENAME  # ścieżka -> przygotowane bary z cache na dysku (bar_cache)
 
 if df_raw is None or isinstance(df_raw, str):
-    st.warning(f"⚠️ Nie znaleziono pliku data.parquet")
+    st.warning(f"⚠️ Nie znaleziono danych (data.parquet ani katalogu data/ z partycjami year=/month=)")
     uploaded_file = st.sidebar.file_uploader("📂 Wgraj plik ręcznie", type=['parquet'])
     if uploaded_file is not None:
         try:
-            df_raw = pl.read_parquet(uploaded_file)
+            df_raw = pl.read_parquet(uploaded_file).lazy()
+            data_src = df_raw
+            data_key = ("upload", uploaded_file.file_id)
             st.sidebar.success("✅ Wczytano!")
         except: pass
 
-if df_raw is not None and isinstance(df_raw, pl.DataFrame):
+if df_raw is not None and isinstance(df_raw, pl.LazyFrame):
     # --- SIDEBAR ---
     with st.sidebar:
         st.header("⚙️ Ustawienia Danych")
+        if len(df_raw.collect_schema()) == 1:
+            st.info("Plik w formacie tekstowym (jedna kolumna). Konwersja do typowanego Parquet przyspieszy wczytywanie: `python convert_export.py eksport.txt -o data.parquet`")
         try:
-            ts_col = df_raw.columns[0]
-            min_ts = df_raw.select(pl.col(ts_col).min()).item()
-            max_ts = df_raw.select(pl.col(ts_col).max()).item()
-            if isinstance(min_ts, str):
-                 d_start_def = datetime.strptime(min_ts[:8], "%Y%m%d").date()
-                 d_end_def = datetime.strptime(max_ts[:8], "%Y%m%d").date()
-            else:
-                 d_start_def = min_ts.date()
-                 d_end_def = max_ts.date()
+            d_start_def, d_end_def = date_bounds(data_key, df_raw)
         except:
             d_start_def = date(2024, 1, 1)
             d_end_def = date.today()
 
         col_d1, col_d2 = st.columns(2)
         start_d, end_d = col_d1.date_input("Od", d_start_def), col_d2.date_input("Do", d_end_def)
+        # Cache przygotowanych barów i magazyn wyników trzymają całą historię: przy węższym "Od"/"Do" pojedynczy plik
+        # czytany jest z pushdownem dat, a zbiór partycjonowany i tak ładuje z cache tylko partycje z zakresu
+        full_range = start_d <= d_start_def and end_d >= d_end_def
+        use_cache = isinstance(data_src, str) and (full_range or is_dataset(data_src))
+        incremental = isinstance(data_src, str) and full_range
         ib_s, ib_e = st.time_input("Start IB", time(1, 0)), st.time_input("Koniec IB", time(2, 0))
         dead = st.time_input("Deadline", time(17, 0))
         is_ov = st.checkbox("Overnight", value=(ib_s > ib_e))
         b_dir = st.radio("Kierunek Wybicia", ["UP", "DOWN", "BOTH"], index=2)
         b_typ = st.radio("Typ Wybicia", ["wick", "close"], index=0)
+        compact = st.checkbox("Tryb kompaktowy (mniej RAM)", value=False, help="Bary trzymane jako ticki Int32 + znacznik czasu Int64")
+        prefetch = st.checkbox("Wczytuj wykresy sąsiednich dni w tle", value=True)
+        fine_path = st.text_input("Dane 1s / tick (opcjonalnie)", value=find_source(("data_1s", "data_1s.parquet")) or "",
+                                  help="Plik parquet albo katalog year=/month=; rozstrzyga świece, które dotknęły SL i TP (zamiast LOSS)")
+        if not fine_path: st.session_state['intrabar'] = None
+        elif st.session_state['intrabar'] is None or st.session_state['intrabar'].path != fine_path:
+            # źródło per sesja: okna 1s zostają w pamięci między symulacjami, statystyki (last) nie mieszają się między sesjami
+            try: st.session_state['intrabar'] = IntrabarSource(fine_path)
+            except (OSError, ValueError) as e:
+                st.session_state['intrabar'] = None
+                st.warning(f"Dane 1s / tick niedostępne: {e}")
+        perf_panel = st.expander("⏱️ Performance")
+        if perf_panel.checkbox("Profilowanie etapów", value=False, help="Czas, wiersze i szczyt pamięci: wczytanie, analiza, symulacja, metryki, wykresy"):
+            if st.session_state['profiler'] is None: st.session_state['profiler'] = Profiler()
+        elif st.session_state['profiler'] is not None:
+            st.session_state['profiler'].close()  # tracemalloc zatrzymuje dopiero ostatni profiler (inne sesje)
+            st.session_state['profiler'] = None
+        use_profiler()
 
         run_btn = st.button("🚀 Uruchom Analizę", type="primary")
 
     if run_btn:
+        fresh = {}
+
+        def _analyze():
+            res, df_all = analyze_ib_double_breakout(data_src, ib_s, ib_e, dead, b_dir, b_typ, is_ov, start_d, end_d,
+                                                     use_cache=use_cache, incremental=incremental)
+            fresh["df_all"] = df_all
+            hit_rates = {k: res[f"ret_{k}"].sum() / len(res) * 100 for k in ["dbl", "mid", "line"]} if not res.is_empty() else {}
+            return {"res": res, "charts": ChartCache(), "hit_rates": hit_rates, "conditional": {}}
+
+        def _bars():
+            # bary z właśnie policzonej analizy albo (trafienie memo analizy po wymianie barów) ponowny odczyt
+            df_all = fresh.get("df_all")
+            if df_all is None: df_all = scan_bars(data_src, ib_s, is_ov, start_d, end_d, use_cache).collect()
+            note = None
+            if compact:
+                try:
+                    before = nbytes(df_all)
+                    df_all = to_compact(df_all)
+                    note = ("caption", f"Bary: {before / 2**20:.1f} MB -> {nbytes(df_all) / 2**20:.1f} MB")
+                except ValueError as e:
+                    note = ("warning", f"Tryb kompaktowy niedostępny: {e}")
+            return {"df_all": df_all, "day_index": build_day_index(df_all), "note": note}
+
+        analysis_key = (data_key, ib_s, ib_e, dead, b_dir, b_typ, is_ov, start_d, end_d, compact)
         with st.spinner("Przetwarzanie danych..."):
-            res, df_all = analyze_ib_double_breakout(df_raw, ib_s, ib_e, dead, b_dir, b_typ, is_ov, start_d, end_d)
-            st.session_state['res'], st.session_state['df_all'] = res, df_all
-            st.session_state['date_idx'] = 0
-            st.session_state['sim_idx'] = 0
+            analysis = memoized("analysis", analysis_key, _analyze)
+            bars = memoized("bars", (data_key, ib_s, is_ov, start_d, end_d, compact), _bars)
+        if bars["note"]: getattr(st.sidebar, bars["note"][0])(bars["note"][1])
+        st.session_state['res'], st.session_state['df_all'] = analysis["res"], bars["df_all"]
+        st.session_state['day_index'] = bars["day_index"]
+        st.session_state['chart_cache'] = analysis["charts"]
+        st.session_state['hit_rates'] = analysis["hit_rates"]
+        st.session_state['conditional'] = analysis["conditional"]
+        st.session_state['analysis_key'] = analysis_key
+        st.session_state['date_idx'] = 0
+        st.session_state['sim_idx'] = 0
+        st.session_state['opt_res'] = None
 
     if st.session_state['res'] is not None and not st.session_state['res'].is_empty():
         res = st.session_state['res']
         df_all = st.session_state['df_all']
+        day_index = st.session_state['day_index']
         
-        tab1, tab2 = st.tabs(["📊 Statystyki Wybicia", "🎲 Symulator & Wizualizacja"])
+        charts = st.session_state['chart_cache']
 
-        # --- TAB 1: Statystyki ---
-        with tab1:
-            st.subheader("Wykres i Statystyki Dystrybucji")
+        # --- FRAGMENTY (klik w nawigacji / zmiana parametru symulatora przelicza tylko swoją część strony) ---
+        @st.fragment
+        def day_navigator():
+            use_profiler()
             available_dates = sorted(res["date"].unique(), reverse=True)
             c_nav1, c_nav2, c_nav3 = st.columns([1, 2, 1])
             with c_nav1:
@@ -117,42 +224,70 @@ if df_raw is not None and isinstance(df_raw, pl.DataFrame):
                     st.session_state['date_idx'] -= 1
             with c_nav2:
                 current_date = available_dates[st.session_state['date_idx']]
+                cal = session_calendar([current_date], ib_s, ib_e, dead, is_ov).row(0, named=True)
                 st.markdown(f"<h4 style='text-align: center;'>{current_date}</h4>", unsafe_allow_html=True)
-            row = res.filter(pl.col("date") == current_date).row(0, named=True)
-            ny_tz = pytz.timezone("America/New_York")
-            pdf = df_all.filter((pl.col("ts_utc") >= row["ib_start_utc"] - timedelta(minutes=60)) & 
-                              (pl.col("ts_utc") <= _local_to_utc(current_date, dead) + timedelta(minutes=30))).to_pandas()
-            if not pdf.empty:
-                plt.style.use('dark_background')
-                fig_p, ax_p = plt.subplots(figsize=(10, 3.5), dpi=100)
-                fig_p.patch.set_facecolor("#0e1117")
-                ax_p.plot(pdf["ts_ny"].dt.to_pydatetime(), pdf["close"], color="white", lw=0.8, alpha=0.9)
-                
-                # IB High/Low - cienkie szare
-                ax_p.axhline(row["ib_high"], color="#B0BEC5", ls="-", lw=0.7, alpha=0.6, label="IB High")
-                ax_p.axhline(row["ib_low"], color="#B0BEC5", ls="-", lw=0.7, alpha=0.6, label="IB Low")
-                
-                ib_s_ny = row["ib_start_utc"].astimezone(ny_tz)
-                ib_e_ny = row["ib_end_utc"].astimezone(ny_tz)
-                ax_p.axvspan(ib_s_ny, ib_e_ny, color='#4fc3f7', alpha=0.15)
-                
-                rng = row["ib_range"]
-                for m in [1, 2]:
-                    ax_p.axhline(row["ib_high"] + rng*m, color="gray", ls=":", lw=0.5, alpha=0.3)
-                    ax_p.axhline(row["ib_low"] - rng*m, color="gray", ls=":", lw=0.5, alpha=0.3)
-                
-                ax_p.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M', tz=ny_tz))
-                st.pyplot(fig_p)
-            st.divider()
-            m1, m2, m3 = st.columns(3)
-            strat_info = [("dbl", "Double Breakout"), ("mid", "50% Retr."), ("line", "Return Line")]
-            for i, (k, label) in enumerate(strat_info):
-                with [m1, m2, m3][i]:
-                    hits = res.filter(pl.col(f"ret_{k}"))
-                    st.metric(label, f"{len(hits)/len(res)*100:.1f}%")
+                if cal["is_holiday"] or cal["is_early_close"]:
+                    st.markdown(f"<div style='text-align: center; color: orange;'>{'Święto giełdowe' if cal['is_holiday'] else 'Skrócona sesja (13:00 ET)'}</div>", unsafe_allow_html=True)
 
-        # --- TAB 2: Symulator ---
-        with tab2:
+            def _day_png(d):
+                r = res.filter(pl.col("date") == d).row(0, named=True)
+                deadline_utc = session_calendar([d], ib_s, ib_e, dead, is_ov)["deadline_utc"][0]
+                window = ts_window(df_all, r["ib_start_utc"] - timedelta(minutes=60), deadline_utc + timedelta(minutes=30))
+                return day_chart_png(window, r) if not window.is_empty() else None
+
+            day_key = lambda d: ("day", d, ib_s, ib_e, dead, is_ov)
+            png = charts.get(day_key(current_date), lambda: _day_png(current_date))
+            if png is not None: st.image(png, use_container_width=True)
+            if prefetch:
+                idx = st.session_state['date_idx']
+                charts.prefetch([(day_key(d), lambda d=d: _day_png(d)) for d in available_dates[max(idx - 1, 0):idx + 2] if d != current_date])
+
+        @st.fragment
+        def trade_navigator(sim_res, trigger_pct, entry_pct, tp_pct, sl_dist_pct, is_fade):
+            use_profiler()
+            st.subheader("🔍 Przegląd Transakcji (Wizualizacja)")
+            all_logs = sim_res.sort("date", descending=True)
+            trade_dates = all_logs["date"].to_list()
+
+            if trade_dates:
+                cn1, cn2, cn3 = st.columns([1, 2, 1])
+                with cn1:
+                    if st.button("⬅️ Poprzednia") and st.session_state['sim_idx'] < len(trade_dates) - 1:
+                        st.session_state['sim_idx'] += 1
+                with cn3:
+                    if st.button("Następna ➡️") and st.session_state['sim_idx'] > 0:
+                        st.session_state['sim_idx'] -= 1
+
+                curr_trade_date = trade_dates[st.session_state['sim_idx']]
+                curr_trade_info = all_logs.filter(pl.col("date") == curr_trade_date).row(0, named=True)
+                res_txt = curr_trade_info["result"]
+                res_color = "green" if res_txt == "WIN" else ("red" if res_txt == "LOSS" else "gray")
+
+                with cn2:
+                    st.markdown(f"<h4 style='text-align: center;'>{curr_trade_date} <span style='color:{res_color}'>[{res_txt}]</span></h4>", unsafe_allow_html=True)
+                    if curr_trade_info["pnl"] != 0:
+                        st.markdown(f"<div style='text-align: center;'>PnL: <b>${curr_trade_info['pnl']:.2f}</b> ({curr_trade_info['r_result']:.2f} R)</div>", unsafe_allow_html=True)
+                    else:
+                        st.markdown(f"<div style='text-align: center;'><i>{curr_trade_info.get('comment', '')}</i></div>", unsafe_allow_html=True)
+
+                def _trade_png(d, result):
+                    r = res.filter(pl.col("date") == d).row(0, named=True)
+                    deadline_utc = session_calendar([d], ib_s, ib_e, dead, is_ov)["deadline_utc"][0]
+                    window = ts_window(df_all, r["ib_start_utc"] - timedelta(minutes=30), deadline_utc + timedelta(minutes=30))
+                    if window.is_empty(): return None
+                    return trade_chart_png(window, r, trade_levels(r, trigger_pct, entry_pct, tp_pct, sl_dist_pct, is_fade), result)
+
+                trade_key = lambda d, result: ("trade", d, result, trigger_pct, entry_pct, tp_pct, sl_dist_pct, is_fade, ib_s, ib_e, dead, is_ov)
+                png = charts.get(trade_key(curr_trade_date, res_txt), lambda: _trade_png(curr_trade_date, res_txt))
+                if png is not None: st.image(png, use_container_width=True)
+                if prefetch:
+                    idx = st.session_state['sim_idx']
+                    charts.prefetch([(trade_key(d, r_txt), lambda d=d, r_txt=r_txt: _trade_png(d, r_txt))
+                                     for d, r_txt in all_logs.select(["date", "result"]).slice(max(idx - 1, 0), 3).iter_rows() if d != curr_trade_date])
+
+        @st.fragment
+        def simulator():
+            use_profiler()
             st.subheader("🛠️ Konfiguracja Strategii")
             
             sc1, sc2 = st.columns([1, 1])
@@ -190,12 +325,25 @@ if df_raw is not None and isinstance(df_raw, pl.DataFrame):
 
             st.divider()
             
-            if st.button("🎲 Symuluj", type="primary"):
+            st.session_state['risk_val'], st.session_state['start_cap'] = risk_val, start_cap
+            if st.button("🎲 Symuluj", type="primary"): st.session_state['sim_on'] = True
+            if st.session_state['sim_on']:
+                # po pierwszym "Symuluj" każda zmiana parametru przelicza tylko symulację (z cache dla powtórzonych ustawień)
                 mode_code = "FADE" if is_fade else "TREND"
-                sim_res = run_simulation(df_all, res, trigger_pct, entry_pct, tp_pct, sl_dist_pct, dead, 
-                                         risk_model=sim_risk_type, risk_value=risk_val, strategy_mode=mode_code)
-                st.session_state['sim_res'] = sim_res
-                st.session_state['sim_idx'] = 0
+                intrabar = st.session_state['intrabar']
+                sim_key = (st.session_state['analysis_key'], trigger_pct, entry_pct, tp_pct, sl_dist_pct, dead, sim_risk_type, risk_val, mode_code,
+                           intrabar.path if intrabar else None)
+                def _simulate():
+                    trades = run_simulation(df_all, res, trigger_pct, entry_pct, tp_pct, sl_dist_pct, dead, risk_model=sim_risk_type,
+                                            risk_value=risk_val, strategy_mode=mode_code, day_index=day_index, intrabar=intrabar)
+                    return trades, (dict(intrabar.last) if intrabar else None)
+                sim_res, sim_intrabar = memoized("sim", sim_key, _simulate)
+                if sim_key != st.session_state['sim_key']:
+                    st.session_state['sim_res'], st.session_state['sim_key'] = sim_res, sim_key
+                    st.session_state['sim_intrabar'] = sim_intrabar
+                    st.session_state['sim_idx'] = 0
+                    st.session_state['mc_res'] = None
+                    st.session_state['sim_stats'] = None
 
             if st.session_state['sim_res'] is not None and not st.session_state['sim_res'].is_empty():
                 sim_res = st.session_state['sim_res']
@@ -208,144 +356,56 @@ if df_raw is not None and isinstance(df_raw, pl.DataFrame):
                     if not invalid_trades.is_empty():
                         st.info(f"Odrzucono {len(invalid_trades)} setupów z powodu Double Breakout.")
                 else:
-                    # STATYSTYKI
+                    # STATYSTYKI (liczone raz na symulację i kapitał startowy, nie przy każdym rerunie)
+                    if st.session_state['sim_stats'] is None or st.session_state['sim_stats'][0] != start_cap:
+                        st.session_state['sim_stats'] = (start_cap, sim_metrics(sim_res, start_cap).row(0, named=True), equity_curve(sim_res, start_cap))
+                    _, stats, curve_df = st.session_state['sim_stats']
                     total_days = len(res["date"].unique())
-                    total_trades = len(valid_trades)
-                    wins = valid_trades.filter(pl.col("result") == "WIN")
-                    losses = valid_trades.filter(pl.col("result") == "LOSS")
-                    num_wins = len(wins)
-                    num_losses = len(losses)
-                    total_pnl = valid_trades["pnl"].sum()
-                    total_r = valid_trades["r_result"].sum()
-                    win_rate = num_wins / total_trades * 100
-                    
-                    # Krzywa Kapitału
-                    curve_df = valid_trades.select(["date", "pnl"]).sort("date")
-                    equity_curve = [start_cap]
-                    dates = [curve_df["date"][0] - timedelta(days=1)]
-                    
-                    curr_eq = start_cap
-                    max_eq = start_cap
-                    max_dd_val = 0.0
-                    
-                    for row in curve_df.iter_rows(named=True):
-                        curr_eq += row["pnl"]
-                        equity_curve.append(curr_eq)
-                        dates.append(row["date"])
-                        if curr_eq > max_eq: max_eq = curr_eq
-                        dd = curr_eq - max_eq
-                        if dd < max_dd_val: max_dd_val = dd
-                    
-                    max_dd_pct = (max_dd_val / max_eq * 100) if max_eq > 0 else 0.0
-
-                    valid_trades_streaks = valid_trades.with_columns((pl.col("pnl") > 0).alias("is_win"))
-                    win_streak, loss_streak = calculate_streaks(valid_trades_streaks, "is_win")
 
                     st.markdown("### 📊 Wyniki Symulacji")
                     m1, m2, m3, m4 = st.columns(4)
-                    m1.metric("Net Profit", f"${total_pnl:,.2f}", delta=f"{total_r:.2f} R")
-                    m2.metric("Win Rate", f"{win_rate:.1f}%")
-                    m3.metric("Profit Factor", f"{wins['pnl'].sum() / abs(losses['pnl'].sum()):.2f}" if not losses.is_empty() else "∞")
-                    m4.metric("Max Drawdown", f"${max_dd_val:,.2f}", delta=f"{max_dd_pct:.2f}%", delta_color="inverse")
+                    m1.metric("Net Profit", f"${stats['net_pnl']:,.2f}", delta=f"{stats['net_r']:.2f} R")
+                    m2.metric("Win Rate", f"{stats['win_rate']:.1f}%")
+                    m3.metric("Profit Factor", f"{stats['profit_factor']:.2f}" if stats['losses'] > 0 else "∞")
+                    m4.metric("Max Drawdown", f"${stats['max_dd']:,.2f}", delta=f"{stats['max_dd_pct']:.2f}%", delta_color="inverse")
                     
                     m5, m6, m7, m8 = st.columns(4)
-                    m5.metric("Total Trades / Days", f"{total_trades} / {total_days}")
-                    m6.metric("Wins / Losses", f"{num_wins} / {num_losses}")
-                    m7.metric("Max Win Streak", f"{win_streak}")
-                    m8.metric("Max Loss Streak", f"{loss_streak}", delta_color="inverse")
+                    m5.metric("Total Trades / Days", f"{stats['trades']} / {total_days}")
+                    m6.metric("Wins / Losses", f"{stats['wins']} / {stats['losses']}")
+                    m7.metric("Max Win Streak", f"{stats['max_win_streak']}")
+                    m8.metric("Max Loss Streak", f"{stats['max_loss_streak']}", delta_color="inverse")
+                    st.caption(f"Expectancy: ${stats['expectancy']:,.2f} ({stats['expectancy_r']:.2f} R) na transakcję")
+                    ib_stats = st.session_state['sim_intrabar']
+                    if ib_stats is not None:
+                        st.caption(f"🔬 Intrabar: rozstrzygnięto {ib_stats['resolved']} z {ib_stats['ambiguous']} świec z SL i TP "
+                                   f"(TP pierwszy: {ib_stats['tp_first']}); odczyt {ib_stats['windows_read']} okien z {ib_stats['files_read']} plików "
+                                   f"w {ib_stats['seconds'] * 1000:.0f} ms")
 
                     st.markdown("##### Krzywa Kapitału")
-                    chart_data = pl.DataFrame({"Date": dates[1:], "Equity": equity_curve[1:]})
-                    st.line_chart(chart_data.to_pandas(), x="Date", y="Equity", height=300)
+                    st.line_chart(curve_df.select(pl.col("date").alias("Date"), pl.col("equity").alias("Equity")).to_pandas(), x="Date", y="Equity", height=300)
+
+                    with st.expander("📅 Rozbicie wyników"):
+                        bd_by = st.radio("Podział", list(BREAKDOWNS), horizontal=True, format_func=lambda k: {"month": "Miesiąc", "weekday": "Dzień tygodnia", "direction": "Kierunek"}[k])
+                        st.dataframe(breakdown(sim_res, bd_by, res).drop("run").to_pandas(), use_container_width=True, hide_index=True)
+
+                    with st.expander("🎲 Monte Carlo (rozkład kapitału i obsunięć)"):
+                        mc1, mc2, mc3 = st.columns(3)
+                        mc_method = mc1.radio("Metoda", MC_METHODS, horizontal=True, help="bootstrap = losowanie ze zwracaniem, shuffle = permutacja transakcji")
+                        mc_paths = mc2.number_input("Liczba ścieżek", value=50000, min_value=100, step=10000)
+                        mc_ruin = mc3.number_input("Ruina przy spadku kapitału o (%)", value=50.0, min_value=1.0, max_value=100.0, step=5.0)
+                        if st.button("🎲 Losuj ścieżki"):
+                            st.session_state['mc_res'] = monte_carlo(sim_res, int(mc_paths), mc_method, start_cap, mc_ruin)
+                        if st.session_state['mc_res'] is not None and not st.session_state['mc_res'][0].is_empty():
+                            mc_paths_df, mc_bands = st.session_state['mc_res']
+                            mc_sum = mc_summary(mc_paths_df)
+                            st.metric("Ryzyko Ruiny", f"{mc_sum['risk_of_ruin_pct'][0]:.2f}%")
+                            st.line_chart(mc_bands.to_pandas(), x="trade", y=[c for c in mc_bands.columns if c != "trade"], height=300)
+                            st.dataframe(mc_sum.drop("risk_of_ruin_pct").to_pandas(), use_container_width=True, hide_index=True)
 
                     st.divider()
 
                     # --- WIZUALIZACJA SZCZEGÓŁOWA ---
-                    st.subheader("🔍 Przegląd Transakcji (Wizualizacja)")
-                    all_logs = sim_res.sort("date", descending=True)
-                    trade_dates = all_logs["date"].to_list()
-                    
-                    if trade_dates:
-                        cn1, cn2, cn3 = st.columns([1, 2, 1])
-                        with cn1:
-                            if st.button("⬅️ Poprzednia") and st.session_state['sim_idx'] < len(trade_dates) - 1:
-                                st.session_state['sim_idx'] += 1
-                        with cn3:
-                            if st.button("Następna ➡️") and st.session_state['sim_idx'] > 0:
-                                st.session_state['sim_idx'] -= 1
-                        
-                        curr_trade_date = trade_dates[st.session_state['sim_idx']]
-                        curr_trade_info = all_logs.filter(pl.col("date") == curr_trade_date).row(0, named=True)
-                        res_txt = curr_trade_info["result"]
-                        res_color = "green" if res_txt == "WIN" else ("red" if res_txt == "LOSS" else "gray")
-                        
-                        with cn2:
-                            st.markdown(f"<h4 style='text-align: center;'>{curr_trade_date} <span style='color:{res_color}'>[{res_txt}]</span></h4>", unsafe_allow_html=True)
-                            if curr_trade_info["pnl"] != 0:
-                                st.markdown(f"<div style='text-align: center;'>PnL: <b>${curr_trade_info['pnl']:.2f}</b> ({curr_trade_info['r_result']:.2f} R)</div>", unsafe_allow_html=True)
-                            else:
-                                st.markdown(f"<div style='text-align: center;'><i>{curr_trade_info.get('comment', '')}</i></div>", unsafe_allow_html=True)
-
-                        row_stats = res.filter(pl.col("date") == curr_trade_date).row(0, named=True)
-                        ny_tz = pytz.timezone("America/New_York")
-                        pdf_sim = df_all.filter((pl.col("ts_utc") >= row_stats["ib_start_utc"] - timedelta(minutes=30)) & 
-                                          (pl.col("ts_utc") <= _local_to_utc(curr_trade_date, dead) + timedelta(minutes=30))).to_pandas()
-                        
-                        if not pdf_sim.empty:
-                            fig_s, ax_s = plt.subplots(figsize=(10, 4), dpi=100)
-                            fig_s.patch.set_facecolor("#0e1117")
-                            
-                            # Wykres Ceny - Cienki
-                            ax_s.plot(pdf_sim["ts_ny"].dt.to_pydatetime(), pdf_sim["close"], color="white", lw=0.8, alpha=0.9)
-                            
-                            ib_h, ib_l, ib_rng = row_stats["ib_high"], row_stats["ib_low"], row_stats["ib_range"]
-                            direction = row_stats["direction"]
-
-                            # IB LEVELS - Cienkie, Szare, Ciągłe (Tło)
-                            ax_s.axhline(ib_h, color="#B0BEC5", ls="-", lw=0.6, alpha=0.5, label="IB High")
-                            ax_s.axhline(ib_l, color="#B0BEC5", ls="-", lw=0.6, alpha=0.5, label="IB Low")
-
-                            # Obliczenia poziomów strategii
-                            if direction == "UP":
-                                base = ib_h
-                                trig_lvl = base + (ib_rng * (trigger_pct / 100))
-                                ent_lvl  = base + (ib_rng * (entry_pct / 100))
-                                if is_fade:
-                                    tp_lvl = base + (ib_rng * (tp_pct / 100))
-                                    sl_lvl = ent_lvl + (ib_rng * (sl_dist_pct / 100))
-                                else:
-                                    tp_lvl = base + (ib_rng * (tp_pct / 100))
-                                    sl_lvl = ent_lvl - (ib_rng * (sl_dist_pct / 100))
-                            else: 
-                                base = ib_l
-                                trig_lvl = base - (ib_rng * (trigger_pct / 100))
-                                ent_lvl  = base - (ib_rng * (entry_pct / 100))
-                                if is_fade:
-                                    tp_lvl = base - (ib_rng * (tp_pct / 100))
-                                    sl_lvl = ent_lvl - (ib_rng * (sl_dist_pct / 100))
-                                else:
-                                    tp_lvl = base - (ib_rng * (tp_pct / 100))
-                                    sl_lvl = ent_lvl + (ib_rng * (sl_dist_pct / 100))
-
-                            # TRIGGER - Fiolet, kropki
-                            ax_s.axhline(trig_lvl, color="#E040FB", ls=":", lw=1.0, label="Trigger")
-                            
-                            if "INVALID" not in res_txt:
-                                # ENTRY - Niebieski, Ciągły, Grubszy
-                                ax_s.axhline(ent_lvl, color="#2979FF", ls="-", lw=1.2, label="Entry")
-                                # TP - Zielony, przerywany
-                                ax_s.axhline(tp_lvl, color="#00E676", ls="--", lw=1.0, label="TP")
-                                # SL - Czerwony, przerywany
-                                ax_s.axhline(sl_lvl, color="#FF1744", ls="--", lw=1.0, label="SL")
-
-                            ib_s_ny = row_stats["ib_start_utc"].astimezone(ny_tz)
-                            ib_e_ny = row_stats["ib_end_utc"].astimezone(ny_tz)
-                            ax_s.axvspan(ib_s_ny, ib_e_ny, color='#4fc3f7', alpha=0.10)
-                            
-                            # Legenda na zewnątrz lub w rogu
-                            ax_s.legend(fontsize=7, loc="upper right", facecolor='#0e1117', labelcolor='white', framealpha=0.6)
-                            ax_s.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M', tz=ny_tz))
-                            st.pyplot(fig_s)
+                    trade_navigator(sim_res, trigger_pct, entry_pct, tp_pct, sl_dist_pct, is_fade)
 
                     st.divider()
 
@@ -367,3 +427,202 @@ if df_raw is not None and isinstance(df_raw, pl.DataFrame):
                             "R": st.column_config.NumberColumn("Wynik R", format="%.2f R"),
                         }
                     )
+
+        tab1, tab2, tab3, tab4 = st.tabs(["📊 Statystyki Wybicia", "🎲 Symulator & Wizualizacja", "🧪 Optymalizacja", "🔀 Porównanie IB"])
+
+        # --- TAB 1: Statystyki ---
+        with tab1:
+            st.subheader("Wykres i Statystyki Dystrybucji")
+            day_navigator()
+            st.divider()
+            m1, m2, m3 = st.columns(3)
+            strat_info = [("dbl", "Double Breakout"), ("mid", "50% Retr."), ("line", "Return Line")]
+            for i, (k, label) in enumerate(strat_info):
+                with [m1, m2, m3][i]:
+                    st.metric(label, f"{st.session_state['hit_rates'][k]:.1f}%")
+
+            # --- STATYSTYKI WARUNKOWE (wszystkie podziały liczone raz na wynik analizy, wybór = filtr) ---
+            st.divider()
+            st.subheader("📐 Statystyki Warunkowe")
+            dim_names = {"all": "Wszystkie", "weekday": "Dzień tygodnia", "month": "Miesiąc", "direction": "Kierunek",
+                         "ib_range": "Zakres IB", "brk_hour": "Godzina wybicia (NY)"}
+            c_dim, c_tgt, c_bkt = st.columns([3, 1, 1])
+            cond_dim = c_dim.radio("Podział", DIMENSIONS[1:], horizontal=True, format_func=dim_names.get, key="cond_dim")
+            cond_tgt = c_tgt.selectbox("Cel", [k for k, _ in strat_info], format_func=dict(strat_info).get, key="cond_tgt")
+            cond_n = c_bkt.number_input("Przedziały zakresu IB", min_value=2, max_value=20, value=IB_BUCKETS, key="cond_n")
+            cond_cache = st.session_state['conditional']  # liczba przedziałów -> ramka, wspólne z wpisem memo analizy
+            if cond_n not in cond_cache: cond_cache[cond_n] = conditional_stats(res, cond_n)
+            cond = cond_cache[cond_n].filter((pl.col("dimension") == cond_dim) & (pl.col("target") == cond_tgt)).sort("order")
+            st.bar_chart(cond.select(pl.col("bucket").alias("Przedział"), pl.col("hit_rate").alias("Skuteczność (%)")).to_pandas(),
+                         x="Przedział", y="Skuteczność (%)", sort=False, height=250)
+            st.dataframe(
+                cond.select(
+                    pl.col("bucket").alias("Przedział"), pl.col("days").alias("Dni"), pl.col("hit_rate").alias("Skuteczność (%)"),
+                    pl.col("dist_pct_p50").alias("Dist % p50"), pl.col("dist_pct_p75").alias("Dist % p75"), pl.col("dist_pct_p90").alias("Dist % p90"),
+                    pl.col("time_p25").alias("Czas p25 (min)"), pl.col("time_p50").alias("Czas p50 (min)"), pl.col("time_p75").alias("Czas p75 (min)"),
+                ).to_pandas(),
+                use_container_width=True, hide_index=True,
+                column_config={c: st.column_config.NumberColumn(format="%.1f") for c in
+                               ["Skuteczność (%)", "Dist % p50", "Dist % p75", "Dist % p90", "Czas p25 (min)", "Czas p50 (min)", "Czas p75 (min)"]})
+            st.caption("Dist % = maks. ruch przeciwny do celu w % zakresu IB (do powrotu albo deadline'u), czas = minuty od końca IB do powrotu (tylko dni z powrotem).")
+
+        # --- TAB 2: Symulator ---
+        with tab2:
+            simulator()
+
+        # --- TAB 3: Optymalizacja ---
+        with tab3:
+            st.subheader("🧪 Optymalizacja Parametrów (Grid Search)")
+            st.caption("Wszystkie kombinacje parametrów liczone na tych samych dniach co symulator (Deadline i ryzyko z zakładki Symulator).")
+            opt_modes = st.multiselect("Styl Gry", ["TREND", "FADE"], default=["TREND", "FADE"])
+            grid = {}
+            for key, label, (d_lo, d_hi, d_step) in [("trigger_pct", "Trigger (%)", (10, 50, 10)), ("entry_pct", "Entry (%)", (0, 40, 10)),
+                                                     ("tp_pct", "TP (%)", (-50, 150, 25)), ("sl_dist_pct", "SL (Risk %)", (25, 50, 25))]:
+                g1, g2, g3 = st.columns(3)
+                lo = g1.number_input(f"{label} od", value=d_lo, step=5, key=f"opt_{key}_lo")
+                hi = g2.number_input(f"{label} do", value=d_hi, step=5, key=f"opt_{key}_hi")
+                step = g3.number_input(f"{label} krok", value=d_step, min_value=1, step=5, key=f"opt_{key}_step")
+                grid[key] = pct_range(lo, hi, step)
+
+            n_combos = len(opt_modes) * math.prod(len(v) for v in grid.values())
+            st.caption(f"Liczba kombinacji: {n_combos}")
+
+            if st.button("🧪 Optymalizuj", type="primary") and n_combos > 0:
+                with st.spinner(f"Liczenie {n_combos} kombinacji..."):
+                    st.session_state['opt_res'] = run_sweep(df_all, res, dead, grid["trigger_pct"], grid["entry_pct"], grid["tp_pct"], grid["sl_dist_pct"],
+                                                            modes=opt_modes, risk_value=st.session_state['risk_val'], day_index=day_index)
+
+            if st.session_state['opt_res'] is not None and not st.session_state['opt_res'].is_empty():
+                opt_res = st.session_state['opt_res']
+                st.markdown("### 🏆 Ranking Kombinacji")
+                st.dataframe(
+                    opt_res.select([
+                        pl.col("strategy_mode").alias("Styl"),
+                        pl.col("trigger_pct").alias("Trigger (%)"),
+                        pl.col("entry_pct").alias("Entry (%)"),
+                        pl.col("tp_pct").alias("TP (%)"),
+                        pl.col("sl_dist_pct").alias("SL (%)"),
+                        pl.col("trades").alias("Transakcje"),
+                        pl.col("net_r").alias("Net R"),
+                        pl.col("net_pnl").alias("Net ($)"),
+                        pl.col("win_rate").alias("Win Rate"),
+                        pl.col("profit_factor").alias("PF"),
+                        pl.col("max_dd").alias("Max DD ($)"),
+                    ]).to_pandas(),
+                    use_container_width=True,
+                    column_config={
+                        "Net R": st.column_config.NumberColumn("Net R", format="%.2f R"),
+                        "Net ($)": st.column_config.NumberColumn("Net ($)", format="$%.2f"),
+                        "Win Rate": st.column_config.NumberColumn("Win Rate", format="%.1f%%"),
+                        "PF": st.column_config.NumberColumn("PF", format="%.2f"),
+                        "Max DD ($)": st.column_config.NumberColumn("Max DD ($)", format="$%.2f"),
+                    }
+                )
+
+            # --- WALK-FORWARD ---
+            st.divider()
+            st.subheader("🔁 Walk-Forward (Out-of-Sample)")
+            st.caption("Siatka jak wyżej: najlepsza kombinacja z okna treningowego jest grana na kolejnym oknie testowym.")
+            w1, w2, w3, w4 = st.columns(4)
+            wf_train = w1.number_input("Dni treningowe", value=120, min_value=5, step=10)
+            wf_test = w2.number_input("Dni testowe", value=20, min_value=1, step=5)
+            wf_score = w3.selectbox("Kryterium", WF_SCORES, index=0)
+            wf_min = w4.number_input("Min. transakcji (train)", value=10, min_value=0, step=1)
+            wf_anchored = st.checkbox("Okno kotwiczone (train zawsze od początku zakresu)", value=False)
+
+            if st.button("🔁 Uruchom Walk-Forward") and n_combos > 0:
+                with st.spinner(f"Walk-forward: {n_combos} kombinacji..."):
+                    st.session_state['wf_res'] = run_walk_forward(df_all, res, dead, grid["trigger_pct"], grid["entry_pct"], grid["tp_pct"], grid["sl_dist_pct"],
+                                                                  train_days=int(wf_train), test_days=int(wf_test), modes=opt_modes, score=wf_score,
+                                                                  min_trades=int(wf_min), anchored=wf_anchored, risk_value=st.session_state['risk_val'], day_index=day_index)
+
+            if st.session_state['wf_res'] is not None:
+                wf_oos, wf_rep = st.session_state['wf_res']
+                if wf_oos.is_empty():
+                    st.warning("Za mało dni na choćby jeden fold (albo żadna kombinacja nie osiągnęła min. liczby transakcji).")
+                else:
+                    wf_trades = wf_oos.filter(pl.col("result").is_in(["WIN", "LOSS", "CLOSE"]))
+                    f1, f2, f3 = st.columns(3)
+                    f1.metric("OOS Net", f"${wf_trades['pnl'].sum():,.2f}", delta=f"{wf_trades['r_result'].sum():.2f} R")
+                    f2.metric("OOS Transakcje", f"{len(wf_trades)}")
+                    f3.metric("Foldy", f"{len(wf_rep)}")
+                    st.markdown("##### Krzywa Kapitału (Out-of-Sample)")
+                    st.line_chart(wf_oos.select(pl.col("date").alias("Date"), (pl.col("equity") + st.session_state['start_cap']).alias("Equity")).to_pandas(), x="Date", y="Equity", height=300)
+                st.markdown("##### Raport Foldów")
+                st.dataframe(wf_rep.to_pandas(), use_container_width=True)
+
+        # --- TAB 4: Porównanie definicji IB ---
+        with tab4:
+            st.subheader("🔀 Porównanie Okien IB")
+            st.caption("Wszystkie konfiguracje liczone w jednym przebiegu po barach (zakres dat z panelu bocznego). Overnight puste = start IB > koniec IB.")
+            ibw_cfg = st.data_editor(
+                pl.DataFrame({
+                    "ib_start": [time(1, 0), time(9, 30), time(18, 0)],
+                    "ib_end": [time(2, 0), time(10, 30), time(19, 0)],
+                    "deadline": [time(17, 0), time(16, 0), time(23, 0)],
+                    "breakout_type": ["wick", "wick", "wick"],
+                    "direction": ["BOTH", "BOTH", "BOTH"],
+                    "overnight": [None, None, None],
+                }, schema_overrides={"overnight": pl.Boolean}).to_pandas(),
+                num_rows="dynamic", use_container_width=True, key="ibw_editor",
+                column_config={
+                    "ib_start": st.column_config.TimeColumn("Start IB", format="HH:mm", step=60),
+                    "ib_end": st.column_config.TimeColumn("Koniec IB", format="HH:mm", step=60),
+                    "deadline": st.column_config.TimeColumn("Deadline", format="HH:mm", step=60),
+                    "breakout_type": st.column_config.SelectboxColumn("Typ Wybicia", options=["wick", "close"], default="wick"),
+                    "direction": st.column_config.SelectboxColumn("Kierunek", options=["UP", "DOWN", "BOTH"], default="BOTH"),
+                    "overnight": st.column_config.CheckboxColumn("Overnight"),
+                })
+            if st.button("🔀 Porównaj", type="primary"):
+                ibw_rows = [(r.ib_start, r.ib_end, r.deadline, r.breakout_type, r.direction) + (() if r.overnight is None or r.overnight != r.overnight else (bool(r.overnight),))
+                            for r in ibw_cfg.itertuples() if all(isinstance(v, time) for v in (r.ib_start, r.ib_end, r.deadline))]
+                try:
+                    with st.spinner(f"Analiza {len(ibw_rows)} konfiguracji..."):
+                        ibw_stacked, _ = analyze_windows(data_src, ibw_rows, start_d, end_d, use_cache=use_cache)
+                    st.session_state['ibw_res'] = compare_windows(ibw_stacked)
+                except ValueError as e:
+                    st.error(str(e))
+
+            if st.session_state['ibw_res'] is not None:
+                ibw_res = st.session_state['ibw_res']
+                if ibw_res.is_empty():
+                    st.warning("Żadna konfiguracja nie dała dni z wybiciem.")
+                else:
+                    target_names = {"dbl": "Double Breakout", "mid": "50% Retr.", "line": "Return Line"}
+                    st.bar_chart(ibw_res.select([pl.col("label").alias("Okno")] + [pl.col(f"hit_{k}").alias(target_names[k]) for k in TARGETS]).to_pandas(),
+                                 x="Okno", y=list(target_names.values()), stack=False, height=300)
+                    st.dataframe(
+                        ibw_res.select([pl.col("label").alias("Okno"), pl.col("days").alias("Dni"), pl.col("up_pct").alias("UP (%)"), pl.col("avg_ib_range").alias("Śr. zakres IB")]
+                                       + [pl.col(f"hit_{k}").alias(f"{target_names[k]} (%)") for k in TARGETS]
+                                       + [pl.col(f"median_min_{k}").alias(f"{target_names[k]} (min)") for k in TARGETS]).to_pandas(),
+                        use_container_width=True, hide_index=True,
+                        column_config={c: st.column_config.NumberColumn(format="%.1f") for c in
+                                       ["UP (%)", "Śr. zakres IB"] + [f"{n} (%)" for n in target_names.values()]})
+
+    # --- PANEL PERFORMANCE (wypełniany na końcu przebiegu, po wszystkich mierzonych etapach) ---
+    prof = st.session_state['profiler']
+    if prof is not None:
+        with perf_panel:
+            summary = prof.summary()
+            if summary.is_empty():
+                st.caption("Brak pomiarów - uruchom analizę lub symulację.")
+            else:
+                st.dataframe(summary.select(
+                    pl.concat_str([pl.lit("· ").repeat_by(pl.col("depth")).list.join(""), pl.col("name")]).alias("Etap"),
+                    pl.col("last_s").alias("Czas (s)"), pl.col("calls").alias("Wywołania"), pl.col("rows").alias("Wiersze"),
+                    pl.col("alloc_mb").alias("Alokacje (MB)"), pl.col("rss_peak_mb").alias("Wzrost RSS (MB)"),
+                ).to_pandas(), use_container_width=True, hide_index=True,
+                    column_config={"Czas (s)": st.column_config.NumberColumn(format="%.3f"), "Alokacje (MB)": st.column_config.NumberColumn(format="%.1f"),
+                                   "Wzrost RSS (MB)": st.column_config.NumberColumn(format="%.1f")})
+            if not prof.days.is_empty():
+                st.caption("Koszt dni w ostatniej analizie (bary w oknie dnia)")
+                hist = prof.days["rows"].hist(bin_count=20)
+                st.bar_chart(hist.select(pl.col("breakpoint").round(0).alias("Bary"), pl.col("count").alias("Dni")).to_pandas(), x="Bary", y="Dni", height=150)
+                st.dataframe(prof.slowest_days().to_pandas(), use_container_width=True, hide_index=True,
+                             column_config={"est_ms": st.column_config.NumberColumn("szac. ms", format="%.2f")})
+            e1, e2 = st.columns(2)
+            e1.download_button("JSON", prof.to_json(), file_name="profile.json", mime="application/json")
+            e2.download_button("Chrome trace", prof.to_chrome_trace(), file_name="trace.json", mime="application/json")
+            if st.button("Wyczyść pomiary"):
+                prof.clear()
+                st.rerun()
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import tempfile
+
+import polars as pl
+import pyarrow as pa
+
+from analysis_ib_double_breakout import _prepare_lazyframe
+from dataset import fingerprint, is_dataset, partition_files, scan_source
+
+# --- CACHE PRZYGOTOWANYCH BARÓW (Arrow IPC, memory-map) ---
+CACHE_DIR = os.environ.get("MNQ_CACHE_DIR", os.path.join(".cache", "prepared"))
+CACHE_MAX_BYTES = int(os.environ.get("MNQ_CACHE_MAX_BYTES", 4 * 1024 ** 3))
+
+def _cache_key(path, ib_start, is_overnight):
+    # Źródło identyfikowane po ścieżce, rozmiarze i mtime plików (hash treści wielu GB byłby droższy niż parsowanie)
+    raw = f"{fingerprint(path)}|{ib_start.isoformat()}|{bool(is_overnight)}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _evict(cache_dir, max_bytes, keep=()):
+    """
+    LRU: usuwa najdawniej używane wpisy (mtime odświeżany przy każdym trafieniu), aż suma <= max_bytes.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".arrow"): continue
+        full = os.path.join(cache_dir, name)
+        try: st = os.stat(full)
+        except OSError: continue
+        entries.append((st.st_mtime, st.st_size, full))
+    total = sum(e[1] for e in entries)
+    for _, size, full in sorted(entries):
+        if total <= max_bytes: break
+        if full in keep: continue
+        try:
+            os.remove(full)
+            total -= size
+        except OSError: pass
+
+def _read_mmap(cache_file):
+    with pa.memory_map(cache_file, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return pl.from_arrow(table, rechunk=False)
+
+def _load_file(path, ib_start, is_overnight, cache_dir):
+    # Jeden plik parquet (całe źródło albo jedna partycja) -> (przygotowane bary z memory-map, plik cache)
+    cache_file = os.path.join(cache_dir, _cache_key(path, ib_start, is_overnight) + ".arrow")
+    if os.path.exists(cache_file):
+        try:
+            df = _read_mmap(cache_file)
+            os.utime(cache_file)
+            return df, cache_file
+        except (OSError, pa.ArrowInvalid):
+            os.remove(cache_file)
+
+    df = _prepare_lazyframe(pl.scan_parquet(path), ib_start, is_overnight).collect().rechunk()
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+    os.close(fd)
+    try:
+        df.write_ipc(tmp, compression="uncompressed")
+        os.replace(tmp, cache_file)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    return _read_mmap(cache_file), cache_file
+
+def load_prepared(path, ib_start, is_overnight, start_date=None, end_date=None, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Wynik _prepare_dataframe dla pliku parquet / zbioru partycjonowanego, z cache na dysku. Trafienie = memory-map pliku .arrow
+    bez parsowania; chybienie = pełne przygotowanie, zapis (atomowy) i eviction starych wpisów.
+    Zbiór partycjonowany ma osobny wpis na plik partycji: dopisanie dni przygotowuje tylko nowe / zmienione pliki,
+    a start_date / end_date przycinają partycje przed odczytem cache (partition_files). Pojedynczy plik = jeden wpis
+    z całą historią (zakres dat tnie wynik dopiero w scan_bars).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    files = partition_files(path, start_date, end_date) if is_dataset(path) else [path]
+    if not files: return _prepare_lazyframe(scan_source(path, start_date, end_date), ib_start, is_overnight).collect()
+    parts, used = [], set()
+    for f in files:
+        df, cache_file = _load_file(f, ib_start, is_overnight, cache_dir)
+        parts.append(df)
+        used.add(cache_file)
+    _evict(cache_dir, max_bytes, keep=used)
+    df = pl.concat(parts, rechunk=False) if len(parts) > 1 else parts[0]
+    # miesiące są rozłączne w czasie, ale dopisane części jednego miesiąca mogą się przeplatać
+    return df if df["ts_utc"].is_sorted() else df.sort("ts_utc")
+
+def clear_cache(cache_dir=CACHE_DIR):
+    if not os.path.isdir(cache_dir): return
+    for name in os.listdir(cache_dir):
+        if name.endswith(".arrow"): os.remove(os.path.join(cache_dir, name))
@@ -0,0 +1,143 @@
+"""
+Wsadowe uruchamianie analiz i symulacji bez Streamlit (np. nocny cron).
+
+    python batch_runner.py studies.yaml -o results/ -j 4
+
+Plik konfiguracji (YAML lub JSON) to lista badań albo słownik {"defaults": {...}, "studies": [...]}:
+
+    defaults: {data: data.parquet, deadline: "17:00", direction: BOTH, breakout_type: wick}  # data: plik parquet albo katalog year=/month= (dataset.py)
+    studies:
+      - name: asia
+        ib_start: "01:00"
+        ib_end: "02:00"
+        start_date: 2023-01-01
+        simulations:
+          - {trigger_pct: 30, entry_pct: 25, tp_pct: -50, sl_dist_pct: 25, mode: FADE, risk_value: 100}
+
+Dla każdego badania powstaje <name>.results.parquet (dni z analyze_ib_double_breakout) i <name>.trades.parquet
+(wszystkie symulacje z kolumną "sim"), a na koniec summary.parquet ze statystykami (metrics.sim_metrics).
+Polars / NumPy są importowane dopiero w workerach, więc start (i --help) nie płaci za ciężkie moduły.
+"""
+import argparse
+import json
+import os
+import sys
+import time as _time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time
+
+STUDY_DEFAULTS = {"deadline": "17:00", "direction": "BOTH", "breakout_type": "wick", "overnight": None,
+                  "start_date": None, "end_date": None, "simulations": []}
+SIM_DEFAULTS = {"trigger_pct": 30, "entry_pct": 25, "tp_pct": 100, "sl_dist_pct": 25, "mode": "TREND",
+                "risk_model": "FIXED", "risk_value": 100.0, "deadline": None}
+
+def _parse_time(v):
+    return v if isinstance(v, time) else datetime.strptime(str(v), "%H:%M").time()
+
+def _parse_date(v):
+    if v is None or isinstance(v, date): return v
+    return datetime.strptime(str(v), "%Y-%m-%d").date()
+
+def load_config(path):
+    """
+    Lista badań z pliku YAML / JSON, z uzupełnionymi wartościami domyślnymi.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        try: import yaml
+        except ImportError: raise SystemExit("Konfiguracja YAML wymaga pakietu PyYAML (pip install pyyaml) - albo użyj JSON")
+        cfg = yaml.safe_load(text)
+    else:
+        cfg = json.loads(text)
+    defaults, studies = ({}, cfg) if isinstance(cfg, list) else (cfg.get("defaults", {}), cfg.get("studies", []))
+    out = []
+    for i, raw in enumerate(studies):
+        study = {**STUDY_DEFAULTS, **defaults, **raw}
+        missing = [k for k in ["data", "ib_start", "ib_end"] if not study.get(k)]
+        if missing: raise ValueError(f"Badanie #{i + 1}: brak pól {', '.join(missing)}")
+        study["name"] = str(study.get("name") or f"study_{i + 1}")
+        study["ib_start"], study["ib_end"] = _parse_time(study["ib_start"]), _parse_time(study["ib_end"])
+        study["deadline"] = _parse_time(study["deadline"])
+        if study["overnight"] is None: study["overnight"] = study["ib_start"] > study["ib_end"]
+        study["start_date"], study["end_date"] = _parse_date(study["start_date"]), _parse_date(study["end_date"])
+        study["simulations"] = [{**SIM_DEFAULTS, **sim} for sim in study["simulations"]]
+        out.append(study)
+    names = [s["name"] for s in out]
+    if len(set(names)) != len(names): raise ValueError("Nazwy badań (name) muszą być unikalne")
+    return out
+
+def run_study(study, out_dir):
+    """
+    Analiza + wszystkie symulacje jednego badania; zapisuje parquety i zwraca (nazwa, liczba dni, transakcje, czas).
+    """
+    import polars as pl
+    from analysis_ib_double_breakout import analyze_ib_double_breakout, run_simulation
+    from day_index import build_day_index
+
+    t0 = _time.perf_counter()
+    res, df_all = analyze_ib_double_breakout(study["data"], study["ib_start"], study["ib_end"], study["deadline"], study["direction"],
+                                             study["breakout_type"], study["overnight"], study["start_date"], study["end_date"],
+                                             use_cache=True, incremental=True)
+    res.write_parquet(os.path.join(out_dir, f"{study['name']}.results.parquet"), compression="zstd")
+    sims = []
+    if not res.is_empty():
+        day_index = build_day_index(df_all)
+        for i, sim in enumerate(study["simulations"]):
+            deadline = _parse_time(sim["deadline"]) if sim["deadline"] else study["deadline"]
+            trades = run_simulation(df_all, res, sim["trigger_pct"], sim["entry_pct"], sim["tp_pct"], sim["sl_dist_pct"], deadline,
+                                    risk_model=sim["risk_model"], risk_value=sim["risk_value"], strategy_mode=sim["mode"], day_index=day_index)
+            if trades.is_empty(): continue
+            sims.append(trades.with_columns(pl.lit(i + 1).alias("sim"), pl.lit(sim["mode"]).alias("strategy_mode"),
+                                            *[pl.lit(float(sim[k])).alias(k) for k in ["trigger_pct", "entry_pct", "tp_pct", "sl_dist_pct"]]))
+    trades = pl.concat(sims) if sims else pl.DataFrame()
+    trades.write_parquet(os.path.join(out_dir, f"{study['name']}.trades.parquet"), compression="zstd")
+    return study["name"], res.height, trades.height, _time.perf_counter() - t0
+
+def _summary(names, out_dir):
+    import polars as pl
+    from metrics import sim_metrics
+
+    runs = {}
+    for name in names:
+        trades = pl.read_parquet(os.path.join(out_dir, f"{name}.trades.parquet"))
+        if trades.is_empty(): continue
+        for (sim_id,), part in trades.partition_by("sim", as_dict=True, maintain_order=True).items():
+            runs[f"{name}/{sim_id}"] = part
+    summary = sim_metrics(runs)
+    if not summary.is_empty(): summary.write_parquet(os.path.join(out_dir, "summary.parquet"), compression="zstd")
+    return summary
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Wsadowe analizy IB + symulacje -> Parquet")
+    ap.add_argument("config", help="plik YAML / JSON z listą badań")
+    ap.add_argument("-o", "--output", default="batch_results", help="katalog wynikowy (domyślnie batch_results)")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    args = ap.parse_args(argv)
+
+    studies = load_config(args.config)
+    os.makedirs(args.output, exist_ok=True)
+    workers = max(1, min(args.jobs or os.cpu_count() or 1, len(studies)))
+    done = []
+
+    def report(name, run):
+        try: result = run()
+        except Exception as e:
+            print(f"❌ {name}: {e}", file=sys.stderr)
+            return
+        done.append(name)
+        print("✅ {}: {} dni, {} wierszy symulacji, {:.2f} s".format(*result), file=sys.stderr)
+
+    if workers == 1:
+        for study in studies: report(study["name"], lambda: run_study(study, args.output))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(run_study, study, args.output): study["name"] for study in studies}
+            for fut in as_completed(futures): report(futures[fut], fut.result)
+
+    summary = _summary(done, args.output)
+    print(f"{len(done)}/{len(studies)} badań -> {args.output} ({summary.height} symulacji w summary.parquet)")
+    return 0 if len(done) == len(studies) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Benchmark analizy i symulatora na syntetycznych danych MNQ (benchmarks/synthetic.py).
+
+    python benchmarks/run_benchmarks.py                       # 1, 5, 15 lat, porównanie z benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --years 1 --formats multi single
+    python benchmarks/run_benchmarks.py --save-baseline       # zapisuje bieżący wynik jako baseline
+
+Każdy rozmiar danych liczony jest w osobnym procesie (czysty pomiar szczytowej pamięci). Czas etapu = minimum
+z --repeat powtórzeń; pamięć = szczytowe RSS procesu po etapie (narastająco, jak widzi to system).
+Regresja = etap wolniejszy od baseline o więcej niż --tolerance (i o co najmniej --min-delta s)
+albo szczyt pamięci większy o więcej niż --tolerance; wtedy kod wyjścia 1.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time as _time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+from synthetic import FORMATS, cached_bars
+
+BASELINE = os.path.join(HERE, "baseline.json")
+DATA_DIR = os.path.join(os.path.dirname(HERE), ".cache", "bench")
+STAGES = ["prepare", "analyze", "simulate", "stats"]
+# Konfiguracja pomiaru: sesja 9:30-10:30 z deadline 16:00 i jedna symulacja FADE (jak domyślne ustawienia aplikacji)
+IB_START, IB_END, DEADLINE = time(9, 30), time(10, 30), time(16, 0)
+SIM = {"trigger_pct": 30, "entry_pct": 25, "tp_pct": -50, "sl_dist_pct": 25, "strategy_mode": "FADE"}
+
+def _peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # macOS: bajty, Linux: KiB
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 ** 2  # Windows
+        except (ImportError, AttributeError):
+            return None
+
+def _timed(fn, repeat):
+    best, out = None, None
+    for _ in range(repeat):
+        t0 = _time.perf_counter()
+        out = fn()
+        dt = _time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return out, best
+
+def bench_size(years, fmt, seed, repeat):
+    """
+    Pomiar wszystkich etapów dla jednego rozmiaru danych (wywoływany w osobnym procesie).
+    """
+    import polars as pl
+    from analysis_ib_double_breakout import _prepare_dataframe, analyze_ib_double_breakout, run_simulation
+    from metrics import sim_metrics
+
+    raw = pl.read_parquet(cached_bars(DATA_DIR, years, seed, fmt))
+    out = {"rows": raw.height, "stages": {}}
+
+    def record(stage, fn):
+        result, seconds = _timed(fn, repeat)
+        peak = _peak_rss_mb()
+        out["stages"][stage] = {"seconds": round(seconds, 4), "peak_rss_mb": round(peak, 1) if peak is not None else None}
+        return result
+
+    record("prepare", lambda: _prepare_dataframe(raw, IB_START, False))
+    res, df_all = record("analyze", lambda: analyze_ib_double_breakout(raw, IB_START, IB_END, DEADLINE))
+    sim = record("simulate", lambda: run_simulation(df_all, res, deadline=DEADLINE, **SIM))
+    stats = record("stats", lambda: sim_metrics(sim))
+    out.update({"days": res.height, "trades": int(stats["trades"][0]) if not stats.is_empty() else 0})
+    return out
+
+def _environment():
+    import numpy
+    import polars
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "polars": polars.__version__, "numpy": numpy.__version__}
+
+def compare(current, baseline, tolerance, min_delta):
+    """
+    Lista regresji [(rozmiar, etap, miara, baseline, bieżąca)] względem baseline.
+    """
+    flags = []
+    for size, run in current["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if not base: continue  # rozmiar / format spoza baseline
+        for stage, cur in run["stages"].items():
+            ref = base["stages"].get(stage)
+            if not ref: continue
+            if cur["seconds"] > ref["seconds"] * (1 + tolerance) and cur["seconds"] - ref["seconds"] >= min_delta:
+                flags.append((size, stage, "seconds", ref["seconds"], cur["seconds"]))
+            if cur["peak_rss_mb"] and ref.get("peak_rss_mb") and cur["peak_rss_mb"] > ref["peak_rss_mb"] * (1 + tolerance):
+                flags.append((size, stage, "peak_rss_mb", ref["peak_rss_mb"], cur["peak_rss_mb"]))
+    return flags
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark prepare / analyze / simulate / stats na syntetycznych danych MNQ")
+    ap.add_argument("--years", type=float, nargs="+", default=[1, 5, 15], help="rozmiary danych w latach (domyślnie 1 5 15)")
+    ap.add_argument("--formats", choices=FORMATS, nargs="+", default=["multi"], help="formaty wejściowe (wielo- / jednokolumnowy)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3, help="powtórzenia etapu (liczy się najszybsze)")
+    ap.add_argument("--baseline", default=BASELINE, help="plik JSON z wynikiem odniesienia")
+    ap.add_argument("--save-baseline", action="store_true", help="zapisz bieżący wynik jako baseline")
+    ap.add_argument("--tolerance", type=float, default=0.20, help="dopuszczalny wzrost czasu / pamięci (0.20 = 20%%)")
+    ap.add_argument("--min-delta", type=float, default=0.05, help="minimalny wzrost czasu w s uznawany za regresję")
+    ap.add_argument("-o", "--output", help="zapisz wynik do pliku JSON")
+    args = ap.parse_args(argv)
+
+    current = {"created": _time.strftime("%Y-%m-%d %H:%M:%S"), "seed": args.seed, "environment": _environment(), "results": {}}
+    for fmt, years in itertools.product(args.formats, args.years):
+        # osobny proces na rozmiar: szczyt RSS nie jest zawyżony przez poprzednie pomiary
+        with ProcessPoolExecutor(max_workers=1) as ex:
+            run = ex.submit(bench_size, years, fmt, args.seed, args.repeat).result()
+        size = f"{years:g}y/{fmt}"
+        current["results"][size] = run
+        print(f"{size}: {run['rows']:,} barów, {run['days']} dni, {run['trades']} transakcji")
+        for stage in STAGES:
+            s = run["stages"][stage]
+            mem = f"{s['peak_rss_mb']:8.0f} MB" if s["peak_rss_mb"] is not None else "       - MB"
+            print(f"  {stage:<9}{s['seconds']:9.3f} s {mem}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(current, f, indent=2)
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump(current, f, indent=2)
+        print(f"Zapisano baseline: {args.baseline}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    flags = compare(current, baseline, args.tolerance, args.min_delta)
+    for size, stage, metric, ref, cur in flags:
+        print(f"❌ REGRESJA {size} {stage} {metric}: {ref} -> {cur} ({(cur / ref - 1) * 100:+.0f}%)")
+    if not flags: print(f"✅ Brak regresji względem {args.baseline} (tolerancja {args.tolerance:.0%})")
+    return 1 if flags else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
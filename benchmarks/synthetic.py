@@ -0,0 +1,83 @@
+"""
+Deterministyczny generator syntetycznych barów 1-minutowych MNQ (ten sam seed -> identyczne dane).
+
+Czas jest generowany w UTC, a sesja filtrowana w czasie NY, więc przejścia DST wychodzą jak na giełdzie:
+w marcu sesja startuje godzinę wcześniej w UTC, w listopadzie godzinę później (a bary 01:00-02:00 NY
+w nocy zmiany występują dwukrotnie). Dni zamknięte z session_calendar.exchange_holidays są pomijane.
+"""
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from session_calendar import NY_TZ, UTC_TZ, exchange_holidays
+
+TICK = 0.25
+FORMATS = ["multi", "single"]
+SESSIONS = ["globex", "rth"]
+
+def _session_mask(ny, session):
+    # globex: niedziela 18:00 - piątek 17:00 NY z przerwą 17:00-18:00; rth: pon-pt 9:30-16:00 NY
+    wd, minute = ny.dt.weekday(), ny.dt.hour().cast(pl.Int32) * 60 + ny.dt.minute().cast(pl.Int32)
+    if session == "rth":
+        return (wd <= 5) & (minute >= 9 * 60 + 30) & (minute < 16 * 60)
+    return ((minute < 17 * 60) | (minute >= 18 * 60)) & (wd != 6) & ~((wd == 5) & (minute >= 17 * 60)) & ~((wd == 7) & (minute < 18 * 60))
+
+def generate_bars(years=1.0, start=date(2010, 1, 3), seed=0, fmt="multi", session="globex", gap_prob=0.002, open_gap_ticks=40.0,
+                  start_price=15000.0) -> pl.DataFrame:
+    """
+    Bary OHLCV w formacie wejściowym aplikacji: fmt="multi" -> timestamp ("YYYYMMDD HHMMSS" UTC), open, high, low, close, volume;
+    fmt="single" -> jedna kolumna "timestamp;open;high;low;close;volume" (jak surowy eksport NinjaTrader).
+    gap_prob = odsetek losowo brakujących minut, open_gap_ticks = odchylenie luki cenowej na otwarciu sesji (w tickach).
+    """
+    if fmt not in FORMATS: raise ValueError(f"Nieznany format: {fmt} (dostępne: {', '.join(FORMATS)})")
+    if session not in SESSIONS: raise ValueError(f"Nieznana sesja: {session} (dostępne: {', '.join(SESSIONS)})")
+    rng = np.random.default_rng(seed)
+    t0 = datetime.combine(start, datetime.min.time())
+    ts = pl.datetime_range(t0, t0 + timedelta(days=round(years * 365.25)), "1m", closed="left", time_zone=UTC_TZ, eager=True)
+    ny = ts.dt.convert_time_zone(NY_TZ)
+    # dzień handlowy sesji globex = data zamknięcia (bary od 18:00 należą do następnego dnia)
+    trade_date = pl.select(pl.when(ny.dt.hour() >= 18).then(ny.dt.date() + timedelta(days=1)).otherwise(ny.dt.date())).to_series()
+    closed = {d for y in range(start.year, start.year + int(years) + 2) for d in exchange_holidays(y)[0]}
+    keep = _session_mask(ny, session) & ~trade_date.is_in(list(closed))
+    keep = keep.to_numpy() & (rng.random(len(ts)) >= gap_prob)
+    ts, trade_date = ts.filter(keep), trade_date.filter(keep)
+    n = len(ts)
+
+    # ruch w tickach: zmienność wyższa w RTH, luka cenowa na pierwszym barze każdej sesji
+    ny_min = ts.dt.convert_time_zone(NY_TZ)
+    ny_min = (ny_min.dt.hour().cast(pl.Int32) * 60 + ny_min.dt.minute().cast(pl.Int32)).to_numpy()
+    rth = (ny_min >= 9 * 60 + 30) & (ny_min < 16 * 60)
+    step = np.rint(rng.normal(0.0, np.where(rth, 6.0, 2.5))).astype(np.int64)
+    first = np.r_[True, (trade_date[1:] != trade_date[:-1]).to_numpy()]
+    step[first] += np.rint(rng.normal(0.0, open_gap_ticks, int(first.sum()))).astype(np.int64)
+    close = np.maximum(np.int64(start_price / TICK) + np.cumsum(step), 400)
+    open_ = np.r_[close[0], close[:-1]]
+    open_[first] = close[first] - np.rint(rng.normal(0.0, 2.0, int(first.sum()))).astype(np.int64)
+    wick = np.abs(np.rint(rng.normal(0.0, 2.0, (2, n)))).astype(np.int64)
+    df = pl.DataFrame({
+        "timestamp": ts.dt.strftime("%Y%m%d %H%M%S"),
+        "open": open_ * TICK,
+        "high": (np.maximum(open_, close) + wick[0]) * TICK,
+        "low": (np.minimum(open_, close) - wick[1]) * TICK,
+        "close": close * TICK,
+        "volume": rng.integers(1, 500, n),
+    })
+    if fmt == "single":
+        df = df.select(pl.concat_str([pl.col(c).cast(pl.String) for c in df.columns], separator=";").alias("raw"))
+    return df
+
+def cached_bars(cache_dir, years, seed=0, fmt="multi", session="globex") -> str:
+    """
+    Ścieżka do parquet z generate_bars (generowany tylko raz - czas generowania nie wchodzi do pomiarów).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"mnq_{years:g}y_{fmt}_{session}_s{seed}.parquet")
+    if not os.path.exists(path):
+        tmp = path + ".tmp"
+        generate_bars(years, seed=seed, fmt=fmt, session=session).write_parquet(tmp, compression="zstd")
+        os.replace(tmp, path)
+    return path
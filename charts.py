@@ -0,0 +1,150 @@
+import contextvars
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib.dates as mdates
+import matplotlib.style
+import numpy as np
+from matplotlib.figure import Figure
+
+from profiling import stage
+
+# --- WYKRESY (PNG w cache LRU, downsampling min/max) ---
+# Figura jest renderowana raz do PNG i od razu zwalniana (Figure bez pyplot -> nic nie zostaje w rejestrze
+# figur), więc nawigacja po dniach nie zwiększa zużycia pamięci; kolejne wejście na ten sam dzień = bajty z cache.
+NY_TZ = "America/New_York"
+MAX_POINTS = 2000  # ~2 punkty na piksel szerokości wykresu 10" @ 100 dpi
+_RENDER_LOCK = threading.Lock()  # matplotlib (rcParams, style.context) nie jest bezpieczny wątkowo
+
+def minmax_downsample(y, n_out=MAX_POINTS):
+    """
+    Indeksy punktów do narysowania: dla n_out/2 równych kubełków min i max y (w kolejności czasu),
+    więc obwiednia linii (szczyty, dołki) zostaje zachowana. Krótsze serie są zwracane w całości.
+    """
+    n = len(y)
+    if n <= n_out: return np.arange(n)
+    bucket = (np.arange(n) * (n_out // 2)) // n
+    order = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+class ChartCache:
+    """
+    LRU PNG-ów wykresów: klucz -> bajty. prefetch() renderuje brakujące klucze w tle (jeden wątek).
+    """
+    def __init__(self, max_items=64):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart-prefetch")
+
+    def get(self, key, render):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        png = render()
+        self._put(key, png)
+        return png
+
+    def _put(self, key, png):
+        with self._lock:
+            self._items[key] = png
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items: self._items.popitem(last=False)
+
+    def _render_pending(self, key, render):
+        try: self._put(key, render())
+        except Exception: pass  # prefetch jest opcjonalny; błąd wyjdzie przy zwykłym get()
+        finally:
+            with self._lock: self._pending.discard(key)
+
+    def prefetch(self, jobs):
+        # jobs: [(klucz, funkcja renderująca)]
+        for key, render in jobs:
+            with self._lock:
+                if key in self._items or key in self._pending: continue
+                self._pending.add(key)
+            # kontekst (m.in. aktywny profiler) przechodzi do wątku w tle
+            self._pool.submit(contextvars.copy_context().run, self._render_pending, key, render)
+
+    def clear(self):
+        with self._lock: self._items.clear()
+
+def _series(window):
+    # (czas UTC jako liczby matplotlib, close) po downsamplingu; oś opisana w czasie NY przez DateFormatter
+    ts = window["ts_utc"].dt.replace_time_zone(None).dt.cast_time_unit("us").to_numpy()
+    close = window["close"].to_numpy()
+    keep = minmax_downsample(close)
+    return mdates.date2num(ts[keep]), close[keep]
+
+def _draw_base(fig, ax, x, y, row, span_alpha):
+    fig.patch.set_facecolor("#0e1117")
+    ax.plot(x, y, color="white", lw=0.8, alpha=0.9)
+    ax.axvspan(row["ib_start_utc"], row["ib_end_utc"], color='#4fc3f7', alpha=span_alpha)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M', tz=NY_TZ))
+
+def _to_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", facecolor=fig.get_facecolor())
+    return buf.getvalue()
+
+def day_chart_png(window, row):
+    """
+    Wykres dnia (zakładka Statystyki): close, IB High/Low, strefa IB, poziomy +-1/2 zakresu IB.
+    window = bary z ts_window (ts_utc, close).
+    """
+    with stage("chart.day", rows=window.height):
+        x, y = _series(window)
+        with _RENDER_LOCK, matplotlib.style.context('dark_background'):
+            fig = Figure(figsize=(10, 3.5), dpi=100)
+            ax = fig.subplots()
+            _draw_base(fig, ax, x, y, row, 0.15)
+            # IB High/Low - cienkie szare
+            ax.axhline(row["ib_high"], color="#B0BEC5", ls="-", lw=0.7, alpha=0.6, label="IB High")
+            ax.axhline(row["ib_low"], color="#B0BEC5", ls="-", lw=0.7, alpha=0.6, label="IB Low")
+            rng = row["ib_range"]
+            for m in [1, 2]:
+                ax.axhline(row["ib_high"] + rng*m, color="gray", ls=":", lw=0.5, alpha=0.3)
+                ax.axhline(row["ib_low"] - rng*m, color="gray", ls=":", lw=0.5, alpha=0.3)
+            return _to_png(fig)
+
+def trade_levels(row, trigger_pct, entry_pct, tp_pct, sl_dist_pct, is_fade):
+    """
+    (trigger, entry, tp, sl) w cenach dla dnia z res_df - te same wzory co w run_simulation.
+    """
+    ib_rng = row["ib_range"]
+    sign = 1 if row["direction"] == "UP" else -1
+    base = row["ib_high"] if sign > 0 else row["ib_low"]
+    trig_lvl = base + sign * (ib_rng * (trigger_pct / 100))
+    ent_lvl = base + sign * (ib_rng * (entry_pct / 100))
+    tp_lvl = base + sign * (ib_rng * (tp_pct / 100))
+    sl_lvl = ent_lvl + sign * (ib_rng * (sl_dist_pct / 100)) * (1 if is_fade else -1)
+    return trig_lvl, ent_lvl, tp_lvl, sl_lvl
+
+def trade_chart_png(window, row, levels, result):
+    """
+    Wykres transakcji (zakładka Symulator): close, IB, trigger oraz entry / TP / SL (poza setupami INVALID).
+    """
+    with stage("chart.trade", rows=window.height):
+        x, y = _series(window)
+        trig_lvl, ent_lvl, tp_lvl, sl_lvl = levels
+        with _RENDER_LOCK, matplotlib.style.context('dark_background'):
+            fig = Figure(figsize=(10, 4), dpi=100)
+            ax = fig.subplots()
+            _draw_base(fig, ax, x, y, row, 0.10)
+            # IB LEVELS - Cienkie, Szare, Ciągłe (Tło)
+            ax.axhline(row["ib_high"], color="#B0BEC5", ls="-", lw=0.6, alpha=0.5, label="IB High")
+            ax.axhline(row["ib_low"], color="#B0BEC5", ls="-", lw=0.6, alpha=0.5, label="IB Low")
+            # TRIGGER - Fiolet, kropki
+            ax.axhline(trig_lvl, color="#E040FB", ls=":", lw=1.0, label="Trigger")
+            if "INVALID" not in result:
+                ax.axhline(ent_lvl, color="#2979FF", ls="-", lw=1.2, label="Entry")
+                ax.axhline(tp_lvl, color="#00E676", ls="--", lw=1.0, label="TP")
+                ax.axhline(sl_lvl, color="#FF1744", ls="--", lw=1.0, label="SL")
+            ax.legend(fontsize=7, loc="upper right", facecolor='#0e1117', labelcolor='white', framealpha=0.6)
+            return _to_png(fig)
@@ -0,0 +1,51 @@
+import numpy as np
+import polars as pl
+
+# --- KOMPAKTOWE BARY (ticki Int32 + epoka Int64 + id dnia UInt16) ---
+# Zamiast ~9 kolumn ramki z _prepare_dataframe (Float64, ts_utc/ts_ny, daty, surowy timestamp)
+# trzymamy: ts (µs od epoki, UTC), open/high/low/close w tickach, day = indeks w "dates".
+# Czas NY i ceny Float64 są wyliczane na żądanie (expand), tylko dla potrzebnego wycinka.
+TICK_SIZE = 0.25  # MNQ
+
+def is_compact(bars):
+    return isinstance(bars, dict) and "ticks" in bars
+
+def to_compact(df: pl.DataFrame, tick_size=TICK_SIZE) -> dict:
+    """
+    Ramka z _prepare_dataframe -> postać kompaktowa. Ceny muszą leżeć na siatce ticków (inaczej ValueError),
+    dzięki czemu ticks * tick_size odtwarza je bit w bit.
+    """
+    df = df.filter(pl.col("ts_utc").is_not_null() & pl.col("date").is_not_null())
+    dates = df["date"].unique(maintain_order=True)
+    if len(dates) > np.iinfo(np.uint16).max: raise ValueError(f"Za dużo dni ({len(dates)}) dla id UInt16")
+    ticks = pl.DataFrame({c: (df[c] / tick_size).round(0).cast(pl.Int32) for c in ["open", "high", "low", "close"]})
+    for c in ticks.columns:
+        if not (ticks[c].cast(pl.Float64) * tick_size == df[c]).all():
+            raise ValueError(f"Kolumna {c} zawiera ceny spoza siatki ticka {tick_size}")
+    day = df["date"].rle_id().cast(pl.UInt16)
+    return {
+        "ticks": ticks.with_columns(
+            df["ts_utc"].dt.cast_time_unit("us").dt.replace_time_zone(None).cast(pl.Int64).alias("ts"),
+            day.alias("day")),
+        "dates": dates,
+        "tick_size": tick_size,
+    }
+
+def expand(bars: dict, start=0, length=None) -> pl.DataFrame:
+    """
+    Wycinek postaci kompaktowej w układzie _prepare_dataframe (ts_utc, ts_ny, ceny Float64, date).
+    """
+    t = bars["ticks"].slice(start, length)
+    ts_utc = pl.from_epoch(t["ts"], time_unit="us").dt.replace_time_zone("UTC").alias("ts_utc")
+    ts_ny = ts_utc.dt.convert_time_zone("America/New_York").alias("ts_ny")
+    return pl.DataFrame([
+        *[(t[c].cast(pl.Float64) * bars["tick_size"]).alias(c) for c in ["open", "high", "low", "close"]],
+        ts_utc, ts_ny, ts_ny.dt.date().alias("calendar_date"), bars["dates"].gather(t["day"]).alias("date"),
+    ])
+
+def price_rows(bars: dict, col, rows) -> np.ndarray:
+    return bars["ticks"][col].to_numpy()[rows] * bars["tick_size"]
+
+def nbytes(bars) -> int:
+    if is_compact(bars): return bars["ticks"].estimated_size() + bars["dates"].estimated_size()
+    return bars.estimated_size()
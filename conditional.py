@@ -0,0 +1,74 @@
+import numpy as np
+import polars as pl
+
+from analysis_ib_double_breakout import NY_TZ
+from profiling import stage
+
+# --- STATYSTYKI WARUNKOWE (wszystkie podziały w jednej agregacji) ---
+# Dni z analizy rozwinięte do wierszy (wymiar, przedział) x cel i policzone jednym group_by - każdy podział
+# (dzień tygodnia, miesiąc, kierunek, zakres IB, godzina wybicia) jest potem tylko filtrem gotowej ramki.
+TARGETS = ["dbl", "mid", "line"]
+DIMENSIONS = ["all", "weekday", "month", "direction", "ib_range", "brk_hour"]
+WEEKDAYS = ["Pn", "Wt", "Śr", "Cz", "Pt", "So", "Nd"]
+IB_BUCKETS = 5
+QUANTILES = [0.25, 0.5, 0.75, 0.9]
+
+def _ib_buckets(ib_range, n):
+    # Przedziały równoliczne wg kwantyli zakresu IB: (numer przedziału, etykieta) per dzień
+    r = ib_range.to_numpy()
+    edges = np.unique(np.quantile(r, np.linspace(0, 1, n + 1)[1:-1])) if n > 1 else np.empty(0)
+    idx = np.searchsorted(edges, r, side="left")
+    bounds = np.r_[r.min(), edges, r.max()]
+    labels = [f"{bounds[i]:.1f}–{bounds[i + 1]:.1f}" for i in range(edges.size + 1)]
+    return idx, [labels[i] for i in idx]
+
+def _dimension_keys(res_df, ib_buckets):
+    # (_i, dimension, bucket, order): jeden wiersz na dzień i wymiar
+    ib_idx, ib_labels = _ib_buckets(res_df["ib_range"], ib_buckets)
+    brk_ny, ib_end_ny = (pl.col(c).dt.convert_time_zone(NY_TZ).dt.hour() for c in ("brk_ts", "ib_end_utc"))
+    keys = res_df.select(
+        pl.int_range(pl.len(), dtype=pl.UInt32).alias("_i"),
+        pl.col("date").dt.weekday().alias("weekday"),
+        pl.col("date").dt.strftime("%Y-%m").alias("month"),
+        pl.col("direction"),
+        brk_ny.alias("brk_hour"),
+        ((brk_ny - ib_end_ny) % 24).alias("brk_order"),  # godziny sesji od końca IB (overnight przechodzi przez północ)
+    ).with_columns(pl.Series("ib_idx", ib_idx), pl.Series("ib_label", ib_labels))
+    dim = lambda name, bucket, order: keys.select("_i", pl.lit(name).alias("dimension"), bucket.cast(pl.String).alias("bucket"),
+                                                   order.cast(pl.Int64).alias("order"))
+    return pl.concat([
+        dim("all", pl.lit("Wszystkie"), pl.lit(0)),
+        dim("weekday", pl.col("weekday").replace_strict(list(range(1, 8)), WEEKDAYS), pl.col("weekday")),
+        dim("month", pl.col("month"), pl.col("month").str.replace("-", "").cast(pl.Int64)),
+        dim("direction", pl.col("direction"), (pl.col("direction") == "DOWN").cast(pl.Int64)),
+        dim("ib_range", pl.col("ib_label"), pl.col("ib_idx")),
+        dim("brk_hour", pl.format("{}:00", pl.col("brk_hour").cast(pl.String).str.zfill(2)), pl.col("brk_order")),
+    ])
+
+def conditional_stats(res_df, ib_buckets=IB_BUCKETS) -> pl.DataFrame:
+    """
+    Skuteczność celów (dbl / mid / line), kwantyle dist_pct_* i czasu powrotu time_* (minuty od końca IB,
+    tylko dni z powrotem) w podziale na dzień tygodnia, miesiąc, kierunek, przedział zakresu IB (ib_buckets
+    przedziałów równolicznych) i godzinę wybicia (NY), plus wiersz "all". Układ długi: jeden wiersz na
+    (dimension, bucket, target), "order" = kolejność przedziałów w wymiarze.
+    """
+    with stage("conditional") as s:
+        out = _conditional_stats(res_df, ib_buckets)
+        s.rows = out.height
+    return out
+
+def _conditional_stats(res_df, ib_buckets):
+    if res_df.is_empty(): return pl.DataFrame()
+    days = pl.concat([res_df.select(pl.int_range(pl.len(), dtype=pl.UInt32).alias("_i"), pl.lit(key).alias("target"),
+                                    pl.col(f"ret_{key}").alias("ret"), pl.col(f"dist_pct_{key}").alias("dist_pct"),
+                                    pl.col(f"time_{key}").alias("time")) for key in TARGETS])
+    aggs = [pl.len().alias("days"), pl.col("ret").sum().alias("hits"), (pl.col("ret").mean() * 100).alias("hit_rate"),
+            pl.col("dist_pct").mean().alias("dist_pct_mean")]
+    aggs += [pl.col("dist_pct").quantile(q, "linear").alias(f"dist_pct_p{round(q * 100)}") for q in QUANTILES]
+    aggs += [pl.col("time").mean().alias("time_mean")]
+    aggs += [pl.col("time").quantile(q, "linear").alias(f"time_p{round(q * 100)}") for q in QUANTILES]
+    return (_dimension_keys(res_df, ib_buckets).join(days, on="_i")
+            .group_by(["dimension", "bucket", "order", "target"]).agg(aggs)
+            .with_columns(pl.col("dimension").replace_strict(DIMENSIONS, list(range(len(DIMENSIONS)))).alias("_dim"),
+                          pl.col("target").replace_strict(TARGETS, list(range(len(TARGETS)))).alias("_tgt"))
+            .sort(["_dim", "order", "_tgt"]).drop(["_dim", "_tgt"]))
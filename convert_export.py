@@ -0,0 +1,102 @@
+"""
+Konwerter surowych eksportów tekstowych (NinjaTrader: "yyyyMMdd HHmmss;open;high;low;close[;volume]")
+do typowanego Parquet (zstd), strumieniowo, w blokach o ograniczonym rozmiarze.
+
+    python convert_export.py MNQ.Last.txt -o data.parquet
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+
+import polars as pl
+import pyarrow.parquet as pq
+
+PRICE_COLS = ["open", "high", "low", "close"]
+
+def _read_blocks(path, chunk_bytes):
+    # Bloki ~chunk_bytes przycięte do pełnych linii
+    with open(path, "rb") as f:
+        rest = b""
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                if rest.strip(): yield rest
+                return
+            data = rest + data
+            cut = data.rfind(b"\n")
+            if cut < 0:
+                rest = data
+                continue
+            yield data[:cut + 1]
+            rest = data[cut + 1:]
+
+def _parse_block(block, n_fields):
+    names = ["timestamp"] + PRICE_COLS + (["volume"] if n_fields > 5 else [])
+    schema = {"timestamp": pl.String, **{c: pl.Float64 for c in PRICE_COLS}}
+    if n_fields > 5: schema["volume"] = pl.Int64
+    df = pl.read_csv(io.BytesIO(block), separator=";", has_header=False, new_columns=names, schema_overrides=schema,
+                     columns=list(range(len(names))), truncate_ragged_lines=True)
+    return (df.with_columns(pl.col("timestamp").str.strip_chars().str.strptime(pl.Datetime("us"), "%Y%m%d %H%M%S", strict=False).dt.replace_time_zone("UTC"))
+              .drop_nulls("timestamp")
+              .unique("timestamp", keep="last", maintain_order=True)
+              .sort("timestamp"))
+
+def _sniff(path):
+    # (liczba pól, czy pierwsza linia to nagłówek)
+    with open(path, "rb") as f:
+        first = f.readline().decode("utf-8", "replace").strip()
+    return first.count(";") + 1, not first[:1].isdigit()
+
+def convert(src, dst, chunk_mb=64, log=None):
+    """
+    Strumieniowa konwersja: każdy blok jest parsowany, deduplikowany i sortowany, a potem dopisywany jako
+    row-group. Jeśli bloki nachodzą na siebie czasowo (eksport nie był chronologiczny), plik wynikowy jest
+    na końcu jeszcze raz deduplikowany i sortowany silnikiem strumieniowym Polars. Zwraca liczbę wierszy.
+    """
+    n_fields, has_header = _sniff(src)
+    out_dir = os.path.dirname(os.path.abspath(dst))
+    fd, tmp = tempfile.mkstemp(suffix=".parquet", dir=out_dir)
+    os.close(fd)
+    writer, last_ts, overlapping, rows = None, None, False, 0
+    try:
+        for i, block in enumerate(_read_blocks(src, chunk_mb * 1024 * 1024)):
+            if i == 0 and has_header: block = block.split(b"\n", 1)[1] if b"\n" in block else b""
+            df = _parse_block(block, n_fields)
+            if df.is_empty(): continue
+            if last_ts is not None and df["timestamp"][0] <= last_ts: overlapping = True
+            last_ts = df["timestamp"][-1] if last_ts is None else max(last_ts, df["timestamp"][-1])
+            table = df.to_arrow()
+            if writer is None: writer = pq.ParquetWriter(tmp, table.schema, compression="zstd")
+            writer.write_table(table)
+            rows += df.height
+            if log: log(f"blok {i + 1}: {rows:,} wierszy")
+        if writer is None: raise ValueError(f"Brak poprawnych wierszy w {src}")
+        writer.close()
+        writer = None
+        if overlapping:
+            if log: log("bloki nachodzą na siebie - globalna deduplikacja i sortowanie")
+            fd, merged = tempfile.mkstemp(suffix=".parquet", dir=out_dir)
+            os.close(fd)
+            (pl.scan_parquet(tmp).unique("timestamp", keep="last").sort("timestamp")
+               .sink_parquet(merged, compression="zstd"))
+            os.replace(merged, tmp)
+            rows = pl.scan_parquet(tmp).select(pl.len()).collect().item()
+        os.replace(tmp, dst)
+    finally:
+        if writer is not None: writer.close()
+        if os.path.exists(tmp): os.remove(tmp)
+    return rows
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Eksport tekstowy (timestamp;open;high;low;close[;volume]) -> Parquet (zstd)")
+    ap.add_argument("src", help="plik tekstowy eksportu")
+    ap.add_argument("-o", "--output", default="data.parquet", help="plik wynikowy (domyślnie data.parquet)")
+    ap.add_argument("--chunk-mb", type=int, default=64, help="rozmiar bloku w MB (ogranicza zużycie pamięci)")
+    args = ap.parse_args(argv)
+    rows = convert(args.src, args.output, args.chunk_mb, log=lambda m: print(m, file=sys.stderr))
+    print(f"✅ {rows:,} wierszy -> {args.output}")
+
+if __name__ == "__main__":
+    main()
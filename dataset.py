@@ -0,0 +1,176 @@
+"""
+Zbiór barów partycjonowany po miesiącach (Hive: <katalog>/year=YYYY/month=MM/part-*.parquet) zamiast jednego
+data.parquet. Partycja = rok / miesiąc surowego znacznika czasu (UTC). Dopisanie nowych dni tworzy nowe pliki
+w partycjach, bez przepisywania historii; compact scala pliki w obrębie miesiąca.
+
+    python dataset.py append data.parquet -d data        # import / dopisanie (plik albo inny zbiór)
+    python dataset.py compact -d data [--month 2024-03]  # jeden plik na miesiąc
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sys
+import tempfile
+from datetime import timedelta
+
+import polars as pl
+
+_PART_RE = re.compile(r"year=(\d{4})[\\/]month=(\d{1,2})[\\/][^\\/]+\.parquet$")
+
+def is_dataset(path) -> bool:
+    return isinstance(path, (str, os.PathLike)) and os.path.isdir(path)
+
+def _partitions(root):
+    # [(rok, miesiąc, plik)] - jeden glob na stałej głębokości, bez przechodzenia całego drzewa
+    out = []
+    for f in glob.glob(os.path.join(glob.escape(str(root)), "year=*", "month=*", "*.parquet")):
+        m = _PART_RE.search(f)
+        if m: out.append((int(m.group(1)), int(m.group(2)), f))
+    return sorted(out)
+
+def partition_files(root, start_date=None, end_date=None) -> list:
+    """
+    Pliki partycji, które mogą zawierać bary dni [start_date, end_date]. Margines jak w _raw_date_predicate
+    (-2 / +3 dni: przesunięcie UTC->NY i sesje overnight), więc przycięcie nie gubi dni brzegowych.
+    """
+    lo = start_date - timedelta(days=2) if start_date else None
+    hi = end_date + timedelta(days=3) if end_date else None
+    lo_key = (lo.year, lo.month) if lo else (0, 0)
+    hi_key = (hi.year, hi.month) if hi else (9999, 12)
+    return [f for y, m, f in _partitions(root) if lo_key <= (y, m) <= hi_key]
+
+def scan_dataset(root, start_date=None, end_date=None) -> pl.LazyFrame:
+    """
+    Leniwy scan przyciętych partycji. Polars czyta pliki równolegle (pula wątków silnika), a kolumny
+    year / month nie są doklejane - schemat jak w pojedynczym data.parquet.
+    """
+    files = partition_files(root, start_date, end_date)
+    if files: return pl.scan_parquet(files, hive_partitioning=False, parallel="auto")
+    every = _partitions(root)
+    if not every: raise FileNotFoundError(f"Brak plików partycji year=*/month=*/*.parquet w {root}")
+    return pl.scan_parquet(every[0][2], hive_partitioning=False).clear()  # zakres poza danymi: pusta ramka z tym samym schematem
+
+def scan_source(source, start_date=None, end_date=None) -> pl.LazyFrame:
+    # Pojedynczy plik parquet albo katalog partycjonowany
+    if is_dataset(source): return scan_dataset(source, start_date, end_date)
+    return pl.scan_parquet(source)
+
+def fingerprint(source) -> str:
+    """
+    Identyfikator wersji danych do kluczy cache: ścieżka + rozmiar + mtime (dla zbioru - wszystkich plików partycji;
+    mtime katalogu nie zmienia się, gdy przybywa plików w podkatalogach).
+    """
+    if not is_dataset(source):
+        st = os.stat(source)
+        return f"{os.path.abspath(source)}|{st.st_size}|{st.st_mtime_ns}"
+    h = hashlib.sha1(os.path.abspath(source).encode())
+    for _, _, f in _partitions(source):
+        st = os.stat(f)
+        h.update(f"{os.path.relpath(f, source)}|{st.st_size}|{st.st_mtime_ns}".encode())
+    return h.hexdigest()
+
+def find_source(names=("data", "data.parquet"), depth=2):
+    """
+    Pierwszy zbiór partycjonowany albo plik o podanej nazwie w katalogu bieżącym lub do depth poziomów niżej.
+    """
+    for level in range(depth + 1):
+        for name in names:
+            for path in sorted(glob.glob(os.path.join(*(["*"] * level), name))):
+                if os.path.isfile(path) or (os.path.isdir(path) and _partitions(path)): return path
+    return None
+
+def _ts_expr(name, dtype):
+    # Surowy znacznik czasu (pierwsza kolumna, jak w _prepare_lazyframe) -> Datetime bez strefy, czas UTC
+    col = pl.col(name)
+    if dtype == pl.Int64: col, dtype = col.cast(pl.String), pl.String
+    if dtype == pl.String: return col.str.slice(0, 15).str.strptime(pl.Datetime("us"), "%Y%m%d %H%M%S", strict=False)
+    return col.dt.replace_time_zone(None) if dtype.time_zone else col
+
+def _write_atomic(df, target):
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(target))
+    os.close(fd)
+    try:
+        df.write_parquet(tmp, compression="zstd")
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+
+def _part_path(root, year, month, ts):
+    return os.path.join(root, f"year={year:04d}", f"month={month:02d}", f"part-{ts.min():%Y%m%d%H%M%S}-{ts.max():%Y%m%d%H%M%S}.parquet")
+
+def append(root, source, log=None) -> int:
+    """
+    Dopisuje bary z pliku parquet (lub innego zbioru) jako nowe pliki partycji. Bary o znacznikach czasu już
+    obecnych w zbiorze są pomijane (historia się nie zmienia); czytane są tylko istniejące partycje
+    miesięcy, których dotyczy dopisanie. Zwraca liczbę dopisanych wierszy.
+    """
+    new = scan_source(source).collect()
+    if new.is_empty(): return 0
+    name = new.columns[0]
+    existing = _partitions(root) if os.path.isdir(root) else []
+    if existing:
+        schema = pl.read_parquet_schema(existing[0][2])
+        if dict(schema) != dict(new.schema): raise ValueError(f"Schemat {source} różni się od schematu zbioru {root}")
+    new = (new.with_columns(_ts_expr(name, new.schema[name]).alias("_ts"))
+              .drop_nulls("_ts").unique("_ts", keep="last", maintain_order=True).sort("_ts")
+              .with_columns(pl.col("_ts").dt.year().alias("_year"), pl.col("_ts").dt.month().alias("_month")))
+    months = set(new.select("_year", "_month").unique().iter_rows())
+    touched = [f for y, m, f in existing if (y, m) in months]
+    if touched:
+        have = pl.scan_parquet(touched, hive_partitioning=False).select(_ts_expr(name, new.schema[name]).alias("_ts")).collect()
+        new = new.join(have, on="_ts", how="anti")
+    rows = 0
+    for (year, month), part in new.partition_by(["_year", "_month"], as_dict=True, maintain_order=True).items():
+        target = _part_path(root, year, month, part["_ts"])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write_atomic(part.drop("_ts", "_year", "_month"), target)
+        rows += part.height
+        if log: log(f"{year:04d}-{month:02d}: +{part.height:,} wierszy -> {os.path.basename(target)}")
+    return rows
+
+def compact(root, months=None, log=None) -> int:
+    """
+    Scala pliki każdej partycji z więcej niż jednym plikiem w jeden (deduplikacja po czasie, nowsze pliki wygrywają).
+    months: lista (rok, miesiąc) albo None = wszystkie. Zwraca liczbę scalonych partycji.
+    """
+    groups = {}
+    for y, m, f in _partitions(root):
+        if months is None or (y, m) in months: groups.setdefault((y, m), []).append(f)
+    merged = 0
+    for (year, month), files in groups.items():
+        if len(files) < 2: continue
+        files.sort(key=os.path.getmtime)
+        df = pl.concat([pl.read_parquet(f, hive_partitioning=False) for f in files])
+        name = df.columns[0]
+        df = (df.with_columns(_ts_expr(name, df.schema[name]).alias("_ts"))
+                .unique("_ts", keep="last", maintain_order=True).sort("_ts"))
+        target = _part_path(root, year, month, df["_ts"])
+        _write_atomic(df.drop("_ts"), target)
+        for f in files:
+            if os.path.abspath(f) != os.path.abspath(target): os.remove(f)
+        merged += 1
+        if log: log(f"{year:04d}-{month:02d}: {len(files)} plików -> {os.path.basename(target)} ({df.height:,} wierszy)")
+    return merged
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Zbiór barów partycjonowany year=/month= (Parquet)")
+    ap.add_argument("-d", "--dataset", default="data", help="katalog zbioru (domyślnie data)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_app = sub.add_parser("append", help="dopisz nowe bary jako nowe pliki partycji")
+    p_app.add_argument("src", help="plik parquet albo katalog zbioru z nowymi barami")
+    p_cmp = sub.add_parser("compact", help="scal pliki w obrębie miesięcy")
+    p_cmp.add_argument("--month", action="append", help="YYYY-MM (można powtórzyć); domyślnie wszystkie")
+    args = ap.parse_args(argv)
+    log = lambda m: print(m, file=sys.stderr)
+    if args.cmd == "append":
+        rows = append(args.dataset, args.src, log=log)
+        print(f"✅ {rows:,} nowych wierszy -> {args.dataset}")
+    else:
+        months = [tuple(int(x) for x in m.split("-")) for m in args.month] if args.month else None
+        n = compact(args.dataset, months, log=log)
+        print(f"✅ scalono {n} partycji w {args.dataset}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+from compact_bars import expand, is_compact, price_rows as compact_price_rows
+
+# --- INDEKS DNI (CSR) ---
+# Ramka z _prepare_dataframe jest posortowana po ts_utc, a "date" rośnie monotonicznie razem z czasem,
+# więc każdy dzień to ciągły blok wierszy [start, end). Dzień / okno czasu = slice zamiast filtra.
+# Wszystkie funkcje przyjmują też postać kompaktową z compact_bars.
+
+def build_day_index(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Posortowane daty -> [start, end) wierszy w df (run-length encoding kolumny "date").
+    """
+    if is_compact(df):
+        rle = df["ticks"]["day"].rle().struct.unnest()
+        dates = df["dates"].gather(rle["value"])
+    else:
+        rle = df["date"].rle().struct.unnest()
+        dates = rle["value"]
+    ends = rle["len"].cast(pl.Int64).cum_sum()
+    return (pl.DataFrame({"date": dates, "start": ends - rle["len"].cast(pl.Int64), "end": ends})
+            .filter(pl.col("date").is_not_null()))
+
+def to_us(s: pl.Series) -> np.ndarray:
+    # µs od epoki; brakujące ts (sortowane na początek) -> minimum int64, żeby tablica pozostała posortowana
+    return s.dt.cast_time_unit("us").cast(pl.Int64).fill_null(np.iinfo(np.int64).min).to_numpy()
+
+def ts_array(df: pl.DataFrame) -> np.ndarray:
+    if is_compact(df): return df["ticks"]["ts"].to_numpy()
+    return to_us(df["ts_utc"])
+
+def price_rows(df: pl.DataFrame, col, rows) -> np.ndarray:
+    if is_compact(df): return compact_price_rows(df, col, rows)
+    return df[col].to_numpy()[rows]
+
+def bar_frame(df: pl.DataFrame, rows) -> pl.DataFrame:
+    """
+    ts_utc / high / low / close dla wskazanych wierszy.
+    """
+    if not is_compact(df): return df.select(["ts_utc", "high", "low", "close"])[rows]
+    return pl.DataFrame([
+        pl.from_epoch(pl.Series("ts_utc", ts_array(df)[rows]), time_unit="us").dt.replace_time_zone("UTC"),
+        *[pl.Series(c, price_rows(df, c, rows)) for c in ["high", "low", "close"]],
+    ])
+
+def day_bounds(index: pl.DataFrame, dates) -> tuple:
+    """
+    (start, end) wierszy dla listy/serii dat; dni spoza indeksu dostają pusty zakres (0, 0).
+    """
+    dates = pl.Series("date", dates, dtype=pl.Date)
+    if index.is_empty(): return np.zeros(len(dates), np.int64), np.zeros(len(dates), np.int64)
+    pos = np.minimum(index["date"].search_sorted(dates, side="left").to_numpy().astype(np.int64), index.height - 1)
+    found = index["date"].to_numpy()[pos] == dates.to_numpy()
+    return np.where(found, index["start"].to_numpy()[pos], 0), np.where(found, index["end"].to_numpy()[pos], 0)
+
+def day_slice(df: pl.DataFrame, index: pl.DataFrame, date_val) -> pl.DataFrame:
+    start, end = day_bounds(index, [date_val])
+    if is_compact(df): return expand(df, int(start[0]), int(end[0] - start[0]))
+    return df.slice(int(start[0]), int(end[0] - start[0]))
+
+def ts_window(df: pl.DataFrame, lo: datetime, hi: datetime) -> pl.DataFrame:
+    """
+    Wiersze z lo <= ts_utc <= hi jako slice (binary search po posortowanym ts_utc).
+    """
+    if is_compact(df):
+        ts = ts_array(df)
+        a = int(np.searchsorted(ts, to_us(pl.Series([lo]))[0], side="left"))
+        b = int(np.searchsorted(ts, to_us(pl.Series([hi]))[0], side="right"))
+        return expand(df, a, max(b - a, 0))
+    ts = df["ts_utc"]
+    a = ts.search_sorted(pl.Series([lo], dtype=ts.dtype), side="left")[0]
+    b = ts.search_sorted(pl.Series([hi], dtype=ts.dtype), side="right")[0]
+    return df.slice(a, max(b - a, 0))
+
+def window_rows(ts: np.ndarray, day_start, day_end, lo_us, hi_us):
+    """
+    Dla każdego dnia okno lo <= ts <= hi ograniczone do [day_start, day_end): zwraca (indeksy wierszy
+    sklejone dzień po dniu, liczby barów per dzień). lo_us / hi_us w µs od epoki (jak ts_array).
+    """
+    a = np.clip(np.searchsorted(ts, lo_us, side="left"), day_start, day_end)
+    b = np.clip(np.searchsorted(ts, hi_us, side="right"), a, day_end)
+    counts = b - a
+    total = int(counts.sum())
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    rows = np.arange(total, dtype=np.int64) + np.repeat(a - offsets[:-1], counts)
+    return rows, counts
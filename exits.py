@@ -0,0 +1,154 @@
+import numpy as np
+import polars as pl
+
+from analysis_ib_double_breakout import (SIM_OUTCOMES, SIM_CLOSE_ON_ENTRY, SIM_WIN, SIM_LOSS, SIM_CLOSE,
+                                         _sim_day_arrays, _sim_entries)
+from profiling import stage
+
+# --- REGUŁY WYJŚCIA (wiele polityk na tych samych wejściach) ---
+# Trigger i wejście liczone są raz (_sim_entries), a wszystkie polityki wyjścia naraz na płaskich tablicach barów
+# "w transakcji" (od świecy po wejściu do deadline'u): macierze [polityka x bar], pierwsze wyjście per dzień
+# przez minimum.reduceat po offsetach dni. Przestrzeń robocza: lustro _sim_day_arrays, a dla FADE jeszcze
+# raz * -1 - pozycja jest wtedy zawsze "długa" (zysk w górę, stop pod ceną).
+# Poziomy w % zakresu IB: TP od poziomu wybicia (jak w run_simulation), SL / trailing / break-even / scale-out
+# od ceny wejścia. Stop przesuwany (trailing, break-even) liczony jest z maksimum barów przed bieżącym,
+# bo kolejność high / low w świecy nie jest znana; świeca ze stopem i TP / scale-out = najpierw stop.
+EXIT_RULES = ["fixed", "trailing", "breakeven", "time", "scale_out"]
+EXIT_DEFAULTS = {"rule": "fixed", "tp_pct": 100.0, "sl_dist_pct": 25.0, "trail_pct": None, "be_pct": None,
+                 "time_min": None, "partial_pct": None, "partial_frac": 0.5}
+_REQUIRED = {"trailing": "trail_pct", "breakeven": "be_pct", "time": "time_min", "scale_out": "partial_pct"}
+
+# powód wyjścia dni w transakcji -> komentarz (TP / SL / EOD jak w run_simulation)
+EXIT_TP, EXIT_SL, EXIT_TRAIL, EXIT_BE, EXIT_TIME, EXIT_EOD = range(6)
+EXIT_COMMENTS = ["WIN", "LOSS", "Trailing stop", "Break-even", "Time exit", "CLOSE"]
+
+def normalize_policies(policies) -> dict:
+    """
+    {nazwa: parametry} -> parametry z wartościami domyślnymi. Reguła wymaga swojego parametru (trailing: trail_pct,
+    breakeven: be_pct, time: time_min, scale_out: partial_pct); pozostałe można łączyć dowolnie, tp_pct=None = bez TP.
+    """
+    out = {}
+    for name, raw in policies.items():
+        p = {**EXIT_DEFAULTS, **raw}
+        if p["rule"] not in EXIT_RULES: raise ValueError(f"{name}: nieznana reguła wyjścia {p['rule']} (dostępne: {', '.join(EXIT_RULES)})")
+        req = _REQUIRED.get(p["rule"])
+        if req and p[req] is None: raise ValueError(f"{name}: reguła {p['rule']} wymaga {req}")
+        if p["partial_pct"] is not None and not 0 < p["partial_frac"] < 1: raise ValueError(f"{name}: partial_frac musi być w (0, 1)")
+        out[str(name)] = p
+    if not out: raise ValueError("Brak polityk wyjścia")
+    return out
+
+def _running_max(values, seg):
+    # Maksimum narastające w obrębie dnia (seg rosnące): ranga wartości + przesunięcie dnia, dokładnie (bez sum float)
+    uniq, rank = np.unique(values, return_inverse=True)
+    shift = seg.astype(np.int64) * uniq.size
+    return uniq[np.maximum.accumulate(shift + rank) - shift]
+
+def _exit_arrays(arr, trigger_pct, entry_pct, policies, strategy_mode="TREND"):
+    """
+    Wszystkie polityki na tych samych wejściach. Zwraca (kody SIM_OUTCOMES, wynik w R, powód EXIT_* albo -1
+    dla dni bez transakcji, czy scale-out został zrealizowany) - macierze [polityka x dzień].
+    """
+    pending, entry_price, entry_first, in_trade_first = _sim_entries(arr, trigger_pct, entry_pct)
+    param = lambda k: np.array([np.nan if p[k] is None else p[k] for p in policies.values()], dtype=np.float64)[:, None]
+    tp_pct, sl_pct, trail, be, time_min, part_pct, part_frac = (param(k) for k in
+        ["tp_pct", "sl_dist_pct", "trail_pct", "be_pct", "time_min", "partial_pct", "partial_frac"])
+    n_pol, n_days = tp_pct.shape[0], pending.size
+    sgn = 1.0 if strategy_mode == "TREND" else -1.0
+    high, low = (arr["high"], arr["low"]) if sgn > 0 else (-arr["low"], -arr["high"])
+    close = sgn * arr["close"]
+
+    # poziomy per dzień [polityka x dzień], w przestrzeni roboczej
+    rng, entry = arr["ib_range"], sgn * entry_price
+    sl_price = entry - rng * (sl_pct / 100)
+    tp_price = sgn * (arr["base"] + rng * (tp_pct / 100))
+    part_price = entry + rng * (part_pct / 100)
+    risk = np.abs(entry - sl_price)
+    risk[risk == 0] = 1.0
+
+    codes = np.broadcast_to(pending, (n_pol, n_days)).astype(np.int8)
+    reason = np.full((n_pol, n_days), -1, dtype=np.int8)
+    filled = np.zeros((n_pol, n_days), dtype=bool)
+    on_entry = pending == SIM_CLOSE_ON_ENTRY
+    r = np.where(on_entry, (close[np.minimum(entry_first, close.size - 1)] - entry) / risk, 0.0)
+
+    traded = np.flatnonzero(pending < 0)
+    if traded.size == 0: return codes, r, reason, filled
+    counts = arr["offsets"][1:][traded] - in_trade_first[traded]
+    seg_start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    seg = np.repeat(np.arange(traded.size), counts)
+    rows = np.arange(counts.sum()) - seg_start[seg] + in_trade_first[traded][seg]
+    h, l, c = high[rows], low[rows], close[rows]
+    e, d_rng = entry[traded][seg], rng[traded][seg]
+    # maksimum high przed bieżącym barem (od ceny wejścia) - odniesienie dla trailing i break-even
+    run_max = _running_max(h, seg)
+    prev = np.where(np.r_[True, seg[1:] != seg[:-1]], -np.inf, np.r_[-np.inf, run_max[:-1]])
+    ref = np.maximum(prev, e)
+
+    # [polityka x bar]
+    trail_stop = ref - d_rng * (trail / 100)
+    be_on = ref >= e + d_rng * (be / 100)
+    stop = np.maximum(sl_price[:, traded][:, seg], np.where(np.isnan(trail), -np.inf, trail_stop))
+    stop = np.where(be_on, np.maximum(stop, e), stop)
+    elapsed = arr["ts"][rows] - arr["ts"][entry_first[traded]][seg]
+    stop_hit = l <= stop
+    tp_hit = h >= tp_price[:, traded][:, seg]
+    time_hit = elapsed >= time_min * 60_000_000
+    part_hit = h >= part_price[:, traded][:, seg]
+
+    first = lambda hit: np.minimum.reduceat(np.where(hit, np.arange(seg.size), seg.size), seg_start, axis=1)
+    seg_end = seg_start + counts
+    exit_at = first(stop_hit | tp_hit | time_hit)
+    has_exit = exit_at < seg_end
+    at = np.where(has_exit, exit_at, seg_end - 1)
+    pol = np.arange(n_pol)[:, None]
+    by_stop = has_exit & stop_hit[pol, at]
+    by_tp = has_exit & ~by_stop & tp_hit[pol, at]
+    exit_price = np.select([by_stop, by_tp], [stop[pol, at], tp_price[:, traded]], c[at])
+    moved = by_stop & (stop[pol, at] > sl_price[:, traded])
+    why = np.select([by_tp, moved & (stop[pol, at] == trail_stop[pol, at]), moved, by_stop, has_exit],
+                    [EXIT_TP, EXIT_TRAIL, EXIT_BE, EXIT_SL, EXIT_TIME], EXIT_EOD)
+
+    # scale-out: poziom przed świecą wyjścia albo na niej, o ile wyjście nie jest stopem i nie jest TP bliższym niż poziom
+    part_at = first(part_hit)
+    p_price = part_price[:, traded]
+    done = (part_at < at) | ((part_at == at) & ~by_stop & ~(by_tp & (p_price > tp_price[:, traded])))
+    frac = np.where(done, part_frac, 0.0)
+    d_risk = risk[:, traded]
+    r_t = np.where(done, frac * (p_price - entry[traded]) / d_risk, 0.0) + (1 - frac) * (exit_price - entry[traded]) / d_risk
+
+    # stop przesunięty: wynik decyduje o WIN / LOSS, a wyjście dokładnie na cenie wejścia (r = 0) to CLOSE, nie strata
+    moved_code = np.where(r_t > 0, SIM_WIN, np.where(r_t < 0, SIM_LOSS, SIM_CLOSE))
+    codes[:, traded] = np.select([by_tp, moved, by_stop], [SIM_WIN, moved_code, SIM_LOSS], SIM_CLOSE)
+    r[:, traded] = r_t
+    reason[:, traded] = why
+    filled[:, traded] = done
+    return codes, r, reason, filled
+
+def run_exit_policies(df_all, res_df, trigger_pct, entry_pct, policies, deadline, strategy_mode="TREND", risk_model="FIXED",
+                      risk_value=100.0, day_index=None) -> dict:
+    """
+    Setup run_simulation (trigger / wejście) z wieloma politykami wyjścia naraz: {nazwa: dziennik transakcji}
+    w układzie run_simulation, gotowe dla metrics.sim_metrics / equity_curve. Polityka "fixed" z tymi samymi
+    tp_pct / sl_dist_pct daje dziennik identyczny z run_simulation (bez rozstrzygania intrabar).
+    """
+    policies = normalize_policies(policies)
+    with stage("exits.arrays") as s:
+        arr = _sim_day_arrays(df_all, res_df, deadline, day_index)
+        s.rows = arr["key"].size if arr is not None else 0
+    if arr is None: return {name: pl.DataFrame() for name in policies}
+    with stage("exits", rows=len(arr["date"]), policies=len(policies), mode=strategy_mode):
+        codes, r_res, reason, filled = _exit_arrays(arr, trigger_pct, entry_pct, policies, strategy_mode)
+    risk_cash = risk_value if risk_model == "FIXED" else 100.0
+    out = {}
+    for i, name in enumerate(policies):
+        comments = [SIM_OUTCOMES[c][1] if w < 0 else EXIT_COMMENTS[w] + (" + scale-out" if f else "")
+                    for c, w, f in zip(codes[i].tolist(), reason[i].tolist(), filled[i].tolist())]
+        out[name] = pl.DataFrame({
+            "date": arr["date"],
+            "result": [SIM_OUTCOMES[c][0] for c in codes[i]],
+            "pnl": r_res[i] * risk_cash,
+            "r_result": r_res[i],
+            "comment": comments,
+        })
+    return out
@@ -0,0 +1,82 @@
+import numpy as np
+
+# --- INDEKS PIERWSZEGO DOTKNIĘCIA POZIOMU ---
+# Pytanie "od baru s w dniu d: pierwszy bar z high >= X (albo low <= X)" i "jaki był ekstremalny ruch do tego
+# momentu" bez maski po wszystkich barach. Tablice rzadkie (sparse table) minimów po blokach 2^k barów:
+# pierwsze dotknięcie = zejście binarne po blokach (O(log n) na zapytanie), ekstremum na przedziale = dwa bloki (O(1)).
+# Oba rodzaje zapytań sprowadzone są do minimum: "low <= X" na low, "high >= X" na -high (lustro).
+ABOVE, BELOW = True, False  # high >= X / low <= X
+
+def build_touch_index(high, low, offsets) -> dict:
+    """
+    Indeks dla płaskich tablic barów z offsetami dni (układ CSR jak w _sim_day_arrays).
+    Poziomy tablic tylko do długości najdłuższego dnia - bloki nigdy nie przekraczają końca dnia przy zapytaniu.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    longest = int(np.diff(offsets).max(initial=1))
+    tables = []
+    for series in (np.asarray(low, dtype=np.float64), -np.asarray(high, dtype=np.float64)):
+        levels = [series]
+        k = 1
+        while (1 << k) <= longest:
+            prev, half = levels[-1], 1 << (k - 1)
+            levels.append(np.minimum(prev[:-half], prev[half:]) if prev.size > half else prev[:0])
+            k += 1
+        tables.append(levels)
+    return {"tables": tables, "offsets": offsets, "n_levels": len(tables[0])}
+
+def _range_min(levels, lo, hi):
+    # min(series[lo..hi]) włącznie, dla lo <= hi
+    k = np.floor(np.log2(np.maximum(hi - lo + 1, 1))).astype(np.int64)
+    out = np.empty(lo.size, dtype=np.float64)
+    for lvl in np.unique(k):
+        m = k == lvl
+        t = levels[lvl]
+        out[m] = np.minimum(t[lo[m]], t[hi[m] - (1 << lvl) + 1])
+    return out
+
+def first_touch(index, day, start, level, side, strict=False, excursion=True):
+    """
+    Zapytania wsadowe (tablice tej samej długości): dzień, bar startowy (indeks w płaskich tablicach), poziom X,
+    strona ABOVE (high >= X) / BELOW (low <= X) - skalar albo tablica bool. strict=True: high > X / low < X.
+    Zwraca (indeks pierwszego baru dotykającego poziomu albo koniec dnia, gdy brak; ekstremum przeciwnej strony
+    od startu do tego baru włącznie - max high dla BELOW, min low dla ABOVE; NaN gdy start >= koniec dnia).
+    excursion=False pomija ekstremum (zwraca None).
+    """
+    day = np.asarray(day, dtype=np.int64)
+    start = np.asarray(start, dtype=np.int64)
+    end = index["offsets"][day + 1]
+    pos = np.minimum(start, end)
+    lows, neg_highs = index["tables"]
+    if np.ndim(side) == 0:
+        above = np.full(pos.shape, bool(side))
+        target = -np.asarray(level, dtype=np.float64) if side else np.asarray(level, dtype=np.float64)
+        pick = lambda k, idx: (neg_highs if side else lows)[k][idx]
+    else:
+        above = np.asarray(side, dtype=bool)
+        target = np.where(above, -np.asarray(level, dtype=np.float64), level)
+        pick = lambda k, idx: np.where(above, neg_highs[k][idx], lows[k][idx])
+    # zejście od największych bloków: blok przeskakiwany, jeśli cały jest powyżej poziomu (min > X, strict: min >= X)
+    for k in range(index["n_levels"] - 1, -1, -1):
+        size = 1 << k
+        ok = pos + size <= end
+        if not ok.any(): continue
+        block = pick(k, np.where(ok, pos, 0))
+        skip = ok & ((block >= target) if strict else (block > target))
+        pos += np.where(skip, size, 0)
+    if not excursion: return pos, None
+    return pos, extreme(index, start, np.where(pos < end, pos, end - 1), above)
+
+def extreme(index, lo, hi, side):
+    """
+    Ekstremum przeciwnej strony na barach [lo, hi] (włącznie): max high dla BELOW, min low dla ABOVE; NaN gdy lo > hi.
+    """
+    lo, hi = np.asarray(lo, dtype=np.int64), np.asarray(hi, dtype=np.int64)
+    above = np.broadcast_to(np.asarray(side, dtype=bool), lo.shape)
+    lows, neg_highs = index["tables"]
+    out = np.full(lo.shape, np.nan)
+    valid = lo <= hi
+    down, up = valid & ~above, valid & above
+    if down.any(): out[down] = -_range_min(neg_highs, lo[down], hi[down])
+    if up.any(): out[up] = _range_min(lows, lo[up], hi[up])
+    return out
@@ -0,0 +1,80 @@
+from datetime import time, timedelta
+
+import polars as pl
+
+from analysis_ib_double_breakout import _analyze_columnar, scan_bars
+from day_index import build_day_index
+from profiling import stage
+
+# --- PORÓWNANIE DEFINICJI IB (wiele okien w jednym przebiegu) ---
+# Parsowanie, konwersja UTC->NY i sortowanie barów odbywają się raz. Data handlowa zależy tylko od tego,
+# czy sesja jest overnight i od godziny startu IB, więc podział na dni (indeks CSR) jest liczony raz
+# na każdą taką wartość i współdzielony przez wszystkie konfiguracje z tym samym podziałem.
+TARGETS = ["dbl", "mid", "line"]
+
+def normalize_windows(configs) -> list:
+    """
+    (ib_start, ib_end, deadline, breakout_type, direction[, is_overnight]) -> słowniki z etykietą.
+    Bez is_overnight: overnight gdy ib_start > ib_end (jak domyślna wartość w aplikacji).
+    """
+    out = []
+    for cfg in configs:
+        ib_start, ib_end, deadline, breakout_type, direction = cfg[:5]
+        is_overnight = cfg[5] if len(cfg) > 5 else ib_start > ib_end
+        if breakout_type not in ("wick", "close"): raise ValueError(f"Nieznany typ wybicia: {breakout_type}")
+        if direction not in ("UP", "DOWN", "BOTH"): raise ValueError(f"Nieznany kierunek: {direction}")
+        label = f"{ib_start:%H:%M}-{ib_end:%H:%M} → {deadline:%H:%M} {breakout_type} {direction}" + (" (ON)" if is_overnight else "")
+        out.append({"label": label, "ib_start": ib_start, "ib_end": ib_end, "deadline": deadline,
+                    "breakout_type": breakout_type, "direction": direction, "is_overnight": bool(is_overnight)})
+    labels = [c["label"] for c in out]
+    if len(set(labels)) != len(labels): raise ValueError("Konfiguracje okien IB muszą być unikalne")
+    return out
+
+def _day_index(df, ib_start, is_overnight):
+    # Data handlowa jak w _prepare_lazyframe, liczona z kolumn wspólnej ramki (bez ponownego parsowania)
+    if not is_overnight: return build_day_index(df.select("date"))
+    shifted = pl.when(pl.col("ts_ny").dt.time() >= ib_start).then(pl.col("calendar_date") + timedelta(days=1)).otherwise(pl.col("calendar_date"))
+    return build_day_index(df.select(shifted.alias("date")))
+
+def analyze_windows(source, configs, start_date=None, end_date=None, use_cache=False):
+    """
+    analyze_ib_double_breakout dla wielu konfiguracji naraz. source jak w scan_bars (ścieżka / ramka).
+    Zwraca (wyniki wszystkich konfiguracji jeden pod drugim z kolumnami config + parametry okna, przygotowane bary).
+    """
+    windows = normalize_windows(configs)
+    if not windows: return pl.DataFrame(), pl.DataFrame()
+    with stage("prepare", cached=bool(use_cache)) as s:
+        # ramka bez przesunięcia overnight: date = data kalendarzowa NY
+        df = scan_bars(source, time(0, 0), False, start_date, end_date, use_cache).collect()
+        s.rows = df.height
+    if df.is_empty(): return pl.DataFrame(), df
+
+    indexes, parts = {}, []
+    for i, w in enumerate(windows):
+        key = w["ib_start"] if w["is_overnight"] else None
+        if key not in indexes:
+            with stage("windows.partition", rows=df.height): indexes[key] = _day_index(df, w["ib_start"], w["is_overnight"])
+        with stage("analysis", config=w["label"]) as s:
+            res = _analyze_columnar(df, w["ib_start"], w["ib_end"], w["deadline"], w["direction"], w["breakout_type"], w["is_overnight"],
+                                    start_date, end_date, day_index=indexes[key])
+            s.rows = res.height
+        if res.is_empty(): continue
+        parts.append(res.with_columns(
+            pl.lit(i + 1, dtype=pl.Int32).alias("config"), pl.lit(w["label"]).alias("label"),
+            pl.lit(w["ib_start"]).alias("cfg_ib_start"), pl.lit(w["ib_end"]).alias("cfg_ib_end"), pl.lit(w["deadline"]).alias("cfg_deadline"),
+            pl.lit(w["breakout_type"]).alias("cfg_breakout_type"), pl.lit(w["direction"]).alias("cfg_direction"),
+            pl.lit(w["is_overnight"]).alias("cfg_overnight")))
+    if not parts: return pl.DataFrame(), df
+    stacked = pl.concat(parts)
+    return stacked.select(["config", "label"] + [c for c in stacked.columns if c not in ("config", "label")]), df
+
+def compare_windows(stacked) -> pl.DataFrame:
+    """
+    Jeden wiersz na konfigurację: dni z wybiciem, udział UP, średni zakres IB, skuteczność celów
+    (dbl / mid / line) i mediana minut od końca IB do powrotu.
+    """
+    if stacked.is_empty(): return pl.DataFrame()
+    aggs = [pl.len().alias("days"), ((pl.col("direction") == "UP").mean() * 100).alias("up_pct"), pl.col("ib_range").mean().alias("avg_ib_range")]
+    for key in TARGETS:
+        aggs += [(pl.col(f"ret_{key}").mean() * 100).alias(f"hit_{key}"), pl.col(f"time_{key}").median().alias(f"median_min_{key}")]
+    return stacked.group_by(["config", "label"]).agg(aggs).sort("config")
@@ -0,0 +1,143 @@
+import threading
+import time as _time
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from dataset import _partitions, is_dataset
+
+# --- ROZSTRZYGANIE ŚWIEC Z SL I TP (dane 1s / tick) ---
+# Świeca 1m, która dotknęła i SL, i TP, jest w symulatorze LOSS (kolejność w świecy nieznana). Z danymi o wyższej
+# rozdzielczości czytane są tylko okna takich świec: zgrupowane per plik / partycja miesięczna, jeden odczyt
+# na plik (memory-map, tylko row-groupy, których min / max czasu zachodzi na któreś okno). Okna zostają
+# w pamięci (LRU), więc kolejna symulacja z innym TP / SL czyta z dysku tylko świece, których jeszcze nie było.
+UNRESOLVED, SL_FIRST, TP_FIRST = -1, 0, 1
+
+def _coalesce(lo, hi):
+    # Okna [lo, hi) -> posortowane, rozłączne przedziały
+    order = np.argsort(lo)
+    lo, hi = lo[order], hi[order]
+    starts = np.flatnonzero(np.r_[True, lo[1:] > np.maximum.accumulate(hi)[:-1]])
+    return lo[starts], np.maximum.reduceat(hi, starts)
+
+def _in_ranges(ts, r_lo, r_hi):
+    # ts w którymś z rozłącznych przedziałów [r_lo, r_hi)
+    j = np.searchsorted(r_lo, ts, side="right") - 1
+    return (j >= 0) & (ts < r_hi[np.maximum(j, 0)])
+
+class IntrabarSource:
+    """
+    Dane 1s / tick: plik parquet albo katalog partycjonowany (dataset.py). Pierwsza kolumna = czas (Datetime, UTC),
+    ceny: high / low (bary 1s) albo price / last / close (ticki). Świece symulatora oznaczone są czasem otwarcia
+    (bar_label="start", jak w analizie: ts >= ib_start) albo zamknięcia ("end").
+    """
+    def __init__(self, path, bar_seconds=60, bar_label="start", max_windows=50_000):
+        if bar_label not in ("start", "end"): raise ValueError(f"Nieznane oznaczenie świecy: {bar_label}")
+        self.path = path
+        self.bar_us = int(bar_seconds * 1_000_000)
+        self.bar_label = bar_label
+        self.max_windows = max_windows
+        self.files = _partitions(path) if is_dataset(path) else [(None, None, path)]
+        if not self.files: raise FileNotFoundError(f"Brak plików parquet w {path}")
+        schema = pq.read_schema(self.files[0][2])
+        self.ts_col, ts_type = schema.names[0], schema.field(0).type
+        if not pa.types.is_timestamp(ts_type): raise ValueError(f"Kolumna czasu {self.ts_col} musi być typu Datetime (convert_export.py)")
+        self.ts_type = pa.timestamp("us", tz=ts_type.tz)
+        names = set(schema.names)
+        price = next((c for c in ("price", "last", "close") if c in names), None)
+        if {"high", "low"} <= names: self.price_cols = ["high", "low"]
+        elif price: self.price_cols = [price]
+        else: raise ValueError("Dane 1s / tick wymagają kolumn high / low albo price")
+        self._windows = OrderedDict()  # ts świecy (µs) -> (high, low) wierszy 1s / ticków w oknie
+        self._lock = threading.Lock()
+        self.last = {}
+
+    def _window(self, bar_ts):
+        lo = bar_ts if self.bar_label == "start" else bar_ts - self.bar_us + 1
+        return lo, lo + self.bar_us
+
+    def _files_for(self, lo, hi):
+        # plik -> okna; w zbiorze partycjonowanym okno trafia do miesięcy (UTC) swojego początku i końca
+        if self.files[0][0] is None: return {self.files[0][2]: np.arange(lo.size)}
+        months = lambda v: v.astype("datetime64[us]").astype("datetime64[M]").astype(np.int64)  # miesiące od 1970-01
+        by_month = {}
+        for y, m, f in self.files: by_month.setdefault((y - 1970) * 12 + m - 1, []).append(f)
+        out = {}
+        for i, (a, b) in enumerate(zip(months(lo), months(hi - 1))):
+            for key in {int(a), int(b)}:
+                for f in by_month.get(key, []): out.setdefault(f, []).append(i)
+        return {f: np.asarray(idx) for f, idx in out.items()}
+
+    def _row_groups(self, pf, r_lo, r_hi):
+        # Row-groupy nachodzące na przedziały wg statystyk min / max kolumny czasu (brak statystyk = wszystkie)
+        keep = []
+        for i in range(pf.metadata.num_row_groups):
+            stats = pf.metadata.row_group(i).column(0).statistics
+            if stats is None or not stats.has_min_max:
+                keep.append(i)
+                continue
+            lo, hi = (pa.scalar(v, type=pf.schema_arrow.field(0).type).cast(self.ts_type).value for v in (stats.min, stats.max))
+            j = np.searchsorted(r_hi, lo, side="right")  # pierwszy przedział kończący się po lo
+            if j < r_lo.size and r_lo[j] <= hi: keep.append(i)
+        return keep
+
+    def _load(self, bar_ts):
+        # Jeden odczyt na plik dla wszystkich brakujących okien; zwraca liczbę przeczytanych plików
+        lo, hi = self._window(bar_ts)
+        parts = {int(t): ([], []) for t in bar_ts}
+        files = self._files_for(lo, hi)
+        for f, idx in files.items():
+            r_lo, r_hi = _coalesce(lo[idx], hi[idx])
+            pf = pq.ParquetFile(f, memory_map=True)
+            table = pf.read_row_groups(self._row_groups(pf, r_lo, r_hi), columns=[self.ts_col] + self.price_cols)
+            ts = pc.cast(pc.cast(table[self.ts_col], self.ts_type), pa.int64()).to_numpy()
+            rows = np.flatnonzero(_in_ranges(ts, r_lo, r_hi))
+            order = rows[np.argsort(ts[rows], kind="stable")]  # ticki z tym samym czasem zostają w kolejności pliku
+            ts = ts[order]
+            high = table[self.price_cols[0]].to_numpy()[order].astype(np.float64)
+            low = table[self.price_cols[-1]].to_numpy()[order].astype(np.float64)
+            a, b = np.searchsorted(ts, lo[idx]), np.searchsorted(ts, hi[idx])
+            for i, s, e in zip(idx, a, b):
+                if e > s:
+                    h, l = parts[int(bar_ts[i])]
+                    h.append(high[s:e])
+                    l.append(low[s:e])
+        with self._lock:
+            for t, (h, l) in parts.items():
+                self._windows[t] = (np.concatenate(h), np.concatenate(l)) if h else (np.empty(0), np.empty(0))
+            while len(self._windows) > self.max_windows: self._windows.popitem(last=False)
+        return len(files)
+
+    def resolve(self, days, bar_ts, is_up, sl_price, tp_price, is_trend):
+        """
+        Kolejność SL / TP w świecach, które dotknęły obu poziomów. Ceny w przestrzeni lustrzanej _sim_day_arrays
+        (dni DOWN * -1). Zwraca TP_FIRST / SL_FIRST / UNRESOLVED (brak danych w oknie albo oba poziomy
+        w tym samym wierszu 1s / ticku) per świeca; statystyki ostatniego wywołania w self.last.
+        """
+        t0 = _time.perf_counter()
+        bar_ts = np.asarray(bar_ts, dtype=np.int64)
+        with self._lock: missing = np.unique([t for t in bar_ts.tolist() if t not in self._windows]).astype(np.int64)
+        n_files = self._load(missing) if missing.size else 0
+        out = np.full(bar_ts.size, UNRESOLVED, dtype=np.int8)
+        with self._lock: windows = [self._windows.get(int(t)) for t in bar_ts]
+        for i, w in enumerate(windows):
+            if w is None or w[0].size == 0: continue
+            high, low = w if is_up[i] else (-w[1], -w[0])
+            sl_hit = low <= sl_price[i] if is_trend else high >= sl_price[i]
+            tp_hit = high >= tp_price[i] if is_trend else low <= tp_price[i]
+            sl_at = int(np.argmax(sl_hit)) if sl_hit.any() else high.size
+            tp_at = int(np.argmax(tp_hit)) if tp_hit.any() else high.size
+            if sl_at != tp_at: out[i] = TP_FIRST if tp_at < sl_at else SL_FIRST
+        self.last = {
+            "ambiguous": int(bar_ts.size),
+            "resolved": int((out != UNRESOLVED).sum()),
+            "tp_first": int((out == TP_FIRST).sum()),
+            "windows_read": int(missing.size),
+            "files_read": n_files,
+            "seconds": _time.perf_counter() - t0,
+            "days": np.asarray(days)[out != UNRESOLVED],
+        }
+        return out
@@ -0,0 +1,133 @@
+import numpy as np
+import polars as pl
+
+from analysis_ib_double_breakout import SIM_WIN, SIM_LOSS, SIM_CLOSE, SIM_CLOSE_ON_ENTRY
+from profiling import stage
+
+# --- METRYKI SYMULACJI (jedna lub wiele symulacji naraz) ---
+TRADED = ["WIN", "LOSS", "CLOSE"]
+TRADED_CODES = [SIM_WIN, SIM_LOSS, SIM_CLOSE, SIM_CLOSE_ON_ENTRY]
+BREAKDOWNS = {
+    "month": pl.col("date").dt.strftime("%Y-%m"),
+    "weekday": pl.col("date").dt.weekday(),
+    "direction": pl.col("direction"),
+}
+
+# Wspólne definicje dla sim_metrics i montecarlo (pl.Expr albo tablice NumPy): transakcja bez zysku (pnl <= 0,
+# także break-even) liczy się do serii strat, a DD % jest względem najwyższego kapitału całej ścieżki
+def loss_streak_mask(pnl):
+    return pnl <= 0
+
+def dd_pct(max_dd, max_equity):
+    return max_dd / max_equity * 100
+
+def batch_stats(codes, r_res) -> dict:
+    """
+    Statystyki w R dla macierzy [zestaw parametrów x dzień] kodów SIM_OUTCOMES i wyników z _simulate_arrays
+    (jeden wiersz = jedna symulacja). Dni bez transakcji mają r = 0, więc krzywa i serie liczone są
+    po całym wierszu bez kompresji. Zwraca słownik tablic (po jednej wartości na wiersz).
+    """
+    codes, r = np.atleast_2d(codes), np.atleast_2d(r_res)
+    traded = np.isin(codes, TRADED_CODES)
+    win, loss = codes == SIM_WIN, codes == SIM_LOSS
+    r = np.where(traded, r, 0.0)
+    n = traded.sum(axis=1)
+    equity = np.cumsum(r, axis=1)
+    net = equity[:, -1] if equity.shape[1] else np.zeros(len(equity))
+    max_dd = np.minimum((equity - np.maximum.accumulate(np.maximum(equity, 0.0), axis=1)).min(axis=1, initial=0.0), 0.0)
+    wins, losses = np.where(win, r, 0.0).sum(axis=1), np.where(loss, r, 0.0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pf = np.where(losses != 0, wins / np.abs(losses), np.inf)
+        win_rate = win.sum(axis=1) / n * 100
+        expectancy = net / n
+    # seria strat: dni bez transakcji jej nie przerywają, wygrana (r > 0) tak
+    lost = traded & (r <= 0)
+    c = np.cumsum(lost, axis=1, dtype=np.int32)
+    c -= np.maximum.accumulate(np.where(traded & ~lost, c, 0), axis=1)
+    empty = n == 0
+    return {
+        "trades": n,
+        "net_r": np.where(empty, 0.0, net),
+        "win_rate": np.where(empty, 0.0, win_rate),
+        "profit_factor": np.where(empty, 0.0, pf),
+        "max_dd_r": np.where(empty, 0.0, max_dd),
+        "expectancy_r": np.where(empty, 0.0, expectancy),
+        "max_loss_streak": c.max(axis=1, initial=0),
+    }
+
+def _stack(sims) -> pl.DataFrame:
+    # Jedna ramka run_simulation albo słownik {nazwa: ramka} -> jedna ramka z kolumną "run"
+    if isinstance(sims, pl.DataFrame): sims = {"": sims}
+    frames = [df.with_columns(pl.lit(str(name)).alias("run")) for name, df in sims.items() if not df.is_empty()]
+    if not frames: return pl.DataFrame()
+    return pl.concat(frames, how="diagonal_relaxed").with_row_index("_i").sort(["run", "date", "_i"])
+
+def equity_curve(sims, start_cap=10000.0) -> pl.DataFrame:
+    """
+    Kapitał po każdej transakcji (WIN / LOSS / CLOSE) w kolejności dat, z obsunięciem od szczytu.
+    """
+    df = _stack(sims)
+    if df.is_empty(): return pl.DataFrame()
+    equity = pl.col("pnl").cum_sum().over("run") + start_cap
+    return (df.filter(pl.col("result").is_in(TRADED))
+              .with_columns(equity.alias("equity"))
+              .with_columns(pl.max_horizontal(pl.col("equity").cum_max().over("run"), pl.lit(start_cap)).alias("peak"))
+              .with_columns((pl.col("equity") - pl.col("peak")).alias("drawdown"))
+              .select(["run", "date", "pnl", "r_result", "equity", "peak", "drawdown"]))
+
+def _trade_aggs():
+    is_win, is_loss = pl.col("result") == "WIN", pl.col("result") == "LOSS"
+    loss_sum = pl.col("pnl").filter(is_loss).sum()
+    return [
+        pl.len().alias("trades"),
+        is_win.sum().alias("wins"),
+        is_loss.sum().alias("losses"),
+        pl.col("pnl").sum().alias("net_pnl"),
+        pl.col("r_result").sum().alias("net_r"),
+        (is_win.sum() / pl.len() * 100).alias("win_rate"),
+        pl.when(loss_sum != 0).then(pl.col("pnl").filter(is_win).sum() / loss_sum.abs()).otherwise(float("inf")).alias("profit_factor"),
+        pl.col("pnl").mean().alias("expectancy"),
+        pl.col("r_result").mean().alias("expectancy_r"),
+    ]
+
+def sim_metrics(sims, start_cap=10000.0) -> pl.DataFrame:
+    """
+    Pełny zestaw statystyk (jeden wiersz na symulację) w jednym przebiegu group_by: net $ / R, win rate,
+    profit factor, expectancy, max DD w $ i % (względem najwyższego kapitału), serie wygranych / strat (RLE).
+    """
+    with stage("metrics") as s:
+        out = _sim_metrics(sims, start_cap)
+        s.rows = out.height
+    return out
+
+def _sim_metrics(sims, start_cap):
+    curve = equity_curve(sims, start_cap)
+    if curve.is_empty(): return pl.DataFrame()
+    days = _stack(sims).group_by("run").agg(pl.len().alias("days"))
+    trades = _stack(sims).filter(pl.col("result").is_in(TRADED))
+    streaks = (trades.with_columns((~loss_streak_mask(pl.col("pnl"))).alias("is_win"))
+                     .with_columns(pl.col("is_win").rle_id().over("run").alias("_seg"))
+                     .group_by(["run", "_seg"]).agg(pl.col("is_win").first(), pl.len().alias("n"))
+                     .group_by("run").agg(pl.col("n").filter(pl.col("is_win")).max().fill_null(0).alias("max_win_streak"),
+                                          pl.col("n").filter(~pl.col("is_win")).max().fill_null(0).alias("max_loss_streak")))
+    dd = curve.group_by("run").agg(
+        pl.col("drawdown").min().clip(upper_bound=0.0).alias("max_dd"),
+        pl.col("peak").max().alias("_max_eq"),
+    ).with_columns(pl.when(pl.col("_max_eq") > 0).then(dd_pct(pl.col("max_dd"), pl.col("_max_eq"))).otherwise(0.0).alias("max_dd_pct")).drop("_max_eq")
+    return (trades.group_by("run").agg(_trade_aggs())
+                  .join(dd, on="run").join(streaks, on="run").join(days, on="run")
+                  .sort("run"))
+
+def breakdown(sims, by="month", res_df=None) -> pl.DataFrame:
+    """
+    Statystyki transakcji w podziale na miesiąc / dzień tygodnia (1 = pon) / kierunek wybicia.
+    Kierunek pochodzi z res_df (wynik analyze_ib_double_breakout), dołączanego po dacie.
+    """
+    if by not in BREAKDOWNS: raise ValueError(f"Nieznany podział: {by} (dostępne: {', '.join(BREAKDOWNS)})")
+    trades = _stack(sims)
+    if trades.is_empty(): return pl.DataFrame()
+    trades = trades.filter(pl.col("result").is_in(TRADED))
+    if by == "direction":
+        if res_df is None: raise ValueError("Podział po kierunku wymaga res_df")
+        trades = trades.join(res_df.select(["date", "direction"]), on="date", how="left")
+    return trades.group_by(["run", BREAKDOWNS[by].alias(by)]).agg(_trade_aggs()).sort(["run", by])
@@ -0,0 +1,88 @@
+import numpy as np
+import polars as pl
+
+from metrics import dd_pct, loss_streak_mask
+
+# --- MONTE CARLO (permutacje / bootstrap sekwencji transakcji) ---
+# Wszystkie ścieżki naraz jako macierz [ścieżka x transakcja]; liczone w paczkach wierszy,
+# żeby pamięć nie rosła liniowo z n_paths (pasma percentyli z pełnej macierzy float32).
+MC_METHODS = ["bootstrap", "shuffle"]
+MC_BANDS = [5, 25, 50, 75, 95]
+_CHUNK_CELLS = 1_000_000
+
+def _sample(rng, pnl, n_paths, method):
+    n = pnl.size
+    if method == "bootstrap": return pnl[rng.integers(0, n, size=(n_paths, n), dtype=np.int32)]
+    # permutacja = argsort losowych kluczy (szybsze niż rng.permuted wiersz po wierszu)
+    return pnl[np.argsort(rng.random((n_paths, n), dtype=np.float32), axis=1)]
+
+def _max_run(mask):
+    # Najdłuższa seria True w każdym wierszu: licznik narastający minus jego wartość przy ostatnim False
+    c = np.cumsum(mask, axis=1, dtype=np.int16 if mask.shape[1] < np.iinfo(np.int16).max else np.int32)
+    c -= np.maximum.accumulate(np.where(mask, 0, c), axis=1)
+    return c.max(axis=1)
+
+def _bands(equity, pcts):
+    # Percentyle (metoda "nearest") każdej kolumny: sortowanie ciągłej kopii transpozycji jest wielokrotnie
+    # szybsze niż np.percentile(axis=0) na macierzy wierszowej
+    cols = np.sort(np.ascontiguousarray(equity.T), axis=1)
+    k = np.rint(np.asarray(pcts) / 100 * (equity.shape[0] - 1)).astype(np.int64)
+    return cols[:, k].T
+
+def monte_carlo(sim_res, n_paths=50_000, method="bootstrap", start_cap=10000.0, ruin_pct=50.0, seed=None):
+    """
+    Rozkłady dla n_paths losowych sekwencji transakcji z run_simulation (WIN / LOSS / CLOSE):
+    bootstrap = losowanie ze zwracaniem, shuffle = permutacja (ten sam zbiór, inna kolejność).
+    ruin = kapitał spadł do start_cap * (1 - ruin_pct/100) w dowolnym momencie ścieżki.
+    Zwraca (ścieżki: final_pnl, final_r, max_dd, max_dd_pct, max_loss_streak, ruined;
+    pasma percentyli MC_BANDS kapitału po każdej transakcji). Serie strat i DD % jak w metrics.sim_metrics.
+    """
+    if method not in MC_METHODS: raise ValueError(f"Nieznana metoda: {method} (dostępne: {', '.join(MC_METHODS)})")
+    trades = sim_res.filter(pl.col("result").is_in(["WIN", "LOSS", "CLOSE"])) if not sim_res.is_empty() else sim_res
+    if trades.is_empty(): return pl.DataFrame(), pl.DataFrame()
+    pnl = trades["pnl"].to_numpy().astype(np.float32)
+    nz = trades.filter(pl.col("pnl") != 0)
+    r_per_cash = float(nz["r_result"][0] / nz["pnl"][0]) if not nz.is_empty() else 0.0  # pnl = r * stałe ryzyko
+    n = pnl.size
+    rng = np.random.default_rng(seed)
+    ruin_level = start_cap * (1 - ruin_pct / 100)
+
+    equity = np.empty((n_paths, n), dtype=np.float32)
+    max_dd, max_dd_pct, streak, ruined = (np.empty(n_paths, np.float64), np.empty(n_paths, np.float64),
+                                          np.empty(n_paths, np.int32), np.empty(n_paths, bool))
+    step = max(1, _CHUNK_CELLS // n)
+    for a in range(0, n_paths, step):
+        b = min(a + step, n_paths)
+        paths = _sample(rng, pnl, b - a, method)
+        cum = np.cumsum(paths, axis=1, out=equity[a:b])  # wynik narastająco; kapitał = start_cap + cum
+        peak = np.maximum.accumulate(cum, axis=1)
+        np.maximum(peak, 0, out=peak)
+        dd = cum - peak
+        max_dd[a:b] = dd.min(axis=1)
+        max_dd_pct[a:b] = dd_pct(max_dd[a:b], start_cap + peak[:, -1].astype(np.float64))
+        streak[a:b] = _max_run(loss_streak_mask(paths))
+        ruined[a:b] = cum.min(axis=1) <= ruin_level - start_cap
+
+    final = equity[:, -1].astype(np.float64)
+    paths_df = pl.DataFrame({
+        "final_pnl": final,
+        "final_r": final * r_per_cash,
+        "max_dd": max_dd,
+        "max_dd_pct": max_dd_pct,
+        "max_loss_streak": streak,
+        "ruined": ruined,
+    })
+    bands = _bands(equity, MC_BANDS) + start_cap
+    bands_df = pl.DataFrame({"trade": np.arange(1, n + 1), **{f"p{p}": bands[i] for i, p in enumerate(MC_BANDS)}})
+    return paths_df, bands_df
+
+def mc_summary(paths_df, quantiles=(0.05, 0.5, 0.95)) -> pl.DataFrame:
+    """
+    Kwantyle rozkładów ścieżek + ryzyko ruiny (odsetek ścieżek z ruined).
+    """
+    if paths_df.is_empty(): return pl.DataFrame()
+    cols = ["final_pnl", "final_r", "max_dd", "max_dd_pct", "max_loss_streak"]
+    return pl.concat([
+        paths_df.select([pl.col(c).cast(pl.Float64).quantile(q).alias(c) for c in cols]).with_columns(pl.lit(f"p{int(q * 100)}").alias("stat"))
+        for q in quantiles
+    ]).select(["stat"] + cols).with_columns(pl.lit(paths_df["ruined"].mean() * 100).alias("risk_of_ruin_pct"))
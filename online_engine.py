@@ -0,0 +1,320 @@
+from datetime import date, timedelta
+
+import numpy as np
+import polars as pl
+
+from analysis_ib_double_breakout import (SIM_OUTCOMES, SIM_INVALID_NO_TRIGGER, SIM_NO_TRIGGER, SIM_INVALID, SIM_NO_TIME, SIM_MISSED,
+                                         SIM_CLOSE_ON_ENTRY, SIM_WIN, SIM_LOSS, SIM_CLOSE)
+from session_calendar import NY_TZ, local_to_utc, session_calendar
+
+# --- SILNIK ONLINE (bar po barze, paper trading) ---
+# Te same reguły co _analyze_single_day + run_simulation, ale stan dnia (IB, wybicie, powroty, maszyna
+# trigger -> entry -> SL/TP) jest aktualizowany przy każdym barze i nic nie jest liczone wstecz.
+# Bary muszą przychodzić posortowane po czasie (jak z giełdy), z unikalnymi znacznikami czasu.
+# on_bar() (strumień na żywo) to maszyna stanów na skalarach: granice dnia z cache, porównania float, O(1)
+# na bar. on_bars() przyjmuje paczkę barów i przeskakuje w obrębie fazy do pierwszego baru, który zmienia
+# stan (NumPy) - wynik jest identyczny jak przy podawaniu barów pojedynczo.
+# Dzień jest zamykany, gdy przychodzi bar następnego dnia (albo flush()): dopiero wtedy wiadomo, czy miał
+# >= 10 barów, więc rekord analizy i transakcja dnia są emitowane przy zamknięciu, jak w trybie wsadowym.
+_EPOCH = date(1970, 1, 1)
+_CAL_BLOCK = 128  # dni kalendarza sesji liczone naraz (granice UTC dla kolejnych dni są już w cache)
+_TARGETS = ["dbl", "mid", "line"]
+_TRIG, _ENTRY, _TRADE, _DONE = range(4)
+
+def _first(mask):
+    # indeks pierwszego True albo -1
+    return int(mask.argmax()) if mask.any() else -1
+
+class _Sim:
+    # Maszyna stanów symulatora dla jednego kierunku; ceny w przestrzeni lustrzanej (DOWN * -1) jak w _simulate_arrays
+    __slots__ = ("phase", "trig", "inv", "entry", "tp", "sl", "risk", "inv_ts", "trig_ts", "entry_ts", "entry_close",
+                 "after_seen", "trade_seen", "code")
+
+    def __init__(self, base, inv, rng, p):
+        self.trig = base + (rng * (p["trigger_pct"] / 100))
+        self.entry = base + (rng * (p["entry_pct"] / 100))
+        self.tp = base + (rng * (p["tp_pct"] / 100))
+        self.sl = self.entry - (rng * (p["sl_dist_pct"] / 100)) if p["is_trend"] else self.entry + (rng * (p["sl_dist_pct"] / 100))
+        self.risk = abs(self.entry - self.sl) or 1.0
+        self.inv = inv
+        self.phase, self.inv_ts, self.trig_ts, self.entry_ts, self.entry_close = _TRIG, None, None, None, None
+        self.after_seen, self.trade_seen, self.code = False, False, None
+
+    def advance(self, t, hh, ll, cc, is_trend):
+        i, n = 0, t.size
+        while i < n and self.phase != _DONE:
+            if self.phase == _TRIG:
+                k = _first(hh[i:] >= self.trig)
+                if self.inv_ts is None:
+                    j = _first(ll[i:] < self.inv)
+                    if j >= 0: self.inv_ts = t[i + j]
+                if k < 0: return
+                self.trig_ts = t[i + k]
+                if self.inv_ts is not None and self.inv_ts < self.trig_ts:
+                    self.phase, self.code = _DONE, SIM_INVALID
+                    return
+                self.phase, i = _ENTRY, i + k + 1
+            elif self.phase == _ENTRY:
+                self.after_seen = True
+                k = _first(ll[i:] <= self.entry)
+                if k < 0: return
+                self.entry_ts, self.entry_close = t[i + k], cc[i + k]
+                self.phase, i = _TRADE, i + k + 1
+            else:
+                self.trade_seen = True
+                sl_hit = ll[i:] <= self.sl if is_trend else hh[i:] >= self.sl
+                tp_hit = hh[i:] >= self.tp if is_trend else ll[i:] <= self.tp
+                k = _first(sl_hit | tp_hit)
+                if k < 0: return
+                self.phase, self.code = _DONE, SIM_LOSS if sl_hit[k] else SIM_WIN  # ta sama świeca SL i TP -> LOSS
+
+    def step(self, t, hh, ll, cc, is_trend):
+        # Jeden bar (skalary) - te same przejścia co advance()
+        phase = self.phase
+        if phase == _DONE: return
+        if phase == _TRIG:
+            if self.inv_ts is None and ll < self.inv: self.inv_ts = t
+            if hh < self.trig: return
+            self.trig_ts = t
+            if self.inv_ts is not None and self.inv_ts < t: self.phase, self.code = _DONE, SIM_INVALID
+            else: self.phase = _ENTRY
+        elif phase == _ENTRY:
+            self.after_seen = True
+            if ll <= self.entry: self.phase, self.entry_ts, self.entry_close = _TRADE, t, cc
+        else:
+            self.trade_seen = True
+            if (ll <= self.sl) if is_trend else (hh >= self.sl): self.phase, self.code = _DONE, SIM_LOSS
+            elif (hh >= self.tp) if is_trend else (ll <= self.tp): self.phase, self.code = _DONE, SIM_WIN
+
+    def result(self, last_close, is_trend):
+        # (kod SIM_OUTCOMES, wynik w R) na koniec dnia
+        code = self.code
+        if code is None:
+            if self.phase == _TRIG: code = SIM_INVALID_NO_TRIGGER if self.inv_ts is not None else SIM_NO_TRIGGER
+            elif self.phase == _ENTRY: code = SIM_MISSED if self.after_seen else SIM_NO_TIME
+            else: code = SIM_CLOSE if self.trade_seen else SIM_CLOSE_ON_ENTRY
+        exit_price = {SIM_CLOSE_ON_ENTRY: self.entry_close, SIM_CLOSE: last_close, SIM_LOSS: self.sl, SIM_WIN: self.tp}.get(code, self.entry)
+        pnl_pts = exit_price - self.entry if is_trend else self.entry - exit_price
+        return code, pnl_pts / self.risk
+
+class _Day:
+    __slots__ = ("date", "ib_s", "ib_e", "dl", "sdl", "n", "ib_h", "ib_l", "has_ib", "has_after", "direction", "brk_ts",
+                 "ext", "ret_ts", "dist", "sims", "sim_bars", "last_close", "levels")
+
+    def __init__(self, d, bounds):
+        self.date = d
+        self.ib_s, self.ib_e, self.dl, self.sdl = bounds
+        self.n, self.ib_h, self.ib_l, self.has_ib, self.has_after = 0, -np.inf, np.inf, False, False
+        self.direction, self.brk_ts, self.ext = None, None, -np.inf
+        self.ret_ts, self.dist = {}, {}
+        self.sims, self.sim_bars, self.last_close, self.levels = None, False, {}, None
+
+class IBBreakoutEngine:
+    """
+    Analiza IB (jak analyze_ib_double_breakout) i opcjonalnie symulacja (jak run_simulation) liczone przyrostowo.
+    sim: słownik parametrów run_simulation (trigger_pct, entry_pct, tp_pct, sl_dist_pct, deadline, strategy_mode,
+    risk_model, risk_value) albo None. on_day(rekord, transakcja) jest wołane przy zamknięciu każdego dnia z wynikiem.
+    """
+    def __init__(self, ib_start, ib_end, return_deadline, breakout_direction="BOTH", breakout_type="wick", is_overnight=False,
+                 start_date=None, end_date=None, sim=None, on_day=None):
+        self.ib_start, self.ib_end, self.return_deadline = ib_start, ib_end, return_deadline
+        self.breakout_direction, self.is_overnight = breakout_direction, is_overnight
+        self.wick = breakout_type == "wick"
+        self.start_date, self.end_date = start_date, end_date
+        self.sim = None
+        if sim is not None:
+            self.sim = {**sim, "is_trend": sim.get("strategy_mode", "TREND") == "TREND"}
+            self.sim["deadline"] = sim.get("deadline") or return_deadline
+            self.risk_cash = sim.get("risk_value", 100.0) if sim.get("risk_model", "FIXED") == "FIXED" else 100.0
+        self.on_day = on_day
+        self.records, self.trade_rows = [], []
+        self._day, self._day_num = None, None
+        self._cal_first, self._cal = None, None
+        self._ib_start_us = (ib_start.hour * 3600 + ib_start.minute * 60 + ib_start.second) * 1_000_000 + ib_start.microsecond
+        self._hour, self._offset = None, 0  # offset NY-UTC (µs) dla godziny UTC ostatniego baru z on_bar
+
+    # --- kalendarz: granice dnia w µs UTC, liczone blokami dni ---
+    def _bounds(self, d):
+        if self._cal is None or not (0 <= (d - self._cal_first).days < _CAL_BLOCK):
+            days = pl.date_range(d, d + timedelta(days=_CAL_BLOCK - 1), "1d", eager=True)
+            cal = session_calendar(days, self.ib_start, self.ib_end, self.return_deadline, self.is_overnight)
+            cols = [cal["ib_start_utc"], cal["ib_end_utc"], cal["deadline_utc"],
+                    local_to_utc(days, self.sim["deadline"]) if self.sim else cal["deadline_utc"]]
+            self._cal_first, self._cal = d, np.stack([c.dt.cast_time_unit("us").cast(pl.Int64).to_numpy() for c in cols], axis=1)
+        return tuple(int(v) for v in self._cal[(d - self._cal_first).days])
+
+    def _dates(self, ts):
+        # Data handlowa jak w _prepare_lazyframe: data NY, +1 dzień od ib_start w sesji overnight (dni od epoki)
+        wall = pl.Series(ts).cast(pl.Datetime("us")).dt.replace_time_zone("UTC").dt.convert_time_zone(NY_TZ).dt.replace_time_zone(None)
+        return self._wall_days(wall.cast(pl.Int64).to_numpy())
+
+    def _wall_days(self, wall):
+        days = wall // 86_400_000_000
+        return days + (wall % 86_400_000_000 >= self._ib_start_us) if self.is_overnight else days
+
+    # --- wejście ---
+    def on_bar(self, ts, high, low, close):
+        """
+        Jeden bar: ts = µs od epoki (UTC) albo datetime ze strefą. Offset NY liczony raz na godzinę UTC
+        (zmiany czasu w NY wypadają o pełnej godzinie UTC), a stan dnia aktualizowany porównaniami skalarów
+        z granicami dnia z cache (_step) - bez tablic NumPy.
+        """
+        ts = int(ts) if isinstance(ts, (int, np.integer)) else int(pl.Series([ts]).dt.cast_time_unit("us").cast(pl.Int64)[0])
+        if ts // 3_600_000_000 != self._hour:
+            self._hour, self._offset = ts // 3_600_000_000, int(self._dates_offset(ts))
+        wall = ts + self._offset
+        day_num = wall // 86_400_000_000 + (self.is_overnight and wall % 86_400_000_000 >= self._ib_start_us)
+        if self._day is None or day_num != self._day_num: self._start_day(day_num)
+        self._step(self._day, ts, float(high), float(low), float(close))
+
+    def _dates_offset(self, ts):
+        wall = pl.Series([ts]).cast(pl.Datetime("us")).dt.replace_time_zone("UTC").dt.convert_time_zone(NY_TZ).dt.replace_time_zone(None)
+        return wall.cast(pl.Int64)[0] - ts
+
+    def on_bars(self, ts, high, low, close):
+        """
+        Paczka barów (tablice NumPy, ts w µs UTC, rosnąco) - dzielona na dni i przetwarzana fazami.
+        """
+        if ts.size: self._feed(self._dates(ts), ts, high, low, close)
+
+    def _feed(self, days, ts, high, low, close):
+        cuts = np.flatnonzero(days[1:] != days[:-1]) + 1
+        for a, b in zip(np.r_[0, cuts], np.r_[cuts, ts.size]):
+            if self._day is None or int(days[a]) != self._day_num: self._start_day(int(days[a]))
+            self._advance(self._day, ts[a:b], high[a:b], low[a:b], close[a:b])
+
+    def _start_day(self, day_num):
+        self._close_day()
+        d = _EPOCH + timedelta(days=day_num)
+        self._day, self._day_num = _Day(d, self._bounds(d)), day_num
+
+    def flush(self):
+        # Koniec strumienia: zamknięcie bieżącego dnia
+        self._close_day()
+        self._day, self._day_num = None, None
+
+    def _step(self, day, t, h, l, c):
+        # Jeden bar, ta sama logika co _advance dla paczki jednoelementowej
+        day.n += 1
+        if t < day.ib_e:
+            if t >= day.ib_s:
+                if h > day.ib_h: day.ib_h = h
+                if l < day.ib_l: day.ib_l = l
+                day.has_ib = True
+            return
+        if not day.has_ib: return
+        if t <= day.dl:
+            day.has_after = True
+            if day.direction is None:
+                up = (h if self.wick else c) > day.ib_h
+                if up or (l if self.wick else c) < day.ib_l:
+                    day.direction, day.brk_ts = ("UP" if up else "DOWN"), t
+                    if day.sims: day.sims = {day.direction: day.sims[day.direction]}
+            elif t > day.brk_ts:
+                hh, ll = (h, l) if day.direction == "UP" else (-l, -h)
+                if len(day.ret_ts) < len(_TARGETS):
+                    for name, level in self._levels(day).items():
+                        if name not in day.ret_ts and ll <= level:
+                            day.ret_ts[name] = t
+                            day.dist[name] = max(day.ext, hh)
+                if hh > day.ext: day.ext = hh
+        if self.sim is not None and t <= day.sdl:
+            p = self.sim
+            if day.sims is None:
+                rng, dirs = day.ib_h - day.ib_l, [day.direction] if day.direction else ["UP", "DOWN"]
+                day.sims = {d: _Sim(day.ib_h if d == "UP" else -day.ib_l, day.ib_l if d == "UP" else -day.ib_h, rng, p) for d in dirs}
+            day.sim_bars = True
+            for d, sim in day.sims.items():
+                if d == "UP": hh, ll, cc = h, l, c
+                else: hh, ll, cc = -l, -h, -c
+                day.last_close[d] = cc
+                sim.step(t, hh, ll, cc, p["is_trend"])
+
+    def _advance(self, day, t, h, l, c):
+        day.n += t.size
+        # IB [ib_start, ib_end)
+        i0, a = np.searchsorted(t, day.ib_s), np.searchsorted(t, day.ib_e)
+        if a > i0:
+            day.ib_h, day.ib_l, day.has_ib = max(day.ib_h, h[i0:a].max()), min(day.ib_l, l[i0:a].min()), True
+        if a == t.size or not day.has_ib: return  # IB jeszcze otwarte (albo dzień bez IB - nie trafi do wyników)
+        b = np.searchsorted(t, day.dl, side="right")
+        day.has_after |= b > a
+        if day.direction is None and b > a:
+            up = (h[a:b] if self.wick else c[a:b]) > day.ib_h
+            k = _first(up | ((l[a:b] if self.wick else c[a:b]) < day.ib_l))
+            if k >= 0:
+                day.direction, day.brk_ts = ("UP" if up[k] else "DOWN"), t[a + k]
+                if day.sims: day.sims = {day.direction: day.sims[day.direction]}  # druga hipoteza nie jest już potrzebna
+        if day.direction is not None: self._targets(day, t, h, l, max(a, np.searchsorted(t, day.brk_ts, side="right")), b)
+        if self.sim is not None: self._simulate(day, t, h, l, c, a, np.searchsorted(t, day.sdl, side="right"))
+
+    def _targets(self, day, t, h, l, s, b):
+        # Powroty do poziomów po wybiciu (ts > brk_ts, <= deadline) i ekstremum do powrotu, w przestrzeni lustrzanej
+        if b <= s: return
+        up = day.direction == "UP"
+        hh, ll = (h[s:b], l[s:b]) if up else (-l[s:b], -h[s:b])
+        run = np.maximum.accumulate(hh)
+        for name, level in self._levels(day).items():
+            if name in day.ret_ts: continue
+            k = _first(ll <= level)
+            if k < 0: continue
+            day.ret_ts[name] = int(t[s + k])
+            day.dist[name] = max(day.ext, run[k])
+        day.ext = max(day.ext, run[-1])
+
+    def _levels(self, day):
+        # Po wybiciu IB jest już zamknięte, więc poziomy liczone są raz na dzień
+        if day.levels is None:
+            hi, lo = day.ib_h, day.ib_l
+            if day.direction == "UP": day.levels = {"dbl": lo, "mid": lo + (hi - lo) / 2, "line": hi}
+            else: day.levels = {"dbl": -hi, "mid": -(lo + (hi - lo) / 2), "line": -lo}
+        return day.levels
+
+    def _simulate(self, day, t, h, l, c, a, sb):
+        if sb <= a: return
+        p = self.sim
+        if day.sims is None:
+            # przed wybiciem kierunek nie jest znany - obie hipotezy liczone równolegle od końca IB
+            rng, dirs = day.ib_h - day.ib_l, [day.direction] if day.direction else ["UP", "DOWN"]
+            day.sims = {d: _Sim(day.ib_h if d == "UP" else -day.ib_l, day.ib_l if d == "UP" else -day.ib_h, rng, p) for d in dirs}
+        day.sim_bars = True
+        for d, sim in day.sims.items():
+            if d == "UP": hh, ll, cc = h[a:sb], l[a:sb], c[a:sb]
+            else: hh, ll, cc = -l[a:sb], -h[a:sb], -c[a:sb]
+            day.last_close[d] = cc[-1]
+            sim.advance(t[a:sb], hh, ll, cc, p["is_trend"])
+
+    def _close_day(self):
+        day = self._day
+        if day is None or day.n < 10 or not (day.has_ib and day.has_after) or day.direction is None: return
+        if (self.start_date and day.date < self.start_date) or (self.end_date and day.date > self.end_date): return
+        if self.breakout_direction != "BOTH" and day.direction != self.breakout_direction: return
+        up = day.direction == "UP"
+        ib_range = day.ib_h - day.ib_l
+        base = day.ib_h if up else -day.ib_l
+        rec = {"date": day.date, "direction": day.direction, "ib_range": ib_range, "ib_high": day.ib_h, "ib_low": day.ib_l,
+               "ib_mid": day.ib_l + ib_range / 2, "ib_start_utc": day.ib_s, "ib_end_utc": day.ib_e, "brk_ts": day.brk_ts}
+        for name in _TARGETS:
+            dist = max(day.dist.get(name, day.ext) - base, 0.0)
+            ret_ts = day.ret_ts.get(name)
+            rec.update({f"ret_{name}": ret_ts is not None, f"dist_{name}": dist,
+                        f"dist_pct_{name}": dist / ib_range * 100 if ib_range > 0 else 0.0,
+                        f"time_{name}": (ret_ts - day.ib_e) // 60_000_000 if ret_ts is not None else None})
+        self.records.append(rec)
+        trade = None
+        if self.sim is not None and day.sim_bars:
+            code, r = day.sims[day.direction].result(day.last_close[day.direction], self.sim["is_trend"])
+            trade = {"date": day.date, "result": SIM_OUTCOMES[code][0], "pnl": r * self.risk_cash, "r_result": r, "comment": SIM_OUTCOMES[code][1]}
+            self.trade_rows.append(trade)
+        if self.on_day: self.on_day(rec, trade)
+
+    # --- wyniki w układzie trybu wsadowego ---
+    def results(self) -> pl.DataFrame:
+        if not self.records: return pl.DataFrame()
+        df = pl.DataFrame(self.records, infer_schema_length=None)
+        utc = lambda c: pl.from_epoch(pl.col(c), time_unit="us").dt.replace_time_zone("UTC")
+        return df.with_columns(utc("ib_start_utc"), utc("ib_end_utc"), utc("brk_ts"), *[pl.col(f"time_{k}").cast(pl.Int64) for k in _TARGETS])
+
+    def trades(self) -> pl.DataFrame:
+        if not self.trade_rows: return pl.DataFrame()
+        return pl.DataFrame(self.trade_rows, schema={"date": pl.Date, "result": pl.String, "pnl": pl.Float64, "r_result": pl.Float64, "comment": pl.String})
@@ -0,0 +1,218 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+
+import polars as pl
+
+# --- PROFILOWANIE ETAPÓW (czas, wiersze, szczyt alokacji) ---
+# Wyłączone = stage() zwraca wspólny pusty obiekt (jedno odczytanie ContextVar na etap, bez pomiarów).
+# Aktywny profiler jest w ContextVar, więc każda sesja / wątek Streamlit ma swój; ChartCache.prefetch
+# przenosi kontekst do wątku w tle. Alokacje: tracemalloc widzi obiekty Pythona i bufory NumPy, ale nie
+# pamięć Polars (Rust) - tę pokazuje przyrost szczytowego RSS procesu (tam, gdzie jest moduł resource).
+# tracemalloc jest globalny dla procesu: uruchamia go pierwszy profiler, który mierzy pamięć, a zatrzymuje
+# zamknięcie ostatniego (close() / odśmiecenie). Szczyt jest zerowany tylko wtedy, gdy w innych wątkach
+# nie trwa żaden etap - etap, który nałożył się w czasie z etapem innego wątku (druga sesja, prefetch
+# wykresów), ma alloc_mb = None, bo jego szczyt zawierałby cudze alokacje.
+_ACTIVE = contextvars.ContextVar("profiler", default=None)
+_TRACE_LOCK = threading.Lock()
+_TRACE_OWNERS = set()  # profilery (tokeny) korzystające z tracemalloc
+_OWN_TRACE = False     # tracemalloc uruchomiony przez Profiler (zatrzymywany po zamknięciu ostatniego)
+_OPEN_SPANS = set()    # trwające etapy z pomiarem pamięci, wszystkie wątki
+
+def _acquire_trace(token):
+    global _OWN_TRACE
+    with _TRACE_LOCK:
+        _TRACE_OWNERS.add(token)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _OWN_TRACE = True
+
+def _release_trace(token):
+    global _OWN_TRACE
+    with _TRACE_LOCK:
+        _TRACE_OWNERS.discard(token)
+        if not _TRACE_OWNERS and _OWN_TRACE:
+            tracemalloc.stop()
+            _OWN_TRACE = False
+
+def _max_rss():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)  # Linux: KiB
+    except ImportError:
+        return None
+
+class _NullSpan:
+    rows = None
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def __setattr__(self, name, value): pass  # s.rows = ... bez efektu, gdy profilowanie wyłączone
+
+_NULL = _NullSpan()
+
+class _Span:
+    __slots__ = ("prof", "name", "rows", "args", "t0", "rss0", "base", "peak", "thread", "shared")
+
+    def __init__(self, prof, name, rows, args):
+        self.prof, self.name, self.rows, self.args = prof, name, rows, args
+
+    def __enter__(self):
+        self.prof._push(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.prof._pop(self, time.perf_counter())
+        return False
+
+class Profiler:
+    """
+    Zbiera zdarzenia etapów: nazwa, start / czas trwania, wiersze, szczyt alokacji (tracemalloc, względem
+    stanu na starcie etapu) i przyrost szczytowego RSS. Etapy mogą być zagnieżdżone (np. analysis > analysis.window).
+    close() zwalnia tracemalloc (ostatni zamknięty profiler go zatrzymuje).
+    """
+    def __init__(self, trace_memory=True, max_events=20_000):
+        self.trace_memory = trace_memory
+        self.max_events = max_events
+        self.events = []
+        self.days = pl.DataFrame()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._token = object()
+        self._traced = False
+        weakref.finalize(self, _release_trace, self._token)
+
+    def close(self):
+        if self._traced: _release_trace(self._token)
+        self._traced = False
+
+    def stage(self, name, rows=None, **args):
+        return _Span(self, name, rows, args)
+
+    def _push(self, span):
+        stack = self._local.__dict__.setdefault("stack", [])
+        if self.trace_memory:
+            if not self._traced or not tracemalloc.is_tracing():
+                _acquire_trace(self._token)
+                self._traced = True
+            span.thread, span.shared = threading.get_ident(), False
+            with _TRACE_LOCK:
+                if any(o.thread != span.thread for o in _OPEN_SPANS):
+                    span.shared = True
+                    for o in _OPEN_SPANS: o.shared = True
+                current, peak = tracemalloc.get_traced_memory()
+                if not span.shared:
+                    if stack: stack[-1].peak = max(stack[-1].peak, peak)  # szczyt rodzica sprzed resetu
+                    tracemalloc.reset_peak()
+                span.base, span.peak = current, current
+                _OPEN_SPANS.add(span)
+        span.rss0 = _max_rss()
+        stack.append(span)
+
+    def _pop(self, span, t1):
+        stack = self._local.stack
+        stack.pop()
+        alloc = None
+        if self.trace_memory:
+            with _TRACE_LOCK:
+                _OPEN_SPANS.discard(span)
+                if not span.shared and tracemalloc.is_tracing():
+                    span.peak = max(span.peak, tracemalloc.get_traced_memory()[1])
+                    alloc = (span.peak - span.base) / 2**20
+                    if stack: stack[-1].peak = max(stack[-1].peak, span.peak)
+        rss1 = _max_rss()
+        event = {
+            "name": span.name,
+            "start": span.t0 - self._t0,
+            "seconds": t1 - span.t0,
+            "rows": span.rows,
+            "alloc_mb": alloc,
+            "rss_peak_mb": (rss1 - span.rss0) / 2**20 if rss1 is not None and span.rss0 is not None else None,
+            "depth": len(stack),
+            "thread": threading.get_ident(),
+            **({"args": span.args} if span.args else {}),
+        }
+        with self._lock:
+            self.events.append(event)
+            if len(self.events) > self.max_events: del self.events[:len(self.events) - self.max_events]
+
+    def record_days(self, dates, rows):
+        """
+        Wiersze przetworzone per dzień w analizie kolumnowej (wszystkie dni liczone są jednym zapytaniem,
+        więc koszt dnia to jego udział w wierszach etapu).
+        """
+        self.days = pl.DataFrame({"date": dates, "rows": rows})
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+            self.days = pl.DataFrame()
+            self._t0 = time.perf_counter()
+
+    def frame(self) -> pl.DataFrame:
+        if not self.events: return pl.DataFrame()
+        return pl.DataFrame([{k: v for k, v in e.items() if k != "args"} for e in self.events], infer_schema_length=None)
+
+    def summary(self) -> pl.DataFrame:
+        """
+        Jeden wiersz na etap: wywołania, czas łączny / ostatni / maks., wiersze i szczyt pamięci ostatniego wywołania.
+        """
+        df = self.frame()
+        if df.is_empty(): return df
+        # kolejność wg startu etapu (zdarzenie zapisywane jest na końcu, więc podetapy byłyby przed rodzicem)
+        return (df.group_by("name")
+                  .agg(pl.len().alias("calls"), pl.col("seconds").sum().alias("total_s"), pl.col("seconds").last().alias("last_s"),
+                       pl.col("seconds").max().alias("max_s"), pl.col("rows").last(), pl.col("alloc_mb").last(), pl.col("rss_peak_mb").last(),
+                       pl.col("depth").min(), pl.col("start").min().alias("_first"))
+                  .sort("_first").drop("_first"))
+
+    def slowest_days(self, n=10, stage="analysis") -> pl.DataFrame:
+        """
+        Dni o największym koszcie w ostatnim przebiegu analizy: wiersze i szacowany czas (udział w czasie etapu).
+        """
+        if self.days.is_empty(): return pl.DataFrame()
+        last = [e for e in self.events if e["name"] == stage]
+        seconds = last[-1]["seconds"] if last else 0.0
+        total = max(int(self.days["rows"].sum()), 1)
+        return self.days.with_columns((pl.col("rows") / total * seconds * 1000).alias("est_ms")).sort("rows", descending=True).head(n)
+
+    def to_json(self) -> str:
+        return json.dumps({"events": self.events, "days": self.days.with_columns(pl.col("date").cast(pl.String)).to_dicts() if not self.days.is_empty() else []},
+                          default=str, indent=1)
+
+    def to_chrome_trace(self) -> str:
+        """
+        Format Trace Event (chrome://tracing, Perfetto): zdarzenia "X" z czasem w µs.
+        """
+        pid = os.getpid()
+        trace = [{"name": e["name"], "ph": "X", "ts": e["start"] * 1e6, "dur": e["seconds"] * 1e6, "pid": pid, "tid": e["thread"],
+                  "args": {"rows": e["rows"], "alloc_mb": e["alloc_mb"], "rss_peak_mb": e["rss_peak_mb"], **e.get("args", {})}}
+                 for e in self.events]
+        return json.dumps({"traceEvents": trace, "displayTimeUnit": "ms"}, default=str)
+
+def activate(profiler):
+    """
+    Ustawia aktywny profiler w bieżącym kontekście (None = wyłączone). tracemalloc nie jest tu zatrzymywany -
+    może go używać profiler innej sesji; zwalnia go Profiler.close().
+    """
+    _ACTIVE.set(profiler)
+
+def active():
+    return _ACTIVE.get()
+
+def stage(name, rows=None, **args):
+    """
+    with stage("prepare") as s: ...; s.rows = n - pomiar etapu, gdy profiler jest aktywny.
+    """
+    prof = _ACTIVE.get()
+    return _NULL if prof is None else prof.stage(name, rows, **args)
+
+def record_days(dates, rows):
+    prof = _ACTIVE.get()
+    if prof is not None: prof.record_days(dates, rows)
@@ -0,0 +1,96 @@
+"""
+Odtwarzanie historii przez silnik online (online_engine) - lokalny feed w procesie zamiast feedu na żywo.
+
+    python replay.py data.parquet --ib 09:30 10:30 --deadline 16:00 --sim 30 25 100 25 --check
+
+--check porównuje wyniki dzienne i dziennik transakcji z analyze_ib_double_breakout + run_simulation,
+--bar-by-bar podaje bary pojedynczo (on_bar, jak feed na żywo) zamiast paczkami.
+"""
+import argparse
+import sys
+import time as _time
+from datetime import datetime
+
+from analysis_ib_double_breakout import analyze_ib_double_breakout, run_simulation, scan_bars
+from day_index import to_us
+from online_engine import IBBreakoutEngine
+
+def bar_feed(source, ib_start, is_overnight, start_date=None, end_date=None, chunk_rows=65_536):
+    """
+    Paczki (ts µs UTC, high, low, close) z pliku / zbioru parquet, w kolejności czasu. Zakres barów jak w trybie
+    wsadowym (scan_bars), dane wczytywane z góry, więc pomiar przepustowości obejmuje tylko silnik.
+    """
+    df = scan_bars(source, ib_start, is_overnight, start_date, end_date).select("ts_utc", "high", "low", "close").collect()
+    ts = to_us(df["ts_utc"])
+    high, low, close = (df[c].to_numpy() for c in ["high", "low", "close"])
+    return [(ts[i:i + chunk_rows], high[i:i + chunk_rows], low[i:i + chunk_rows], close[i:i + chunk_rows]) for i in range(0, ts.size, chunk_rows)]
+
+def replay(source, ib_start, ib_end, return_deadline, breakout_direction="BOTH", breakout_type="wick", is_overnight=False,
+           start_date=None, end_date=None, sim=None, chunk_rows=65_536, bar_by_bar=False):
+    """
+    Zwraca (wyniki dzienne, transakcje, statystyki: bary, sekundy, bary/s).
+    """
+    feed = bar_feed(source, ib_start, is_overnight, start_date, end_date, chunk_rows)
+    engine = IBBreakoutEngine(ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight, start_date, end_date, sim)
+    n = sum(chunk[0].size for chunk in feed)
+    t0 = _time.perf_counter()
+    for ts, high, low, close in feed:
+        if bar_by_bar:
+            for bar in zip(ts.tolist(), high.tolist(), low.tolist(), close.tolist()): engine.on_bar(*bar)
+        else:
+            engine.on_bars(ts, high, low, close)
+    engine.flush()
+    seconds = _time.perf_counter() - t0
+    return engine.results(), engine.trades(), {"bars": n, "seconds": seconds, "bars_per_s": n / seconds if seconds > 0 else float("inf")}
+
+def check(res, trades, source, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight, start_date, end_date, sim):
+    """
+    Porównanie z trybem wsadowym; zwraca listę rozbieżności (pusta = identycznie).
+    """
+    batch_res, df_all = analyze_ib_double_breakout(source, ib_start, ib_end, return_deadline, breakout_direction, breakout_type,
+                                                   is_overnight, start_date, end_date)
+    problems = [] if res.equals(batch_res) else [f"wyniki dzienne: online {res.height} wierszy, wsadowo {batch_res.height}"]
+    if sim is not None:
+        batch_trades = run_simulation(df_all, batch_res, sim["trigger_pct"], sim["entry_pct"], sim["tp_pct"], sim["sl_dist_pct"],
+                                      sim.get("deadline") or return_deadline, sim.get("risk_model", "FIXED"), sim.get("risk_value", 100.0),
+                                      sim.get("strategy_mode", "TREND"))
+        if not trades.equals(batch_trades): problems.append(f"transakcje: online {trades.height} wierszy, wsadowo {batch_trades.height}")
+    return problems
+
+def main(argv=None):
+    hm = lambda v: datetime.strptime(v, "%H:%M").time()
+    ymd = lambda v: datetime.strptime(v, "%Y-%m-%d").date()
+    ap = argparse.ArgumentParser(description="Replay danych przez silnik online IB (paper trading)")
+    ap.add_argument("source", help="plik parquet albo katalog partycjonowany year=/month=")
+    ap.add_argument("--ib", nargs=2, type=hm, default=[hm("09:30"), hm("10:30")], metavar=("START", "KONIEC"))
+    ap.add_argument("--deadline", type=hm, default=hm("16:00"))
+    ap.add_argument("--direction", choices=["UP", "DOWN", "BOTH"], default="BOTH")
+    ap.add_argument("--breakout-type", choices=["wick", "close"], default="wick")
+    ap.add_argument("--overnight", action="store_true", default=None, help="domyślnie: gdy start IB > koniec IB")
+    ap.add_argument("--from", dest="start_date", type=ymd)
+    ap.add_argument("--to", dest="end_date", type=ymd)
+    ap.add_argument("--sim", nargs=4, type=float, metavar=("TRIGGER", "ENTRY", "TP", "SL"), help="parametry symulacji w %% zakresu IB")
+    ap.add_argument("--mode", choices=["TREND", "FADE"], default="TREND")
+    ap.add_argument("--sim-deadline", type=hm)
+    ap.add_argument("--chunk", type=int, default=65_536, help="barów w paczce feedu")
+    ap.add_argument("--bar-by-bar", action="store_true", help="bary pojedynczo przez on_bar")
+    ap.add_argument("--check", action="store_true", help="porównaj z trybem wsadowym")
+    args = ap.parse_args(argv)
+
+    ib_start, ib_end = args.ib
+    is_overnight = args.overnight if args.overnight is not None else ib_start > ib_end
+    sim = None
+    if args.sim:
+        sim = dict(zip(["trigger_pct", "entry_pct", "tp_pct", "sl_dist_pct"], args.sim), strategy_mode=args.mode, deadline=args.sim_deadline)
+    params = (args.source, ib_start, ib_end, args.deadline, args.direction, args.breakout_type, is_overnight, args.start_date, args.end_date)
+    res, trades, stats = replay(*params, sim=sim, chunk_rows=args.chunk, bar_by_bar=args.bar_by_bar)
+    print(f"{stats['bars']:,} barów w {stats['seconds']:.3f} s ({stats['bars_per_s'] / 1e6:.2f} mln barów/s): "
+          f"{res.height} dni z wybiciem, {trades.height} dni symulacji")
+    if not args.check: return 0
+    problems = check(res, trades, *params, sim)
+    for p in problems: print(f"❌ {p}", file=sys.stderr)
+    if not problems: print("✅ identycznie jak tryb wsadowy")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import tempfile
+from datetime import date, timedelta
+
+import polars as pl
+
+from analysis_ib_double_breakout import _analyze_columnar, scan_bars
+from dataset import _PART_RE, _partitions, is_dataset
+from day_index import build_day_index
+
+# --- MAGAZYN WYNIKÓW (analiza przyrostowa) ---
+STORE_DIR = os.environ.get("MNQ_RESULTS_DIR", os.path.join(".cache", "results"))
+STORE_VERSION = 3  # zmiana kolumn wyników / odcisków dni (2: brk_ts, 3: digest) = nowy klucz, stare pliki nie są scalane z nowymi
+
+def _store_key(path, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight):
+    raw = "|".join([str(STORE_VERSION), os.path.abspath(path), ib_start.isoformat(), ib_end.isoformat(), return_deadline.isoformat(),
+                    breakout_direction, breakout_type, str(bool(is_overnight))])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _write_atomic(df, target):
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(target))
+    os.close(fd)
+    try:
+        df.write_parquet(tmp, compression="zstd")
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+
+def _source_files(path) -> pl.DataFrame:
+    # Pliki źródła z rozmiarem i mtime: pojedynczy parquet albo partycje zbioru (dataset.py)
+    files = [(os.path.relpath(f, path), f) for _, _, f in _partitions(path)] if is_dataset(path) else [(os.path.basename(path), path)]
+    rows = [(name, os.stat(f).st_size, os.stat(f).st_mtime_ns) for name, f in files]
+    return pl.DataFrame(rows, schema={"file": pl.String, "size": pl.Int64, "mtime_ns": pl.Int64}, orient="row")
+
+def _recheck_from(path, stored_files, files):
+    """
+    Od którego dnia trzeba porównać odciski dni z magazynem: None = cała historia (pierwsze uruchomienie, zmieniony
+    pojedynczy plik), w zbiorze partycjonowanym = najwcześniejszy miesiąc pliku nowego / zmienionego / usuniętego.
+    """
+    if stored_files is None or not is_dataset(path): return None
+    on = ["file", "size", "mtime_ns"]
+    diff = pl.concat([files.join(stored_files, on=on, how="anti"), stored_files.join(files, on=on, how="anti")])
+    months = [(int(m.group(1)), int(m.group(2))) for m in map(_PART_RE.search, diff["file"].to_list()) if m]
+    if len(months) < diff.height: return None
+    y, m = min(months)
+    return date(y, m, 1) - timedelta(days=1)  # data handlowa baru = data UTC -1 / +1 dzień (NY, overnight)
+
+_FINGERPRINT_COLS = ["date", "ts_utc", "open", "high", "low", "close"]
+_DAY_KEYS = ["date", "n_bars", "last_ts", "digest"]
+
+def _day_fingerprints(bars):
+    # Dzień uznajemy za niezmieniony, jeśli ma tyle samo barów, ten sam ostatni ts i tę samą sumę hashy (ts, OHLC)
+    # - poprawka ceny w miejscu zmienia digest. Hash obcięty do 32 bitów, więc suma UInt64 się nie przepełnia.
+    row_hash = pl.struct("ts_utc", "open", "high", "low", "close").hash(seed=0) % (1 << 32)
+    return (bars.filter(pl.col("date").is_not_null())
+                .group_by("date").agg(pl.len().cast(pl.Int64).alias("n_bars"), pl.col("ts_utc").last().alias("last_ts"),
+                                      row_hash.sum().cast(pl.UInt64).alias("digest"))
+                .sort("date"))
+
+def analyze_incremental(path, ib_start, ib_end, return_deadline, breakout_direction="BOTH", breakout_type="wick", is_overnight=False,
+                        start_date=None, end_date=None, store_dir=STORE_DIR, rebuild=False, bars=None):
+    """
+    Wyniki analyze_ib_double_breakout dla pliku parquet / zbioru partycjonowanego, z trwałym magazynem wierszy dziennych
+    per konfiguracja. Obok wierszy magazyn trzyma odciski dni (liczba barów, ostatni ts, suma hashy barów) i plików
+    źródła (rozmiar, mtime): bez zmian w plikach wynik pochodzi wprost z magazynu, a po zmianie odciski dni są liczone
+    z kolumn czasu i OHLC - w zbiorze od najwcześniejszej zmienionej partycji, w pojedynczym pliku dla całej
+    historii - i przeliczane są tylko dni nowe, zmienione (także poprawione ceny) albo usunięte. bars = przygotowane bary zakresu [start_date, end_date] (scan_bars),
+    jeśli wywołujący już je ma - używane zamiast ponownego odczytu, gdy obejmują potrzebne dni. rebuild=True wymusza
+    pełne przeliczenie.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    key = _store_key(path, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight)
+    res_path, days_path, files_path = (os.path.join(store_dir, f"{key}.{name}.parquet") for name in ["results", "days", "files"])
+
+    stored_res, stored_days, stored_files = None, None, None
+    if not rebuild and os.path.exists(res_path) and os.path.exists(days_path):
+        try:
+            stored_res, stored_days = pl.read_parquet(res_path), pl.read_parquet(days_path)
+            stored_files = pl.read_parquet(files_path) if os.path.exists(files_path) else None
+        except Exception: stored_res, stored_days, stored_files = None, None, None
+    files = _source_files(path)
+    covers = lambda lo, hi: bars is not None and (start_date is None or (lo is not None and start_date <= lo)) and \
+                            (end_date is None or (hi is not None and end_date >= hi))
+
+    if stored_files is not None and files.equals(stored_files):
+        merged = stored_res
+    else:
+        since = _recheck_from(path, stored_files, files) if stored_days is not None else None
+        scan = bars if covers(since, None) else scan_bars(path, ib_start, is_overnight, start_date=since).select(_FINGERPRINT_COLS).collect()
+        fresh = _day_fingerprints(scan if since is None else scan.filter(pl.col("date") >= since))
+        if stored_days is None: changed, removed = fresh, []
+        else:
+            changed = fresh.join(stored_days, on=_DAY_KEYS, how="anti")
+            tail = stored_days if since is None else stored_days.filter(pl.col("date") >= since)
+            removed = tail.join(fresh, on="date", how="anti")["date"].to_list()
+        drop = changed["date"].to_list() + removed
+
+        new_res = pl.DataFrame()
+        if not changed.is_empty():
+            lo, hi = changed["date"].min(), changed["date"].max()
+            df = bars if covers(lo, hi) else scan_bars(path, ib_start, is_overnight, lo, hi).collect()
+            index = build_day_index(df).filter(pl.col("date").is_in(changed["date"].to_list()))
+            new_res = _analyze_columnar(df, ib_start, ib_end, return_deadline, breakout_direction, breakout_type, is_overnight,
+                                        None, None, day_index=index)
+        if stored_res is None or stored_res.is_empty(): merged = new_res
+        else:
+            merged = stored_res.filter(~pl.col("date").is_in(drop))
+            if not new_res.is_empty(): merged = pl.concat([merged, new_res]).sort("date")
+        days = changed if stored_days is None else pl.concat([stored_days.filter(~pl.col("date").is_in(drop)), changed]).sort("date")
+        _write_atomic(merged, res_path)
+        _write_atomic(days, days_path)
+        _write_atomic(files, files_path)
+
+    if merged.is_empty(): return merged
+    if start_date: merged = merged.filter(pl.col("date") >= start_date)
+    if end_date: merged = merged.filter(pl.col("date") <= end_date)
+    return merged if not merged.is_empty() else pl.DataFrame()
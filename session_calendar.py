@@ -0,0 +1,123 @@
+from datetime import date, time, timedelta
+from functools import lru_cache
+
+import polars as pl
+
+# --- KALENDARZ SESJI (NY) ---
+NY_TZ = "America/New_York"
+UTC_TZ = "UTC"
+EARLY_CLOSE = time(13, 0)
+
+def _easter(year):
+    # Algorytm "anonimowy" (Meeus/Jones/Butcher) dla kalendarza gregoriańskiego
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    return date(year, month, (h + l - 7 * m + 114) % 31 + 1)
+
+def _nth_weekday(year, month, weekday, n):
+    # n-ty (n=-1: ostatni) dzień tygodnia weekday (0=pon) w miesiącu
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(d):
+    # Święto w sobotę -> piątek, w niedzielę -> poniedziałek
+    if d.weekday() == 5: return d - timedelta(days=1)
+    if d.weekday() == 6: return d + timedelta(days=1)
+    return d
+
+def exchange_holidays(year):
+    """
+    (dni zamknięte, dni skróconej sesji 13:00 ET) wg kalendarza NYSE, do którego odnosi się sesja RTH.
+    """
+    closed = {
+        _nth_weekday(year, 1, 0, 3),                # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),                # Presidents' Day
+        _easter(year) - timedelta(days=2),          # Good Friday
+        _nth_weekday(year, 5, 0, -1),               # Memorial Day
+        _observed(date(year, 7, 4)),                # Independence Day
+        _nth_weekday(year, 9, 0, 1),                # Labor Day
+        _nth_weekday(year, 11, 3, 4),               # Thanksgiving
+        _observed(date(year, 12, 25)),              # Christmas
+    }
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5: closed.add(_observed(new_year))  # sobotni Nowy Rok nie jest przenoszony na piątek
+    if year >= 2022: closed.add(_observed(date(year, 6, 19)))   # Juneteenth
+    early = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}
+    for d in (date(year, 7, 3), date(year, 12, 24)):
+        if d.weekday() < 5 and d not in closed: early.add(d)
+    return closed, early
+
+def ny_to_utc(naive: pl.Expr) -> pl.Expr:
+    """
+    Czas lokalny NY (naiwny Datetime) -> UTC, z tą samą semantyką co pytz localize(is_dst=False):
+    godzina podwójna (zmiana na czas zimowy) -> późniejsza (EST), godzina nieistniejąca -> offset EST.
+    """
+    local = naive.dt.replace_time_zone(NY_TZ, ambiguous="latest", non_existent="null").dt.convert_time_zone(UTC_TZ)
+    est = (naive + timedelta(hours=5)).dt.replace_time_zone(UTC_TZ)
+    return local.fill_null(est)
+
+def _day_range(first, last):
+    return pl.date_range(first, last, "1d", eager=True).alias("date")
+
+@lru_cache(maxsize=128)
+def _utc_range(first, last, local_time, day_shift):
+    # local_time w NY dla każdego dnia z [first, last] (+ day_shift dni) jako UTC
+    return pl.select(ny_to_utc((_day_range(first, last) + timedelta(days=day_shift)).dt.combine(local_time, "us"))).to_series()
+
+@lru_cache(maxsize=32)
+def _flags_range(first, last):
+    closed, early = set(), set()
+    for y in range(first.year, last.year + 1):
+        c, e = exchange_holidays(y)
+        closed |= c
+        early |= e
+    days = _day_range(first, last)
+    return pl.DataFrame({
+        "is_holiday": days.is_in(list(closed)),
+        "is_early_close": days.is_in(list(early)),
+        "early_close_utc": _utc_range(first, last, EARLY_CLOSE, 0),
+    }).with_columns(pl.when(pl.col("is_early_close")).then(pl.col("early_close_utc")))
+
+def _positions(dates):
+    # Wiersz daty w tabeli zakresu [min, max] = liczba dni od min
+    dates = pl.Series("date", dates, dtype=pl.Date)
+    if dates.is_empty(): return dates, None, None
+    first = dates.min()
+    return dates, first, (dates - first).dt.total_days().to_numpy()
+
+def local_to_utc(dates, local_time, day_shift=0) -> pl.Series:
+    """
+    local_time (NY) dla każdej daty (+ day_shift dni) jako UTC, w kolejności wejściowych dat.
+    Zamiennik pętli pytz.localize dzień po dniu.
+    """
+    dates, first, pos = _positions(dates)
+    if first is None: return pl.Series("utc", [], dtype=pl.Datetime("us", UTC_TZ))
+    return _utc_range(first, dates.max(), local_time, day_shift).gather(pos).alias("utc")
+
+def session_calendar(dates, ib_start, ib_end, deadline, is_overnight=False) -> pl.DataFrame:
+    """
+    Start IB, koniec IB i deadline w UTC (+ flagi święta / skróconej sesji) dla każdej daty handlowej,
+    w kolejności wejściowych dat. Kolumny są cache'owane dla ciągłego zakresu dni, a wiersz daty to
+    po prostu przesunięcie od pierwszego dnia.
+    """
+    dates, first, pos = _positions(dates)
+    if first is None:
+        return pl.DataFrame(schema={"date": pl.Date, "ib_start_utc": pl.Datetime("us", UTC_TZ), "ib_end_utc": pl.Datetime("us", UTC_TZ),
+                                    "deadline_utc": pl.Datetime("us", UTC_TZ), "is_holiday": pl.Boolean, "is_early_close": pl.Boolean,
+                                    "early_close_utc": pl.Datetime("us", UTC_TZ)})
+    last = dates.max()
+    return pl.DataFrame([
+        dates,
+        _utc_range(first, last, ib_start, -1 if is_overnight else 0).gather(pos).alias("ib_start_utc"),
+        _utc_range(first, last, ib_end, 0).gather(pos).alias("ib_end_utc"),
+        _utc_range(first, last, deadline, 0).gather(pos).alias("deadline_utc"),
+    ]).hstack(_flags_range(first, last)[pos])
@@ -0,0 +1,70 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import polars as pl
+
+from analysis_ib_double_breakout import _sim_day_arrays, _simulate_arrays
+from metrics import batch_stats
+
+SWEEP_PARAMS = ["strategy_mode", "trigger_pct", "entry_pct", "tp_pct", "sl_dist_pct"]
+SWEEP_STATS = ["trades", "net_r", "win_rate", "profit_factor", "max_dd_r"]
+_BATCH = 256  # kombinacji na jedną macierz batch_stats
+
+# Tablice dni współdzielone przez wszystkie kombinacje w danym procesie (ustawiane w _init_worker)
+_ARR = None
+
+def pct_range(start, stop, step):
+    """
+    Zakres procentowy włącznie z końcem, np. pct_range(10, 50, 10) -> [10, 20, 30, 40, 50].
+    """
+    if step <= 0 or stop < start: return [start]
+    return [round(start + i * step, 6) for i in range(int(round((stop - start) / step)) + 1)]
+
+def _init_worker(arr):
+    global _ARR
+    _ARR = arr
+
+def _stat_rows(stats):
+    # słownik tablic z batch_stats -> krotki SWEEP_STATS (typy Pythona)
+    return list(zip(*[stats[k].tolist() for k in SWEEP_STATS]))
+
+def _combo_stats(codes, r_res):
+    return _stat_rows(batch_stats(codes, r_res))[0]
+
+def _simulate_batch(arr, combos):
+    # (kody, wyniki R) kombinacji jako macierze [kombinacja x dzień]
+    sims = [_simulate_arrays(arr, trig, entry, tp, sl, mode) for mode, trig, entry, tp, sl in combos]
+    return np.stack([c for c, _ in sims]), np.stack([r for _, r in sims])
+
+def _run_chunk(combos):
+    out = []
+    for i in range(0, len(combos), _BATCH):
+        batch = combos[i:i + _BATCH]
+        out.extend(combo + stats for combo, stats in zip(batch, _stat_rows(batch_stats(*_simulate_batch(_ARR, batch)))))
+    return out
+
+def run_sweep(df_all, res_df, deadline, trigger_range, entry_range, tp_range, sl_range, modes=("TREND", "FADE"), risk_value=100.0, max_workers=None, day_index=None):
+    """
+    Siatka parametrów symulatora: iloczyn kartezjański modes x trigger x entry x tp x sl liczony na jednym
+    zestawie tablic dni (_sim_day_arrays), rozłożony na pulę procesów. Zwraca ranking wg net_r.
+    """
+    arr = _sim_day_arrays(df_all, res_df, deadline, day_index)
+    combos = list(itertools.product(modes, trigger_range, entry_range, tp_range, sl_range))
+    if arr is None or not combos: return pl.DataFrame()
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(combos) < 2 * workers:
+        _init_worker(arr)
+        try: rows = _run_chunk(combos)
+        finally: _init_worker(None)  # proces aplikacji: tablice dni nie zostają w zmiennej modułu po przebiegu
+    else:
+        chunk = max(1, len(combos) // (workers * 4))
+        chunks = [combos[i:i + chunk] for i in range(0, len(combos), chunk)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(arr,)) as ex:
+            rows = [row for part in ex.map(_run_chunk, chunks) for row in part]
+
+    return (pl.DataFrame(rows, schema=SWEEP_PARAMS + SWEEP_STATS, orient="row")
+            .with_columns((pl.col("net_r") * risk_value).alias("net_pnl"), (pl.col("max_dd_r") * risk_value).alias("max_dd"))
+            .sort(["net_r", "profit_factor"], descending=True))
@@ -0,0 +1,53 @@
+"""
+Silnik kolumnowy (_analyze_columnar) kontra referencyjna ścieżka dzień-po-dniu (_analyze_per_day):
+wynik ma być identyczny ramka w ramkę. Dane z deterministycznego generatora benchmarks/synthetic.py.
+"""
+import os
+import sys
+from datetime import date, time
+
+import polars as pl
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from analysis_ib_double_breakout import _analyze_columnar, _analyze_per_day, scan_bars
+from synthetic import generate_bars
+
+# (ib_start, ib_end, deadline, kierunek, typ wybicia, overnight, od, do)
+CONFIGS = {
+    "wick-both": (time(9, 30), time(10, 30), time(16, 0), "BOTH", "wick", False, None, None),
+    "wick-up": (time(9, 30), time(10, 30), time(16, 0), "UP", "wick", False, None, None),
+    "wick-down": (time(9, 30), time(10, 30), time(16, 0), "DOWN", "wick", False, None, None),
+    "close-both": (time(1, 0), time(2, 0), time(12, 0), "BOTH", "close", False, None, None),
+    "close-up": (time(1, 0), time(2, 0), time(12, 0), "UP", "close", False, None, None),
+    "close-down": (time(1, 0), time(2, 0), time(12, 0), "DOWN", "close", False, None, None),
+    "overnight": (time(20, 0), time(2, 0), time(10, 0), "BOTH", "wick", True, None, None),
+    "overnight-close": (time(18, 0), time(1, 0), time(9, 0), "BOTH", "close", True, None, None),
+    "date-range": (time(9, 30), time(10, 30), time(16, 0), "BOTH", "wick", False, date(2010, 2, 1), date(2010, 3, 15)),
+    # IB i okno po IB w przerwie technicznej 17:00-18:00 - żaden bar w oknach, wynik pusty
+    "empty-window": (time(17, 10), time(17, 40), time(17, 55), "BOTH", "wick", False, None, None),
+}
+EMPTY = {"empty-window"}
+
+@pytest.fixture(scope="module")
+def raw():
+    return generate_bars(years=0.3, seed=7)
+
+@pytest.mark.parametrize("name", list(CONFIGS))
+def test_columnar_matches_per_day(raw, name):
+    ib_start, ib_end, deadline, direction, breakout_type, overnight, start, end = CONFIGS[name]
+    df = scan_bars(raw, ib_start, overnight, start, end).collect()
+    args = (ib_start, ib_end, deadline, direction, breakout_type, overnight, start, end)
+    expected = _analyze_per_day(df, *args)
+    result = _analyze_columnar(df, *args)
+    assert result.equals(expected), f"{name}: {result.height} vs {expected.height} wierszy"
+    assert expected.is_empty() == (name in EMPTY)
+
+def test_no_bars_in_windows(raw):
+    # dni z barami tylko przed IB (np. odświeżenie po dopisaniu części dnia)
+    df = scan_bars(raw, time(12, 0), False).collect().filter(pl.col("ts_ny").dt.hour() < 9)
+    args = (time(12, 0), time(13, 0), time(16, 0), "BOTH", "wick", False, None, None)
+    assert _analyze_columnar(df, *args).equals(_analyze_per_day(df, *args))
+    assert _analyze_columnar(df, *args).is_empty()
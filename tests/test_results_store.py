@@ -0,0 +1,50 @@
+"""
+Magazyn wyników (analyze_incremental) kontra pełne przeliczenie po zmianie źródła: dopisanie dni
+i poprawka ceny w miejscu (ta sama liczba barów i ostatni ts dnia).
+"""
+import os
+import sys
+from datetime import time
+
+import polars as pl
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from analysis_ib_double_breakout import _analyze_columnar, scan_bars
+from results_store import analyze_incremental
+from synthetic import generate_bars
+
+ARGS = (time(9, 30), time(10, 30), time(16, 0), "BOTH", "wick", False)
+
+@pytest.fixture(scope="module")
+def raw():
+    return generate_bars(years=0.2, seed=11)
+
+def _full(path):
+    df = scan_bars(path, ARGS[0], ARGS[5]).collect()
+    return _analyze_columnar(df, *ARGS, None, None)
+
+def _incremental(path, store):
+    return analyze_incremental(path, *ARGS, store_dir=store)
+
+def test_append_matches_full(raw, tmp_path):
+    path, store = str(tmp_path / "data.parquet"), str(tmp_path / "store")
+    raw.head(raw.height // 2).write_parquet(path)
+    assert _incremental(path, store).equals(_full(path))
+    raw.write_parquet(path)
+    assert _incremental(path, store).equals(_full(path))
+
+def test_price_correction_matches_full(raw, tmp_path):
+    path, store = str(tmp_path / "data.parquet"), str(tmp_path / "store")
+    raw.write_parquet(path)
+    before = _incremental(path, store)
+    # high pierwszego baru IB jednego dnia w górę - liczba barów i ostatni ts dnia bez zmian
+    day = before["date"][len(before) // 2].strftime("%Y%m%d")
+    hit = pl.col("timestamp") == f"{day} 143000"  # 09:30 NY (EST) w UTC
+    assert raw.filter(hit).height == 1
+    raw.with_columns(pl.when(hit).then(pl.col("high") + 50).otherwise(pl.col("high")).alias("high")).write_parquet(path)
+    after = _incremental(path, store)
+    assert after.equals(_full(path))
+    assert not after.equals(before)
@@ -0,0 +1,149 @@
+import itertools
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+
+from analysis_ib_double_breakout import _sim_day_arrays, _simulate_arrays, _SEG_SHIFT, SIM_OUTCOMES
+from metrics import batch_stats
+from sweep import SWEEP_PARAMS, SWEEP_STATS as _STAT_COLS, _BATCH, _combo_stats, _simulate_batch, _stat_rows
+
+# --- WALK-FORWARD (optymalizacja na train, ocena na kolejnym test) ---
+# Symulator jest dzienny (wynik dnia nie zależy od innych dni), więc każda kombinacja siatki jest liczona raz
+# na całym zakresie, a statystyki train każdego foldu to tylko wycinek wyników dni. Pula procesów dostaje
+# kombinacje w paczkach; tablice dni (_sim_day_arrays) są zapisywane jako Arrow IPC i mapowane (memory-map)
+# przez każdy proces, zamiast pickle ramki barów do każdego workera.
+_DAY_COLS = ["date", "is_up", "ib_range", "base", "invalidation"]
+_BAR_COLS = ["seg", "ts", "key", "high", "low", "close"]
+WF_SCORES = ["net_r", "profit_factor", "win_rate"]
+
+# Pełne tablice dni w danym procesie (ustawiane w _init_worker)
+_ARR = None
+
+def make_folds(n_days, train_days, test_days, anchored=False):
+    """
+    Foldy po dniach handlowych: [(train_lo, train_hi, test_lo, test_hi)], zakresy półotwarte.
+    Okna test następują po sobie bez nakładania (krok = test_days); anchored=True -> train zawsze od dnia 0.
+    """
+    if train_days <= 0 or test_days <= 0: return []
+    folds = []
+    test_lo = train_days
+    while test_lo < n_days:
+        folds.append((0 if anchored else test_lo - train_days, test_lo, test_lo, min(test_lo + test_days, n_days)))
+        test_lo += test_days
+    return folds
+
+def _slice_days(arr, lo, hi):
+    # Widok na dni [lo, hi) w układzie _sim_day_arrays (offsety / nr dnia / klucz przesunięte do zera)
+    a, b = arr["offsets"][lo], arr["offsets"][hi]
+    out = {k: arr[k][lo:hi] for k in _DAY_COLS}
+    out.update({k: arr[k][a:b] for k in _BAR_COLS})
+    out["offsets"] = arr["offsets"][lo:hi + 1] - a
+    out["seg"] = out["seg"] - lo
+    out["key"] = out["key"] - (np.int64(lo) << _SEG_SHIFT)
+    return out
+
+def _write_shared(arr, shared_dir):
+    days = pa.table({k: (arr[k].to_arrow() if k == "date" else arr[k]) for k in _DAY_COLS})
+    bars = pa.table({k: arr[k] for k in _BAR_COLS})
+    for name, table in [("days", days), ("bars", bars), ("offsets", pa.table({"offsets": arr["offsets"]}))]:
+        with pa.OSFile(os.path.join(shared_dir, f"{name}.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer: writer.write_table(table)
+
+def _read_shared(shared_dir):
+    arr = {}
+    for name in ["days", "bars", "offsets"]:
+        with pa.memory_map(os.path.join(shared_dir, f"{name}.arrow"), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        for k in table.column_names:
+            col = table.column(k).combine_chunks()
+            arr[k] = pl.from_arrow(col).alias("date") if k == "date" else col.to_numpy(zero_copy_only=(k != "is_up"))
+    return arr
+
+def _init_worker(arr_or_dir):
+    global _ARR
+    _ARR = _read_shared(arr_or_dir) if isinstance(arr_or_dir, str) else arr_or_dir
+
+def _run_chunk(task):
+    # Statystyki train [(nr foldu, kombinacja + statystyki)] dla paczki kombinacji, w kolejności kombinacji
+    combos, folds = task
+    out = []
+    for a in range(0, len(combos), _BATCH):
+        batch = combos[a:a + _BATCH]
+        codes, r_res = _simulate_batch(_ARR, batch)
+        for i, (train_lo, train_hi, _, _) in enumerate(folds):
+            stats = _stat_rows(batch_stats(codes[:, train_lo:train_hi], r_res[:, train_lo:train_hi]))
+            out.extend((i, combo + row) for combo, row in zip(batch, stats))
+    return out
+
+def _best_per_fold(rows, n_folds, score, min_trades):
+    # Najlepsza kombinacja foldu wg score (remis -> profit_factor, potem pierwsza z siatki)
+    best, best_key = [None] * n_folds, [None] * n_folds
+    col, pf_col = 5 + _STAT_COLS.index(score), 5 + _STAT_COLS.index("profit_factor")
+    for i, row in rows:
+        if row[5] < min_trades: continue
+        key = (row[col], row[pf_col])
+        if best_key[i] is None or key > best_key[i]: best[i], best_key[i] = row, key
+    return best
+
+def run_walk_forward(df_all, res_df, deadline, trigger_range, entry_range, tp_range, sl_range, train_days=120, test_days=20,
+                     modes=("TREND", "FADE"), score="net_r", min_trades=10, anchored=False, risk_value=100.0, max_workers=None, day_index=None):
+    """
+    Walk-forward symulatora: dla każdego foldu wybiera najlepszą kombinację siatki (jak run_sweep) na dniach train
+    (min. min_trades transakcji) i gra nią na kolejnych test_days dniach. Dni handlowe = dni z barami w oknie handlowym.
+    Analiza IB jest dzienna (bez informacji z innych dni), więc wynik analyze_ib_double_breakout dla całego zakresu
+    można dzielić na foldy bez zaglądania w przyszłość.
+    Zwraca (krzywa out-of-sample w układzie run_simulation + fold i equity, raport per fold).
+    """
+    if score not in WF_SCORES: raise ValueError(f"Nieznana miara: {score} (dostępne: {', '.join(WF_SCORES)})")
+    arr = _sim_day_arrays(df_all, res_df, deadline, day_index)
+    combos = list(itertools.product(modes, trigger_range, entry_range, tp_range, sl_range))
+    folds = make_folds(0 if arr is None else len(arr["date"]), train_days, test_days, anchored)
+    if not folds or not combos: return pl.DataFrame(), pl.DataFrame()
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(combos) < 2 * workers:
+        _init_worker(arr)
+        try: rows = _run_chunk((combos, folds))
+        finally: _init_worker(None)  # proces aplikacji: tablice dni nie zostają w zmiennej modułu po przebiegu
+    else:
+        chunk = max(1, len(combos) // (workers * 4))
+        tasks = [(combos[i:i + chunk], folds) for i in range(0, len(combos), chunk)]
+        shared_dir = tempfile.mkdtemp(prefix="wf_")
+        try:
+            _write_shared(arr, shared_dir)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared_dir,)) as ex:
+                rows = [row for part in ex.map(_run_chunk, tasks) for row in part]
+        finally:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+
+    report, curve = [], []
+    for i, ((train_lo, train_hi, test_lo, test_hi), best) in enumerate(zip(folds, _best_per_fold(rows, len(folds), score, min_trades))):
+        row = {"fold": i + 1, "train_start": arr["date"][train_lo], "train_end": arr["date"][train_hi - 1],
+               "test_start": arr["date"][test_lo], "test_end": arr["date"][test_hi - 1]}
+        if best is None:
+            report.append(row)
+            continue
+        codes, r_res = _simulate_arrays(_slice_days(arr, test_lo, test_hi), *best[1:5], best[0])
+        row.update(dict(zip(SWEEP_PARAMS, best[:5])))
+        row.update({f"train_{k}": v for k, v in zip(_STAT_COLS, best[5:])})
+        row.update({f"test_{k}": v for k, v in zip(_STAT_COLS, _combo_stats(codes, r_res))})
+        report.append(row)
+        curve.append(pl.DataFrame({
+            "date": arr["date"][test_lo:test_hi],
+            "result": [SIM_OUTCOMES[c][0] for c in codes],
+            "pnl": r_res * risk_value,
+            "r_result": r_res,
+            "comment": [SIM_OUTCOMES[c][1] for c in codes],
+            "fold": pl.Series([i + 1] * len(codes), dtype=pl.Int32),
+        }))
+
+    report = pl.DataFrame(report, infer_schema_length=None)
+    if not curve: return pl.DataFrame(), report
+    traded = pl.col("result").is_in(["WIN", "LOSS", "CLOSE"])
+    oos = pl.concat(curve).with_columns(pl.when(traded).then(pl.col("pnl")).otherwise(0.0).cum_sum().alias("equity"))
+    return oos, report